@@ -0,0 +1,154 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "src")
+if src_dir not in sys.path:
+    sys.path.insert(0, src_dir)
+
+from chat_engine.data_models.chat_data.chat_data_model import ChatData
+from chat_engine.data_models.chat_data_type import ChatDataType
+from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundleEntry, DataBundle
+from chat_engine.data_models.runtime_data.data_store import DataStore, DataStoreType
+
+
+class LegacyDataBundle:
+    # walks the definition and creates a data store per entry on construction, recomputes the allowed shape on
+    # every set, as bundles used to
+    def __init__(self, definition: DataBundleDefinition):
+        self._definition = definition.lockdown()
+        self.metadata = {}
+        self.events = []
+        self._data_entries = []
+        self.data = []
+        self.start_of_stream = False
+        self.end_of_stream = False
+        for entry_name, entry in self._definition.entries.items():
+            self._data_entries.append(entry)
+            self.data.append(DataStore(None, DataStoreType.INVALID))
+
+    def get_data_store(self, name: str):
+        entry = self._definition.entries.get(name, None)
+        if entry is None:
+            return DataStore(None, DataStoreType.INVALID)
+        return self.data[entry.index]
+
+    def set_array_data(self, name: str, entry: DataBundleEntry, data: np.ndarray):
+        timed_axis_size = entry.get_time_axis_size(data.shape)
+        if timed_axis_size is None or timed_axis_size <= 0:
+            raise RuntimeError(f"Dimension mismatch: {name}: {data.shape} is not valid")
+        allowed_shape = entry.calculate_shape(timed_axis_size=timed_axis_size, reference_shape=data.shape)
+        if not np.array_equal(data.shape, allowed_shape):
+            raise RuntimeError(f"Shape mismatch: Shape of {name} is {data.shape}, not fit defined {allowed_shape}")
+        return self.get_data_store(name).set_data(data, DataStoreType.LOCAL_MEMORY)
+
+    def set_data(self, name: str, data):
+        entry = self._definition.entries.get(name, None)
+        if entry is None:
+            raise RuntimeError(f"Unknown data name {name}")
+        if isinstance(data, np.ndarray):
+            return self.set_array_data(name, entry, data)
+        return self.get_data_store(name).set_data(data, DataStoreType.LOCAL_MEMORY)
+
+    def set_main_data(self, data):
+        return self.set_data(self._definition.main_entry_name, data)
+
+    def get_data(self, name: str):
+        return self.get_data_store(name).get_data()
+
+    def get_main_data(self):
+        return self.get_data(self._definition.main_entry_name)
+
+    def add_meta(self, name, value):
+        self.metadata[name] = value
+
+
+def create_definitions():
+    audio_definition = DataBundleDefinition()
+    audio_definition.add_entry(DataBundleEntry.create_audio_entry("mic_audio", 1, 16000))
+    text_definition = DataBundleDefinition()
+    text_definition.add_entry(DataBundleEntry.create_text_entry("avatar_text"))
+    motion_definition = DataBundleDefinition()
+    motion_definition.add_entry(DataBundleEntry.create_framed_entry("arkit_face", [1, 52], 0, 30))
+    motion_definition.add_entry(DataBundleEntry.create_audio_entry("avatar_audio", 1, 24000))
+    motion_definition.set_main_entry("arkit_face")
+    return audio_definition.lockdown(), text_definition.lockdown(), motion_definition.lockdown()
+
+
+def run_mic_frames(bundle_class, definition, audio, repeat):
+    # a 20 ms mic frame wrapped into chat data, as the input pump does
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        bundle = bundle_class(definition)
+        bundle.set_main_data(audio)
+        chat_data = ChatData(type=ChatDataType.MIC_AUDIO, data=bundle)
+        chat_data.data.get_main_data()
+    return repeat / (time.perf_counter() - t_start)
+
+
+def run_fast_mic_frames(definition, audio, repeat):
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        bundle = DataBundle.create_with_main_data(definition, audio)
+        chat_data = ChatData(type=ChatDataType.MIC_AUDIO, data=bundle)
+        chat_data.data.get_main_data()
+    return repeat / (time.perf_counter() - t_start)
+
+
+def run_text_tokens(bundle_class, definition, repeat):
+    # an llm token with its metadata
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        bundle = bundle_class(definition)
+        bundle.set_main_data("token")
+        bundle.add_meta("avatar_text_end", False)
+        bundle.add_meta("speech_id", "speech-0")
+        chat_data = ChatData(type=ChatDataType.AVATAR_TEXT, data=bundle)
+        chat_data.data.get_main_data()
+    return repeat / (time.perf_counter() - t_start)
+
+
+def run_motion_bundles(bundle_class, definition, arkit, audio, repeat):
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        bundle = bundle_class(definition)
+        bundle.set_main_data(arkit)
+        bundle.set_data("avatar_audio", audio)
+        chat_data = ChatData(type=ChatDataType.AVATAR_MOTION_DATA, data=bundle)
+        chat_data.data.get_main_data()
+        chat_data.data.get_data("avatar_audio")
+    return repeat / (time.perf_counter() - t_start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200000)
+    args = parser.parse_args()
+
+    audio_definition, text_definition, motion_definition = create_definitions()
+    mic_audio = np.zeros([1, 320], dtype=np.float32)
+    arkit = np.zeros([30, 52], dtype=np.float32)
+    avatar_audio = np.zeros([1, 24000], dtype=np.float32)
+
+    results = [
+        ("mic frame", run_mic_frames(LegacyDataBundle, audio_definition, mic_audio, args.repeat),
+         run_mic_frames(DataBundle, audio_definition, mic_audio, args.repeat)),
+        ("mic frame, single entry constructor", run_mic_frames(LegacyDataBundle, audio_definition, mic_audio,
+                                                               args.repeat),
+         run_fast_mic_frames(audio_definition, mic_audio, args.repeat)),
+        ("llm token", run_text_tokens(LegacyDataBundle, text_definition, args.repeat),
+         run_text_tokens(DataBundle, text_definition, args.repeat)),
+        ("motion data", run_motion_bundles(LegacyDataBundle, motion_definition, arkit, avatar_audio, args.repeat),
+         run_motion_bundles(DataBundle, motion_definition, arkit, avatar_audio, args.repeat)),
+    ]
+    print("chat data with bundle create + set + get per second")
+    print(f"{'case':>36} {'legacy':>10} {'current':>10} {'speedup':>8}")
+    for name, legacy, current in results:
+        print(f"{name:>36} {legacy:>10.0f} {current:>10.0f} {current / legacy:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
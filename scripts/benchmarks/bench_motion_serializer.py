@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "src")
+if src_dir not in sys.path:
+    sys.path.insert(0, src_dir)
+
+from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundleEntry, DataBundle
+from chat_engine.data_models.runtime_data.motion_data import MotionDataSerializer
+from chat_engine.data_models.runtime_data.motion_data_compact import MotionDataDescriptorFormat, \
+    parse_record_names, unpack_compact_frame
+from chat_engine.data_models.runtime_data.motion_data_descriptors import BufferDescription
+
+
+class LegacyMotionDataSerializer(MotionDataSerializer):
+    # builds descriptions attribute by attribute, converts every entry to bytes and grows the message record
+    # by record, as the serializer used to
+    def _update_description(self, description, data_list, data_bundle, write_channel_names):
+        definition = data_bundle.definition
+        for data_name, registry in self.name_mapping.items():
+            entry = definition.find_entry(data_name)
+            if entry is None:
+                continue
+            data_item = data_bundle.get_data(data_name)
+            data_desc = BufferDescription()
+            data_desc.sample_rate = entry.sample_rate
+            data_desc.data_id = len(data_list)
+            data_desc.timeline_axis = entry.time_axis
+            data_desc.channel_axis = entry.channel_axis
+            if write_channel_names:
+                data_desc.channel_names = entry.channel_names
+            data_desc.shape = list(data_item.shape)
+            data_desc.data_type = data_item.dtype.name
+            if registry.serializer is not None:
+                data_desc = BufferDescription.model_validate(data_desc.model_dump())
+                if data_item.dtype in (np.float16, np.float32, np.float64):
+                    data_item = data_item * 32767
+                data_item = data_item.astype(np.int16)
+                data_desc.data_type = str(data_item.dtype)
+            else:
+                data_desc.data_type = registry.output_data_type.name
+                if registry.output_data_type.name != str(data_item.dtype):
+                    data_item = data_item.astype(registry.output_data_type)
+            description.data_records[registry.name] = data_desc
+            data_list.append(data_item.tobytes())
+
+    def _dump_to_bytes(self, description, data_list, compact=False):
+        binary_offset = 0
+        binary_data = bytes()
+        for data_desc in description.data_records.values():
+            data_item = data_list[data_desc.data_id]
+            binary_data += data_item
+            data_desc.data_offset = binary_offset
+            binary_offset += len(data_item)
+        desc_bytes = bytes(description.model_dump_json(), "utf-8")
+        header = b"JBIN" + struct.pack("<II", len(desc_bytes), len(binary_data))
+        return header + desc_bytes + binary_data
+
+
+def create_definition(audio_sample_rate: int) -> DataBundleDefinition:
+    definition = DataBundleDefinition()
+    definition.add_entry(DataBundleEntry.create_framed_entry(
+        name="arkit_face",
+        shape=[1, 52],
+        time_axis=0,
+        sample_rate=30,
+        channel_axis=1,
+        channel_names=[f"blendshape_{i}" for i in range(52)],
+    ))
+    definition.add_entry(DataBundleEntry.create_audio_entry(
+        name="avatar_audio",
+        channel_num=1,
+        sample_rate=audio_sample_rate,
+    ))
+    definition.set_main_entry("arkit_face")
+    return definition
+
+
+def create_bundles(definition: DataBundleDefinition, audio_sample_rate: int, chunk_num: int):
+    rng = np.random.default_rng(0)
+    bundles = []
+    for i in range(chunk_num):
+        bundle = DataBundle(definition)
+        bundle.set_main_data(rng.uniform(0, 1, (30, 52)).astype(np.float32))
+        bundle.set_data("avatar_audio", rng.uniform(-0.5, 0.5, (1, audio_sample_rate)).astype(np.float32))
+        bundle.add_meta("speech_id", f"speech_{i // 5}")
+        bundle.add_meta("avatar_speech_end", i % 5 == 4)
+        bundle.start_of_stream = i % 5 == 0
+        bundle.end_of_stream = i % 5 == 4
+        bundles.append(bundle)
+    return bundles
+
+
+def create_serializer(serializer_class):
+    serializer = serializer_class()
+    serializer.register_audio_data("avatar_audio")
+    serializer.register_data("arkit_face", "arkit_face", "float32")
+    return serializer
+
+
+def run(serializer_class, definition, bundles, repeat, descriptor_format=MotionDataDescriptorFormat.JSON):
+    serializer = create_serializer(serializer_class)
+    serializer.set_descriptor_format(descriptor_format)
+    messages = [serializer.serialize(definition)] + [serializer.serialize(bundle) for bundle in bundles]
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        for bundle in bundles:
+            serializer.serialize(bundle)
+    return messages, (time.perf_counter() - t_start) / (repeat * len(bundles)) * 1000
+
+
+def unpack_jbin(message: bytes):
+    json_size, binary_size = struct.unpack_from("<II", message, 4)
+    return json.loads(bytes(message[12:12 + json_size])), 12 + json_size, binary_size
+
+
+def check_compact(compact_messages, json_messages):
+    welcome, _, _ = unpack_jbin(compact_messages[0])
+    record_names = parse_record_names(welcome["metadata"])
+    for compact_message, json_message in zip(compact_messages[1:], json_messages[1:]):
+        frame = unpack_compact_frame(compact_message, record_names)
+        description, binary_offset, binary_size = unpack_jbin(json_message)
+        for name, record in description["data_records"].items():
+            compact_record = frame["data_records"][name]
+            if any(compact_record[key] != record[key] for key in ("data_type", "data_offset", "shape")):
+                return False
+        for key in ("batch_id", "start_of_batch", "end_of_batch"):
+            if frame[key] != description[key]:
+                return False
+        if description["start_of_batch"] and frame["batch_name"] != description["batch_name"]:
+            return False
+        if compact_message[frame["binary_offset"]:] != json_message[binary_offset:binary_offset + binary_size]:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio_sample_rate", type=int, default=24000)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    definition = create_definition(args.audio_sample_rate)
+    bundles = create_bundles(definition, args.audio_sample_rate, args.chunks)
+    legacy_messages, legacy_ms = run(LegacyMotionDataSerializer, definition, bundles, args.repeat)
+    messages, ms = run(MotionDataSerializer, definition, bundles, args.repeat)
+    compact_messages, compact_ms = run(MotionDataSerializer, definition, bundles, args.repeat,
+                                       MotionDataDescriptorFormat.COMPACT)
+
+    identical = all(bytes(message) == legacy for message, legacy in zip(messages, legacy_messages))
+    print(f"1 s bundles of arkit_face and {args.audio_sample_rate} Hz audio")
+    print(f"{'serializer':>10} {'ms/chunk':>9} {'header bytes':>13}")
+    for name, serializer_messages, duration in (("legacy", legacy_messages, legacy_ms),
+                                                ("json", messages, ms),
+                                                ("compact", compact_messages, compact_ms)):
+        header_size = sum(len(message) for message in serializer_messages[1:]) / len(bundles) - \
+            sum(bundle.get_data(name).nbytes // 2 if name == "avatar_audio" else bundle.get_data(name).nbytes
+                for bundle in bundles for name in ("arkit_face", "avatar_audio")) / len(bundles)
+        print(f"{name:>10} {duration:>9.3f} {header_size:>13.0f}")
+    print(f"json output identical to legacy: {identical}")
+    print(f"compact frames match json frames: {check_compact(compact_messages, messages)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+
+src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "src")
+if src_dir not in sys.path:
+    sys.path.insert(0, src_dir)
+
+from engine_utils.audio_resampler import StreamingResampler, framewise_rms
+
+
+def timed_per_chunk(func, chunks, repeat):
+    for chunk in chunks[:2]:
+        func(chunk)
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        for chunk in chunks:
+            func(chunk)
+    return (time.perf_counter() - t_start) / (repeat * len(chunks)) * 1000
+
+
+def fractional_delay(audio: np.ndarray, delay: float) -> np.ndarray:
+    # zero padded so that the shift does not wrap around
+    size = 2 * audio.shape[0]
+    spectrum = np.fft.rfft(audio, size)
+    spectrum *= np.exp(-2j * np.pi * np.fft.rfftfreq(size) * delay)
+    return np.fft.irfft(spectrum, size)[:audio.shape[0]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input_rate", type=int, default=24000)
+    parser.add_argument("--output_rate", type=int, default=16000)
+    parser.add_argument("--chunk_ms", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    chunk_size = args.input_rate * args.chunk_ms // 1000
+    rng = np.random.default_rng(0)
+    # test tones well below the nyquist rate of both input and output
+    t = np.arange(chunk_size * args.chunks) / args.input_rate
+    audio = sum(rng.uniform(0.05, 0.2) * np.sin(2 * np.pi * f * t + rng.uniform(0, np.pi))
+                for f in rng.uniform(80, 0.4 * min(args.input_rate, args.output_rate), 16)).astype(np.float32)
+    chunks = [audio[i:i + chunk_size] for i in range(0, audio.shape[0], chunk_size)]
+
+    resampler = StreamingResampler(args.input_rate, args.output_rate)
+    librosa_ms = timed_per_chunk(
+        lambda chunk: librosa.resample(chunk, orig_sr=args.input_rate, target_sr=args.output_rate), chunks, args.repeat)
+    resampler_ms = timed_per_chunk(resampler.process, chunks, args.repeat)
+
+    # streaming output must not depend on how the stream is chunked
+    resampler.reset()
+    streamed = np.concatenate([resampler.process(chunk) for chunk in chunks])
+    resampler.reset()
+    oneshot = resampler.process(audio)
+    chunk_diff = np.abs(streamed - oneshot).max()
+
+    # quality against librosa on the whole signal, aligned by the resampler's filter delay
+    reference = librosa.resample(audio, orig_sr=args.input_rate, target_sr=args.output_rate)
+    delay = 0 if resampler.up == resampler.down else resampler.delay
+    length = min(reference.shape[0], streamed.shape[0])
+    reference = fractional_delay(reference[:length], delay)
+    trim = args.output_rate // 10
+    error = streamed[trim:length - trim] - reference[trim:length - trim]
+    snr = 10 * np.log10(np.sum(reference[trim:length - trim] ** 2) / np.sum(error ** 2))
+
+    frame_length = args.input_rate // 30
+    librosa_rms_ms = timed_per_chunk(
+        lambda chunk: librosa.feature.rms(y=chunk, frame_length=frame_length, hop_length=frame_length), chunks,
+        args.repeat)
+    rms_ms = timed_per_chunk(lambda chunk: framewise_rms(chunk, frame_length, frame_length), chunks, args.repeat)
+    rms_diff = max(np.abs(framewise_rms(chunk, frame_length, frame_length) -
+                          librosa.feature.rms(y=chunk, frame_length=frame_length, hop_length=frame_length)[0]).max()
+                   for chunk in chunks)
+
+    print(f"{args.chunk_ms} ms chunks, {args.input_rate} Hz -> {args.output_rate} Hz")
+    print(f"{'':>10} {'librosa ms':>11} {'ours ms':>8} {'max diff':>9}")
+    print(f"{'resample':>10} {librosa_ms:>11.3f} {resampler_ms:>8.3f} {chunk_diff:>9.2e}   snr vs librosa {snr:.1f} dB")
+    print(f"{'rms':>10} {librosa_rms_ms:>11.3f} {rms_ms:>8.3f} {rms_diff:>9.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "src")
+if src_dir not in sys.path:
+    sys.path.insert(0, src_dir)
+
+from engine_utils.general_slicer import SliceContext, slice_data
+
+# (handler, slice size, typical input chunk size)
+SLICE_CASES = [
+    ("vad", 512, 320),
+    ("asr", 16000, 512),
+    ("lam", 24000, 7200),
+]
+
+
+def run_slicer(context: SliceContext, chunks):
+    slice_num = 0
+    for chunk in chunks:
+        for _ in slice_data(context, chunk):
+            slice_num += 1
+    context.flush()
+    return slice_num
+
+
+def bench_case(slice_size: int, chunk_size: int, total_seconds: float, sample_rate: int, repeat: int):
+    rng = np.random.default_rng(0)
+    chunk_num = max(1, int(total_seconds * sample_rate / chunk_size))
+    chunks = [rng.uniform(-1, 1, chunk_size).astype(np.float32) for _ in range(chunk_num)]
+    results = {}
+    for name, factory in [("list", SliceContext.create_numpy_slice_context),
+                          ("ring", SliceContext.create_numpy_ring_slice_context)]:
+        best = None
+        for _ in range(repeat):
+            context = factory(slice_size, 0)
+            t_start = time.perf_counter()
+            slice_num = run_slicer(context, chunks)
+            duration = time.perf_counter() - t_start
+            best = duration if best is None else min(best, duration)
+        results[name] = (best, chunk_num, slice_num)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--sample_rate", type=int, default=16000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'case':>5} {'slice':>6} {'chunk':>6} {'list us/chunk':>14} {'ring us/chunk':>14} {'speedup':>8}")
+    for name, slice_size, chunk_size in SLICE_CASES:
+        results = bench_case(slice_size, chunk_size, args.seconds, args.sample_rate, args.repeat)
+        list_time, chunk_num, _ = results["list"]
+        ring_time, _, _ = results["ring"]
+        print(f"{name:>5} {slice_size:>6} {chunk_size:>6} {list_time / chunk_num * 1e6:>14.2f} "
+              f"{ring_time / chunk_num * 1e6:>14.2f} {list_time / ring_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+from aiohttp import web
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.join(os.path.dirname(os.path.dirname(script_dir)), "src")
+for path in (src_dir, script_dir):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from handlers.tts.edgetts.tts_async_pipeline import EdgeTTSPipeline
+from tts_stub_server import create_app
+
+SENTENCES = ["你好，", "今天天气不错。", "我们去公园散步吧！", "顺便买点水果，", "晚上一起吃饭。"]
+
+
+def start_stub_server(port: int, first_chunk_delay: float):
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(create_app(first_chunk_delay=first_chunk_delay))
+
+    def _run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+        loop.run_forever()
+
+    threading.Thread(target=_run, daemon=True).start()
+
+
+def run_sessions(pipeline: EdgeTTSPipeline, session_num: int, max_in_flight: int):
+    done = threading.Semaphore(0)
+    first_audio_latency = []
+    sessions = []
+    t_start = time.perf_counter()
+    for i in range(session_num):
+        state = {"first": None, "order": []}
+
+        def on_audio(_audio, speech_id, state=state):
+            if state["first"] is None:
+                state["first"] = time.perf_counter() - t_start
+            state["order"].append(speech_id)
+
+        def on_speech_end(_speech_id, state=state):
+            first_audio_latency.append(state["first"])
+            done.release()
+
+        session = pipeline.create_session(max_in_flight, on_audio, on_speech_end)
+        sessions.append((session, state))
+        for j, sentence in enumerate(SENTENCES):
+            session.submit_sentence(str(j), sentence)
+        session.submit_speech_end(str(len(SENTENCES)))
+    for _ in range(session_num):
+        done.acquire()
+    duration = time.perf_counter() - t_start
+    for session, state in sessions:
+        assert state["order"] == sorted(state["order"]), "audio delivered out of sentence order"
+        session.close()
+    return duration, sum(first_audio_latency) / len(first_audio_latency)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--in_flight", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--max_connections", type=int, default=16)
+    parser.add_argument("--first_chunk_delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    start_stub_server(args.port, args.first_chunk_delay)
+    time.sleep(0.5)
+    pipeline = EdgeTTSPipeline(voice="stub", sample_rate=24000, audio_chunk_size=3600,
+                               max_connections=args.max_connections,
+                               stub_server_url=f"http://127.0.0.1:{args.port}/tts")
+    print(f"{'sessions':>8} {'in_flight':>9} {'total s':>8} {'first audio ms':>15}")
+    for session_num in args.sessions:
+        for max_in_flight in args.in_flight:
+            duration, first_audio = run_sessions(pipeline, session_num, max_in_flight)
+            print(f"{session_num:>8} {max_in_flight:>9} {duration:>8.2f} {first_audio * 1000:>15.1f}")
+    pipeline.shutdown()
+
+
+if __name__ == "__main__":
+    main()
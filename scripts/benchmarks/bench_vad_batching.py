@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "src")
+if src_dir not in sys.path:
+    sys.path.insert(0, src_dir)
+
+from handlers.vad.silerovad.vad_batch_engine import SileroVADBatchEngine
+
+
+def load_model():
+    import onnxruntime
+    model_path = os.path.join(src_dir, "handlers", "vad", "silerovad", "silero_vad",
+                              "src", "silero_vad", "data", "silero_vad.onnx")
+    options = onnxruntime.SessionOptions()
+    options.inter_op_num_threads = 1
+    options.intra_op_num_threads = 1
+    options.log_severity_level = 4
+    return onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"], sess_options=options)
+
+
+def bench_per_session(model, clips, rounds):
+    sr = np.array([16000], dtype=np.int64)
+    states = [np.zeros((2, 1, 128), dtype=np.float32) for _ in range(clips.shape[0])]
+    t_start = time.perf_counter()
+    for _ in range(rounds):
+        for i in range(clips.shape[0]):
+            _, states[i] = model.run(None, {"input": clips[i:i + 1], "sr": sr, "state": states[i]})
+    return time.perf_counter() - t_start
+
+
+def bench_batched(model, clips, rounds):
+    sr = np.array([16000], dtype=np.int64)
+    state = np.zeros((2, clips.shape[0], 128), dtype=np.float32)
+    t_start = time.perf_counter()
+    for _ in range(rounds):
+        _, state = model.run(None, {"input": clips, "sr": sr, "state": state})
+    return time.perf_counter() - t_start
+
+
+def bench_engine(model, clips, rounds):
+    engine = SileroVADBatchEngine(model, max_batch_size=clips.shape[0])
+
+    def session_worker(session_index):
+        state = np.zeros((2, 1, 128), dtype=np.float32)
+        for _ in range(rounds):
+            _, state = engine.infer(clips[session_index], state)
+
+    workers = []
+    for i in range(clips.shape[0]):
+        workers.append(threading.Thread(target=session_worker, args=(i,)))
+    t_start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - t_start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    model = load_model()
+    rng = np.random.default_rng(0)
+    print(f"{'sessions':>8} {'per-session ms/clip':>20} {'batched ms/clip':>16} "
+          f"{'engine ms/clip':>15} {'speedup':>8}")
+    for session_num in args.sessions:
+        clips = rng.uniform(-0.5, 0.5, size=(session_num, 512)).astype(np.float32)
+        clip_num = session_num * args.rounds
+        dur_single = bench_per_session(model, clips, args.rounds)
+        dur_batched = bench_batched(model, clips, args.rounds)
+        dur_engine = bench_engine(model, clips, args.rounds)
+        print(f"{session_num:>8} {dur_single / clip_num * 1e3:>20.4f} {dur_batched / clip_num * 1e3:>16.4f} "
+              f"{dur_engine / clip_num * 1e3:>15.4f} {dur_single / dur_batched:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
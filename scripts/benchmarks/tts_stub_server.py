@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import io
+
+import av
+import numpy as np
+from aiohttp import web
+
+# Stand-in for the tts service: answers POST {"text": ...} with a streamed mp3 sine tone whose length
+# follows the text length. Point TTSConfig.stub_server_url at it to run the tts handler offline.
+
+
+def encode_mp3(duration: float, sample_rate: int = 24000) -> bytes:
+    buffer = io.BytesIO()
+    container = av.open(buffer, "w", format="mp3")
+    stream = container.add_stream("mp3", rate=sample_rate)
+    stream.layout = "mono"
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    pcm = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    for start in range(0, pcm.shape[0], 1152):
+        frame = av.AudioFrame.from_ndarray(pcm[np.newaxis, start:start + 1152], format="flt", layout="mono")
+        frame.sample_rate = sample_rate
+        for packet in stream.encode(frame):
+            container.mux(packet)
+    for packet in stream.encode(None):
+        container.mux(packet)
+    container.close()
+    return buffer.getvalue()
+
+
+def create_app(first_chunk_delay: float = 0.2, chunk_interval: float = 0.02,
+               chunk_size: int = 4096, seconds_per_char: float = 0.2) -> web.Application:
+    audio_cache = {}
+
+    async def synthesize(request: web.Request):
+        body = await request.json()
+        duration = round(max(0.5, len(body.get("text", "")) * seconds_per_char), 1)
+        data = audio_cache.get(duration)
+        if data is None:
+            data = encode_mp3(duration)
+            audio_cache[duration] = data
+        response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        await asyncio.sleep(first_chunk_delay)
+        for start in range(0, len(data), chunk_size):
+            await response.write(data[start:start + chunk_size])
+            await asyncio.sleep(chunk_interval)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/tts", synthesize)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first_chunk_delay", type=float, default=0.2)
+    parser.add_argument("--chunk_interval", type=float, default=0.02)
+    args = parser.parse_args()
+    web.run_app(create_app(args.first_chunk_delay, args.chunk_interval), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
 import uuid
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 from loguru import logger
 
@@ -8,6 +8,9 @@ from chat_engine.common.client_handler_base import ClientHandlerBase
 from chat_engine.contexts.session_context import SessionContext
 from chat_engine.core.chat_session import ChatSession
 from chat_engine.core.handler_manager import HandlerManager
+from chat_engine.core.routing_plan import RoutingPlanCache, RoutingPlan
+from chat_engine.core.session_scheduler import SessionScheduler
+from chat_engine.core.turn_tracer import TraceExporter, TurnTracer, create_trace_exporters
 from chat_engine.data_models.chat_engine_config_data import ChatEngineConfigModel, EngineChannelType
 from chat_engine.data_models.session_info_data import SessionInfoData, IOQueueType
 from engine_utils.directory_info import DirectoryInfo
@@ -19,6 +22,10 @@ class ChatEngine(object):
         self.inited = False
         self.engine_config: Optional[ChatEngineConfigModel] = None
         self.handler_manager: HandlerManager = HandlerManager(self)
+        self.scheduler: Optional[SessionScheduler] = None
+        self.trace_exporters: List[TraceExporter] = []
+        # sessions of the same handler set share a compiled routing plan
+        self.routing_plans: RoutingPlanCache = RoutingPlanCache()
 
         self.sessions: Dict[str, ChatSession] = {}
 
@@ -31,6 +38,8 @@ class ChatEngine(object):
         self.engine_config = engine_config
         if not os.path.isabs(engine_config.model_root):
             engine_config.model_root = os.path.join(DirectoryInfo.get_project_dir(), engine_config.model_root)
+        self.scheduler = SessionScheduler(engine_config.scheduler)
+        self.trace_exporters = create_trace_exporters(engine_config.tracing)
         self.handler_manager.initialize(engine_config)
         self.handler_manager.load_handlers(engine_config, app, ui, parent_block)
         self.inited = True
@@ -46,8 +55,11 @@ class ChatEngine(object):
         session_context = SessionContext(session_info=session_info,
                                          input_queues=input_queues,
                                          output_queues=output_queues)
+        if self.engine_config.tracing.enabled:
+            session_context.turn_tracer = TurnTracer(session_info.session_id, self.engine_config.tracing,
+                                                     self.trace_exporters)
 
-        session = ChatSession(session_context, self.engine_config)
+        session = ChatSession(session_context, self.engine_config, self.scheduler, self.routing_plans)
         handlers = self.handler_manager.get_enabled_handler_registries()
         for registry in handlers:
             if isinstance(registry.handler, ClientHandlerBase):
@@ -70,7 +82,8 @@ class ChatEngine(object):
         if registry is None:
             raise RuntimeError(f"client handler {client_handler} not found")
 
-        handler_env = session.prepare_handler(client_handler, registry.base_info, registry.handler_config)
+        handler_env = session.prepare_handler(client_handler, registry.base_info, registry.handler_config,
+                                              is_client=True)
         return session, handler_env
 
     def stop_session(self, session_id: str):
@@ -79,3 +92,25 @@ class ChatEngine(object):
             logger.error(f"Session {session_id} is not found.")
             return
         session.stop()
+
+    def shutdown(self):
+        for session_id in list(self.sessions.keys()):
+            self.stop_session(session_id)
+        self.handler_manager.destroy_handlers()
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+            self.scheduler = None
+        # sessions are stopped first, their tracers export the turns still open
+        for exporter in self.trace_exporters:
+            exporter.close()
+        self.trace_exporters = []
+        self.inited = False
+
+    def get_turn_tracer(self, session_id: str) -> Optional[TurnTracer]:
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        return session.session_context.turn_tracer
+
+    def get_routing_plans(self) -> List[RoutingPlan]:
+        return self.routing_plans.get_plans()
@@ -8,6 +8,7 @@ from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.contexts.handler_context import HandlerContext
 from chat_engine.contexts.session_context import SessionContext
 from chat_engine.data_models.chat_data.chat_data_model import ChatData
+from chat_engine.data_models.chat_signal import ChatSignal
 from chat_engine.data_models.chat_engine_config_data import ChatEngineConfigModel, HandlerBaseConfigModel
 from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition
 
@@ -17,6 +18,11 @@ class ChatDataConsumeMode(Enum):
     DEFAULT = 0
 
 
+class HandlerExecutionPool(Enum):
+    CPU = "cpu"
+    IO = "io"
+
+
 @dataclass
 class HandlerBaseInfo:
     name: Optional[str] = None
@@ -24,6 +30,10 @@ class HandlerBaseInfo:
     client_session_delegate_class: Optional[type] = None
     # Handler load priority, the smaller, the higher
     load_priority: int = 0
+    # Max number of sessions running this handler at the same time, 0 means unlimited
+    max_concurrency: int = 0
+    # Handlers blocking on network should use IO pool, so they will not starve compute bound handlers
+    execution_pool: HandlerExecutionPool = HandlerExecutionPool.CPU
 
 
 @dataclass
@@ -84,3 +94,11 @@ class HandlerBase(ABC):
     @abstractmethod
     def destroy_context(self, context: HandlerContext):
         pass
+
+    def on_signal(self, context: HandlerContext, signal: ChatSignal):
+        """Called from the thread emitting the signal, handle may be running on a worker at the same time."""
+        pass
+
+    def destroy(self):
+        """Called once when the engine shuts down after every context is destroyed, releases what load created."""
+        pass
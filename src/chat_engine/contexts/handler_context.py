@@ -4,6 +4,7 @@ import numpy as np
 
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.data_models.chat_data.chat_data_model import ChatData
+from chat_engine.data_models.chat_signal import ChatSignal
 from chat_engine.data_models.runtime_data.data_bundle import DataBundle
 
 HandlerResultType = Union[
@@ -18,9 +19,16 @@ class HandlerContext(object):
         self.session_id = session_id
         self.owner = None
         self.data_submitter = None
+        self.signal_emitter = None
 
     def submit_data(self, data: HandlerResultType):
         if self.data_submitter is None:
             logger.error("Session is not started, data submitter not ready.")
             return
         self.data_submitter.submit(data)
+
+    def emit_signal(self, signal: ChatSignal):
+        if self.signal_emitter is None:
+            logger.error("Session is not started, signal emitter not ready.")
+            return
+        self.signal_emitter.emit(signal)
@@ -1,9 +1,11 @@
 import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Deque, Dict, List, Tuple, Optional
 
 from loguru import logger
 
+from chat_engine.core.turn_tracer import TurnTracer
 from chat_engine.data_models.chat_engine_config_data import EngineChannelType
 from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundleEntry
 from chat_engine.data_models.session_info_data import SessionInfoData, IOQueueType
@@ -25,6 +27,12 @@ class SessionContext(object):
         self.shared_states = SharedStates()
         self.input_definitions: Dict[EngineChannelType, DataBundleDefinition] = {}
         self.input_start_time: float = -1.0
+        # set by the engine when tracing is enabled
+        self.turn_tracer: Optional[TurnTracer] = None
+        # speech the avatar is responding with, the target of interrupts that do not name one
+        self.avatar_speech_id: Optional[str] = None
+        # inputs of interrupted speeches are dropped instead of handled
+        self.cancelled_speech_ids: Deque[str] = deque(maxlen=16)
 
     def get_input_audio_definition(self, sample_rate: int, channel_num: int = 1, entry_name: str = "mic_audio"):
         definition = self.input_definitions.get(EngineChannelType.AUDIO, None)
@@ -1,7 +1,9 @@
 import asyncio
+import functools
 import queue
 import threading
 import time
+import weakref
 from dataclasses import dataclass
 from typing import Optional, Dict, List, Tuple, Iterable
 from uuid import uuid4
@@ -11,15 +13,30 @@ from loguru import logger
 
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.common.engine_channel_type import EngineChannelType
-from chat_engine.common.handler_base import HandlerBase, HandlerBaseInfo, HandlerDataInfo, ChatDataConsumeMode
+from chat_engine.common.handler_base import HandlerBase, HandlerBaseInfo, HandlerDataInfo
 from chat_engine.contexts.handler_context import HandlerContext, HandlerResultType
 from chat_engine.contexts.session_context import SessionContext
+from chat_engine.core.routing_plan import RoutingPlanCache, RoutingPlan, HandlerDeclaration, RouteKey
+from chat_engine.core.session_scheduler import SessionScheduler, HandlerInputQueue, HandlerWorkItem
+from chat_engine.core.turn_tracer import TurnTracer
 from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_engine_config_data import HandlerBaseConfigModel, ChatEngineConfigModel
 from chat_engine.data_models.chat_signal import ChatSignal
 from chat_engine.data_models.chat_signal_type import ChatSignalSourceType, ChatSignalType
 from chat_engine.data_models.runtime_data.data_bundle import DataBundle
 from chat_engine.data_models.session_info_data import IOQueueType
+from engine_utils.metrics_registry import MetricsRegistry, HistogramChild
+
+ACTIVE_SESSIONS = MetricsRegistry().gauge("chat_active_sessions", "Chat sessions started and not stopped yet.")
+HANDLER_HANDLE_SECONDS = MetricsRegistry().histogram(
+    "chat_handler_handle_seconds", "Time a handler takes for one input, outputs of generators included.",
+    ("handler",))
+INTERRUPTS = MetricsRegistry().counter("chat_interrupts_total", "Speeches cancelled by interrupt signals.")
+INTERRUPT_DROPPED_INPUTS = MetricsRegistry().counter(
+    "chat_interrupt_dropped_inputs_total", "Inputs of interrupted speeches dropped instead of handled.", ("handler",))
+INTERRUPT_SAVED_SECONDS = MetricsRegistry().counter(
+    "chat_interrupt_saved_seconds_total",
+    "Handler time saved by dropped inputs, estimated from the mean handle time of the handler.", ("handler",))
 
 
 @dataclass
@@ -28,14 +45,18 @@ class HandlerEnv:
     handler: HandlerBase
     config: HandlerBaseConfigModel
     context: Optional[HandlerContext] = None
-    input_queue: Optional[queue.Queue] = None
+    input_queue: Optional[HandlerInputQueue] = None
+    input_info: Optional[Dict[ChatDataType, HandlerDataInfo]] = None
     output_info: Optional[Dict[ChatDataType, HandlerDataInfo]] = None
+    handle_seconds: Optional[HistogramChild] = None
+    # client handlers stand for the user in the routing plan
+    is_client: bool = False
 
 
 @dataclass
 class HandlerRecord:
     env: HandlerEnv
-    pump_thread: Optional[threading.Thread] = None
+    work_item: Optional[HandlerWorkItem] = None
 
 
 @dataclass
@@ -52,32 +73,46 @@ class DataSink:
     consume_info: Optional[HandlerDataInfo] = None
 
 
-class ChatDataSubmitter:
-    def __init__(self, handler_name: str, output_info, session_context, sinks, outputs):
-        self.handler_name = handler_name
-        self.output_info = output_info
-        self.session_context = session_context
-        self.sinks = sinks
-        self.outputs = outputs
+# Wakes the input pump when data is put into one of the wrapped input queues. Producers put from their own threads
+# or event loops, so the put methods of the queue instances are wrapped instead of polling every queue.
+class InputWakeup:
+    def __init__(self):
+        self.event = threading.Event()
+        self.wrapped: List[Tuple[IOQueueType, str]] = []
 
-    def submit(self, data: HandlerResultType):
-        ChatSession.submit_data(
-            data,
-            self.handler_name,
-            self.output_info,
-            self.session_context,
-            self.sinks,
-            self.outputs
-        )
+    def wrap(self, data_queue: IOQueueType):
+        # asyncio.Queue.put ends in put_nowait, queue.Queue.put_nowait ends in put
+        method_name = "put" if isinstance(data_queue, queue.Queue) else "put_nowait"
+        put_method = getattr(data_queue, method_name)
+        event = self.event
+
+        def _put_and_wake(*args, **kwargs):
+            result = put_method(*args, **kwargs)
+            event.set()
+            return result
+
+        setattr(data_queue, method_name, _put_and_wake)
+        self.wrapped.append((data_queue, method_name))
+
+    def unwrap(self):
+        for data_queue, method_name in self.wrapped:
+            data_queue.__dict__.pop(method_name, None)
+        self.wrapped.clear()
+
+
+# Queues bound to a compiled route of the routing plan, handler sinks are in delivery order.
+@dataclass(slots=True)
+class DataRoute:
+    output: Optional[DataSink] = None
+    sinks: Tuple[DataSink, ...] = ()
 
 
 class ChatDataSubmitter:
-    def __init__(self, handler_name: str, output_info, session_context, sinks, outputs):
+    def __init__(self, handler_name: str, output_info, session_context, routes):
         self.handler_name = handler_name
         self.output_info = output_info
         self.session_context = session_context
-        self.sinks = sinks
-        self.outputs = outputs
+        self.routes = routes
 
     def submit(self, data: HandlerResultType):
         ChatSession.submit_data(
@@ -85,27 +120,46 @@ class ChatDataSubmitter:
             self.handler_name,
             self.output_info,
             self.session_context,
-            self.sinks,
-            self.outputs
+            self.routes,
         )
 
 
+class ChatSignalEmitter:
+    def __init__(self, session: "ChatSession"):
+        self.session_ref = weakref.ref(session)
+
+    def emit(self, signal: ChatSignal):
+        session = self.session_ref()
+        if session is not None:
+            session.emit_signal(signal)
+
+
 class ChatSession:
     input_type_mapping = {
         EngineChannelType.VIDEO: [ChatDataType.CAMERA_VIDEO],
         EngineChannelType.AUDIO: [ChatDataType.MIC_AUDIO],
         EngineChannelType.TEXT: [ChatDataType.HUMAN_TEXT]
     }
+    # Longest time a pump thread blocks before checking shared_states.active again.
+    pump_wait_timeout = 0.1
 
-    def __init__(self, session_context: SessionContext, engine_config: ChatEngineConfigModel):
+    def __init__(self, session_context: SessionContext, engine_config: ChatEngineConfigModel,
+                 scheduler: SessionScheduler, routing_plans: Optional[RoutingPlanCache] = None):
         self.session_context = session_context
+        # worker pools are owned by the engine and shared by its sessions
+        self.scheduler = scheduler
+        if routing_plans is None:
+            routing_plans = RoutingPlanCache()
+        self.routing_plans = routing_plans
+        self.routing_plan: Optional[RoutingPlan] = None
 
-        self.data_sinks: Dict[ChatDataType, List[DataSink]] = {}
         self.inputs: List[DataSource] = []
         self.outputs: Dict[Tuple[str, ChatDataType], DataSink] = {}
+        self.routes: Dict[RouteKey, DataRoute] = {}
 
         self.handlers: Dict[str, HandlerRecord] = {}
         self.input_pump_thread: Optional[threading.Thread] = None
+        self.input_wakeup = InputWakeup()
 
         for channel_type, input_queue in session_context.input_queues.items():
             target_types = self.input_type_mapping.get(channel_type, None)
@@ -145,10 +199,8 @@ class ChatSession:
                           _target_type: ChatDataType):
         sr, audio_array = audio_data
         definition = session_context.get_input_audio_definition(sr, 1)
-        data_bundle = DataBundle(definition)
         audio_array = audio_array.squeeze()[np.newaxis, ...]
-        data_bundle.set_main_data(audio_array)
-        return data_bundle
+        return DataBundle.create_with_main_data(definition, audio_array)
 
     @classmethod
     def packet_video_data(cls, session_context: SessionContext, video_data: np.ndarray,
@@ -159,10 +211,8 @@ class ChatSession:
             list(image.shape), frame_rate,
             allow_shape_change=True
         )
-        data_bundle = DataBundle(definition)
         input_image = image[np.newaxis, ...]
-        data_bundle.set_main_data(input_image)
-        return data_bundle
+        return DataBundle.create_with_main_data(definition, input_image)
     
     @classmethod
     def packet_text_data(cls, session_context: SessionContext, text_data: Tuple,
@@ -201,13 +251,14 @@ class ChatSession:
 
     @classmethod
     def inputs_pumper(cls, session_context: SessionContext, inputs: List[DataSource],
-                    sinks: Dict[ChatDataType, List[DataSink]],
-                    outputs: Dict[Tuple[str, ChatDataType], DataSink]):
+                      routes: Dict[RouteKey, DataRoute], wakeup: InputWakeup):
         shared_states = session_context.shared_states
+        if len(inputs) == 0:
+            return
         while shared_states.active:
+            # cleared before the queues are checked, so a put racing with the check is not missed
+            wakeup.event.clear()
             input_data_list = []
-            timestamp = session_context.get_timestamp()
-
             for input_source in inputs:
                 input_queue = input_source.source_queue
                 try:
@@ -216,8 +267,9 @@ class ChatSession:
                 except (queue.Empty, asyncio.QueueEmpty):
                     continue
             if len(input_data_list) == 0:
-                time.sleep(0.03)
+                wakeup.event.wait(cls.pump_wait_timeout)
                 continue
+            timestamp = session_context.get_timestamp()
             for input_source, input_data in input_data_list:
                 for target_type in input_source.target_types:
                     chat_data = cls.packet_input_data(session_context, input_data, target_type)
@@ -226,7 +278,7 @@ class ChatSession:
                     if not chat_data.is_timestamp_valid():
                         chat_data.timestamp = timestamp
                     chat_data.source = input_source.owner
-                    cls.distribute_data(chat_data, sinks, outputs)
+                    cls.distribute_data(chat_data, routes, session_context.turn_tracer)
 
     @classmethod
     def _packet_chat_data(cls, handler_name: str, output_info, session_context: SessionContext,
@@ -257,8 +309,7 @@ class ChatSession:
             if chat_data_type not in output_info:
                 msg = f"Handler output type {chat_data_type} is not configured in outputs declaration."
                 raise ValueError(msg)
-            data_bundle = DataBundle(definition=output_info[chat_data_type].definition)
-            data_bundle.set_main_data(raw_data)
+            data_bundle = DataBundle.create_with_main_data(output_info[chat_data_type].definition, raw_data)
             chat_data = ChatData(
                 data=data_bundle,
                 type=chat_data_type,
@@ -270,118 +321,173 @@ class ChatSession:
         if not chat_data.is_timestamp_valid():
             chat_data.timestamp = timestamp
         chat_data.source = handler_name
+        if chat_data.type == ChatDataType.AVATAR_TEXT and chat_data.data is not None:
+            speech_id = chat_data.data.get_meta("speech_id")
+            if speech_id is not None:
+                session_context.avatar_speech_id = speech_id
         return chat_data
 
     @classmethod
-    def distribute_data(cls, data: ChatData, sinks: Dict[ChatDataType, List[DataSink]],
-                       outputs: Dict[Tuple[str, ChatDataType], DataSink]):
-        source_key = (data.source, data.type)
-        data_sink = outputs.get(source_key, None)
-        if data_sink is not None:
-            data_sink.sink_queue.put_nowait(data)
-        sink_list = sinks.get(data.type, [])
-        for sink in sink_list:
-            if sink.owner == data.source:
-                continue
+    def distribute_data(cls, data: ChatData, routes: Dict[RouteKey, DataRoute], tracer: Optional[TurnTracer] = None):
+        if tracer is not None:
+            tracer.on_distribute(data)
+            if data.trace is None:
+                tracer = None
+        route = routes.get((data.source, data.type))
+        if route is None:
+            return
+        if route.output is not None:
+            if tracer is not None:
+                tracer.record_output(data, f"output.{data.type.channel_type.value}")
+            route.output.sink_queue.put_nowait(data)
+        for sink in route.sinks:
+            if tracer is not None:
+                tracer.record_enqueue(data, sink.owner)
             sink.sink_queue.put_nowait(data)
-            if sink.consume_info.input_consume_mode == ChatDataConsumeMode.ONCE:
-                break
 
     @classmethod
     def submit_data(cls, data: HandlerResultType, handler_name: str, output_info, session_context: SessionContext,
-                    sinks: Dict[ChatDataType, List[DataSink]], outputs: Dict[Tuple[str, ChatDataType], DataSink]):
+                    routes: Dict[RouteKey, DataRoute]):
         chat_data = cls._packet_chat_data(handler_name, output_info, session_context, data)
         if chat_data is not None:
-            cls.distribute_data(chat_data, sinks, outputs)
+            cls.distribute_data(chat_data, routes, session_context.turn_tracer)
 
     @classmethod
-    def handler_pumper(cls, session_context: SessionContext, handler_env: HandlerEnv,
-                       sinks: Dict[ChatDataType, List[DataSink]],
-                       outputs: Dict[Tuple[str, ChatDataType], DataSink]):
-        shared_states = session_context.shared_states
-        input_queue = handler_env.input_queue
+    def process_handler_input(cls, session_context: SessionContext, handler_env: HandlerEnv, input_data: ChatData,
+                              routes: Dict[RouteKey, DataRoute]):
         handler = handler_env.handler
         output_info = handler_env.output_info
         if output_info is None:
             output_info = {}
-        while shared_states.active:
-            try:
-                input_data = input_queue.get_nowait()
-            except (queue.Empty, asyncio.QueueEmpty):
-                time.sleep(0.03)
+        cancelled_speech_ids = session_context.cancelled_speech_ids
+        if cancelled_speech_ids and cls._is_cancelled(input_data, cancelled_speech_ids):
+            cls._record_dropped(handler_env, 1)
+            return
+        tracer = session_context.turn_tracer
+        hop = None
+        if tracer is not None and input_data.trace is not None:
+            hop = tracer.record_dequeue(input_data, handler_env.handler_info.name)
+        handle_start = time.monotonic()
+        handler_result = handler.handle(handler_env.context, input_data, output_info)
+        if not isinstance(handler_result, Iterable):
+            handler_result = [handler_result]
+        for handler_output in handler_result:
+            if handler_output is None:
                 continue
-            handler_result = handler.handle(handler_env.context, input_data, output_info)
-            if not isinstance(handler_result, Iterable):
-                handler_result = [handler_result]
-            for handler_output in handler_result:
-                if handler_result is None:
-                    continue
-                chat_data = cls._packet_chat_data(
-                    handler_env.handler_info.name,
-                    output_info,
-                    session_context,
-                    handler_output
-                )
-                if chat_data is None:
-                    continue
-                cls.distribute_data(chat_data, sinks, outputs)
+            chat_data = cls._packet_chat_data(
+                handler_env.handler_info.name,
+                output_info,
+                session_context,
+                handler_output
+            )
+            if chat_data is None:
+                continue
+            cls.distribute_data(chat_data, routes, tracer)
+        # generator handlers do their work while being iterated, their outputs are included
+        handle_duration = time.monotonic() - handle_start
+        handler_env.handle_seconds.observe(handle_duration)
+        if hop is not None:
+            tracer.record_handled(input_data, hop, handle_duration)
+
+    @classmethod
+    def _is_cancelled(cls, chat_data: ChatData, cancelled_speech_ids) -> bool:
+        return chat_data.data is not None and chat_data.data.get_meta("speech_id") in cancelled_speech_ids
+
+    @classmethod
+    def _record_dropped(cls, handler_env: HandlerEnv, dropped: int):
+        if dropped <= 0:
+            return
+        handler_name = handler_env.handler_info.name
+        INTERRUPT_DROPPED_INPUTS.labels(handler_name).inc(dropped)
+        INTERRUPT_SAVED_SECONDS.labels(handler_name).inc(dropped * handler_env.handle_seconds.get_mean())
 
     def prepare_handler(self, handler: HandlerBase, handler_info: HandlerBaseInfo,
-                        handler_config: HandlerBaseConfigModel):
-        handler_env = HandlerEnv(handler_info=handler_info, handler=handler, config=handler_config)
+                        handler_config: HandlerBaseConfigModel, is_client: bool = False):
+        handler_env = HandlerEnv(handler_info=handler_info, handler=handler, config=handler_config,
+                                 is_client=is_client)
+        handler_env.handle_seconds = HANDLER_HANDLE_SECONDS.labels(handler_info.name)
         handler_env.context = handler.create_context(self.session_context, handler_env.config)
         handler_env.context.owner = handler_info.name
-        handler_env.input_queue = queue.Queue()
+        handler_env.input_queue = HandlerInputQueue()
         io_detail = handler.get_handler_detail(self.session_context, handler_env.context)
-        inputs = io_detail.inputs
-        for input_type, input_info in inputs.items():
-            sink_list = self.data_sinks.setdefault(input_type, [])
-            data_sink = DataSink(owner=handler_info.name, sink_queue=handler_env.input_queue, consume_info=input_info)
-            sink_list.append(data_sink)
+        handler_env.input_info = io_detail.inputs
         handler_env.output_info = io_detail.outputs
 
         self.handlers[handler_info.name] = HandlerRecord(env=handler_env)
         return handler_env
 
-    def sort_sinks(self):
-        for input_type, sink_list in self.data_sinks.items():
-            sink_list.sort(key=lambda x: x.consume_info)
+    def bind_routes(self):
+        declarations = []
+        for handler_name, handler_record in self.handlers.items():
+            env = handler_record.env
+            declarations.append(HandlerDeclaration(
+                name=handler_name,
+                inputs=env.input_info or {},
+                output_types=tuple((env.output_info or {}).keys()),
+                is_client=env.is_client,
+            ))
+        output_channels = {key: sink.consume_info.type.channel_type for key, sink in self.outputs.items()}
+        input_types = tuple(x for source in self.inputs for x in source.target_types)
+        self.routing_plan = self.routing_plans.get_plan(declarations, output_channels, input_types)
+        self.routes.clear()
+        for route_key, route in self.routing_plan.routes.items():
+            sinks = []
+            for consumer in route.consumers:
+                env = self.handlers[consumer].env
+                sinks.append(DataSink(owner=consumer, sink_queue=env.input_queue,
+                                      consume_info=env.input_info[route.type]))
+            self.routes[route_key] = DataRoute(output=self.outputs.get(route_key), sinks=tuple(sinks))
 
     def start(self):
         if self.session_context.shared_states.active:
             return
         self.session_context.shared_states.active = True
-        self.sort_sinks()
+        ACTIVE_SESSIONS.inc()
+        self.bind_routes()
         for handler_name, handler_record in self.handlers.items():
-            start_args = (self.session_context, handler_record.env,
-                          self.data_sinks, self.outputs)
             handler_submitter = ChatDataSubmitter(
                 handler_name,
                 handler_record.env.output_info,
                 self.session_context,
-                self.data_sinks,
-                self.outputs,
+                self.routes,
             )
             handler_record.env.context.data_submitter = handler_submitter
+            handler_record.env.context.signal_emitter = ChatSignalEmitter(self)
             handler_record.env.handler.start_context(self.session_context, handler_record.env.context)
-            handler_record.pump_thread = threading.Thread(target=self.handler_pumper, args=start_args)
-            handler_record.pump_thread.start()
-        input_pumper_args = (self.session_context, self.inputs, self.data_sinks, self.outputs)
-        self.input_pump_thread = threading.Thread(target=self.inputs_pumper, args=input_pumper_args)
-        self.input_pump_thread.start()
+            handler_record.work_item = self.scheduler.create_work_item(
+                handler_record.env.handler_info,
+                handler_record.env.input_queue,
+                functools.partial(self.process_handler_input, self.session_context, handler_record.env,
+                                  routes=self.routes),
+                self.session_context.shared_states,
+            )
+            if not handler_record.env.input_queue.empty():
+                handler_record.work_item.notify()
+        if len(self.inputs) > 0:
+            for input_source in self.inputs:
+                self.input_wakeup.wrap(input_source.source_queue)
+            input_pumper_args = (self.session_context, self.inputs, self.routes, self.input_wakeup)
+            self.input_pump_thread = threading.Thread(target=self.inputs_pumper, args=input_pumper_args)
+            self.input_pump_thread.start()
         self.session_context.set_input_start()
 
     def stop(self):
+        if self.session_context.shared_states.active:
+            ACTIVE_SESSIONS.dec()
         self.session_context.shared_states.active = False
         if self.input_pump_thread:
+            self.input_wakeup.event.set()
             self.input_pump_thread.join()
             self.input_pump_thread = None
+        self.input_wakeup.unwrap()
         for handler_name, handler_record in self.handlers.items():
-            if handler_record.pump_thread:
-                handler_record.pump_thread.join()
-                handler_record.pump_thread = None
+            if handler_record.work_item:
+                handler_record.work_item.close()
+                handler_record.work_item = None
             handler_record.env.handler.destroy_context(handler_record.env.context)
         self.handlers.clear()
+        if self.session_context.turn_tracer is not None:
+            self.session_context.turn_tracer.close()
         self.session_context.cleanup()
         logger.info("chat session stopped")
 
@@ -389,6 +495,34 @@ class ChatSession:
         return self.session_context.get_timestamp()
 
     def emit_signal(self, signal: ChatSignal):
-        # TODO this is temp implementation a full signal infrastructure is needed.
         if signal.source_type == ChatSignalSourceType.CLIENT and signal.type == ChatSignalType.END:
             self.session_context.shared_states.enable_vad = True
+        elif signal.type == ChatSignalType.INTERRUPT:
+            self.interrupt(signal)
+
+    def interrupt(self, signal: ChatSignal):
+        """Cancels a speech: its queued inputs are dropped and handlers are told to stop working on it."""
+        speech_id = signal.speech_id or self.session_context.avatar_speech_id
+        cancelled_speech_ids = self.session_context.cancelled_speech_ids
+        if speech_id is None or speech_id in cancelled_speech_ids:
+            return
+        cancelled_speech_ids.append(speech_id)
+        INTERRUPTS.inc()
+        signal = signal.model_copy(update={"speech_id": speech_id})
+        dropped_total = 0
+        for handler_name, handler_record in list(self.handlers.items()):
+            env = handler_record.env
+            predicate = functools.partial(self._is_cancelled, cancelled_speech_ids=(speech_id,))
+            if handler_record.work_item is not None:
+                dropped = handler_record.work_item.purge(predicate)
+            else:
+                dropped = env.input_queue.purge(predicate)
+            self._record_dropped(env, dropped)
+            dropped_total += dropped
+            try:
+                env.handler.on_signal(env.context, signal)
+            except Exception as e:
+                logger.opt(exception=e).error(f"Handler {handler_name} failed to handle signal {signal}.")
+        # the avatar stops responding, so the user is listened to again
+        self.session_context.shared_states.enable_vad = True
+        logger.info(f"Speech {speech_id} interrupted, {dropped_total} queued inputs dropped.")
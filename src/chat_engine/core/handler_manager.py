@@ -147,6 +147,13 @@ class HandlerManager:
                 dur_setup = time.monotonic() - setup_start
                 logger.info(f"Setup client handler {registry.base_info.name} loaded in {round(dur_setup * 1e3)} milliseconds")
 
+    def destroy_handlers(self):
+        for registry in self.get_enabled_handler_registries():
+            try:
+                registry.handler.destroy()
+            except Exception as e:
+                logger.opt(exception=e).error(f"Failed to destroy handler {registry.base_info.name}.")
+
     def get_enabled_handler_registries(self, order_by_priority=True):
         result = []
         for handler_name, registry in self.handler_registries.items():
@@ -0,0 +1,197 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from chat_engine.common.engine_channel_type import EngineChannelType
+from chat_engine.common.handler_base import HandlerDataInfo, ChatDataConsumeMode
+from chat_engine.data_models.chat_data_type import ChatDataType
+
+RouteKey = Tuple[str, ChatDataType]
+
+
+# What a handler declared through get_handler_detail, the part of it routing depends on. Client handlers stand for
+# the user, data flowing back to them closes a turn instead of forming a cycle.
+@dataclass
+class HandlerDeclaration:
+    name: str
+    inputs: Dict[ChatDataType, HandlerDataInfo] = field(default_factory=dict)
+    output_types: Tuple[ChatDataType, ...] = ()
+    is_client: bool = False
+
+    def get_signature(self):
+        inputs = tuple(sorted((x.value, info.input_priority, info.input_consume_mode.value)
+                              for x, info in self.inputs.items()))
+        return self.name, self.is_client, inputs, tuple(sorted(x.value for x in self.output_types))
+
+
+@dataclass
+class CompiledRoute:
+    source: str
+    type: ChatDataType
+    # consumers in delivery order, a ONCE consumer ends the list
+    consumers: Tuple[str, ...] = ()
+    output_channel: Optional[EngineChannelType] = None
+
+
+# Fan-out of every (source, type) pair of a handler set. Sessions with the same declarations share one plan and only
+# bind their queues into it, so dispatching a message is a single lookup.
+class RoutingPlan:
+    def __init__(self, declarations: List[HandlerDeclaration],
+                 outputs: Dict[RouteKey, EngineChannelType],
+                 input_types: Tuple[ChatDataType, ...]):
+        self.declarations: Dict[str, HandlerDeclaration] = {x.name: x for x in declarations}
+        self.routes: Dict[RouteKey, CompiledRoute] = {}
+        # pairs engine inputs and handler declarations produce, the pipeline graph
+        self.produced: List[RouteKey] = []
+        self.unconsumed_outputs: List[RouteKey] = []
+        self.cycles: List[List[str]] = []
+
+        consumers_by_type: Dict[ChatDataType, List[Tuple[HandlerDataInfo, str]]] = {}
+        for declaration in declarations:
+            for input_type, input_info in declaration.inputs.items():
+                consumers_by_type.setdefault(input_type, []).append((input_info, declaration.name))
+        for consumer_list in consumers_by_type.values():
+            consumer_list.sort(key=lambda x: x[0])
+
+        # undeclared outputs of a source are routed the same way, declarations only drive the analysis below
+        sources = [""] + [x.name for x in declarations]
+        route_types = set(consumers_by_type.keys()) | set(x[1] for x in outputs.keys())
+        for source in sources:
+            for data_type in route_types:
+                consumers = []
+                for input_info, consumer in consumers_by_type.get(data_type, []):
+                    if consumer == source:
+                        continue
+                    consumers.append(consumer)
+                    if input_info.input_consume_mode == ChatDataConsumeMode.ONCE:
+                        break
+                output_channel = outputs.get((source, data_type))
+                if consumers or output_channel is not None:
+                    self.routes[(source, data_type)] = CompiledRoute(source=source, type=data_type,
+                                                                     consumers=tuple(consumers),
+                                                                     output_channel=output_channel)
+
+        self.produced = [("", x) for x in input_types]
+        self.produced += [(x.name, y) for x in declarations for y in x.output_types]
+        for route_key in self.produced:
+            if route_key not in self.routes:
+                self.unconsumed_outputs.append(route_key)
+        self.cycles = self._find_cycles(self.produced)
+
+    def _find_cycles(self, produced: List[RouteKey]) -> List[List[str]]:
+        edges: Dict[str, List[str]] = {}
+        for route_key in produced:
+            route = self.routes.get(route_key)
+            if route is None or route.source == "" or self.declarations[route.source].is_client:
+                continue
+            for consumer in route.consumers:
+                if not self.declarations[consumer].is_client and consumer not in edges.setdefault(route.source, []):
+                    edges[route.source].append(consumer)
+        # strongly connected components with more than one handler, iterative tarjan
+        index_of: Dict[str, int] = {}
+        low_of: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack = set()
+        cycles = []
+        for root in edges.keys():
+            if root in index_of:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, edge_index = work.pop()
+                if edge_index == 0:
+                    index_of[node] = low_of[node] = len(index_of)
+                    stack.append(node)
+                    on_stack.add(node)
+                successors = edges.get(node, [])
+                if edge_index < len(successors):
+                    work.append((node, edge_index + 1))
+                    successor = successors[edge_index]
+                    if successor not in index_of:
+                        work.append((successor, 0))
+                    elif successor in on_stack:
+                        low_of[node] = min(low_of[node], index_of[successor])
+                    continue
+                if work:
+                    parent = work[-1][0]
+                    low_of[parent] = min(low_of[parent], low_of[node])
+                if low_of[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        cycles.append(sorted(component))
+        return cycles
+
+    def get_route(self, source: str, data_type: ChatDataType) -> Optional[CompiledRoute]:
+        return self.routes.get((source, data_type))
+
+    def to_dict(self) -> Dict:
+        return {
+            "handlers": [{
+                "name": x.name,
+                "client": x.is_client,
+                "inputs": {y.value: info.input_consume_mode.name for y, info in x.inputs.items()},
+                "outputs": [y.value for y in x.output_types],
+            } for x in self.declarations.values()],
+            "routes": [{
+                "source": x.source or "input",
+                "type": x.type.value,
+                "consumers": list(x.consumers),
+                "output": None if x.output_channel is None else x.output_channel.value,
+            } for x in (self.routes[y] for y in self.produced if y in self.routes)],
+            "unconsumed_outputs": [{"source": x[0] or "input", "type": x[1].value} for x in self.unconsumed_outputs],
+            "cycles": self.cycles,
+        }
+
+    def __str__(self):
+        lines = ["RoutingPlan:"]
+        for route in (self.routes[x] for x in self.produced if x in self.routes):
+            targets = list(route.consumers)
+            if route.output_channel is not None:
+                targets.append(f"output.{route.output_channel.value}")
+            lines.append(f"  {route.source or 'input'}:{route.type.value} -> {', '.join(targets)}")
+        for source, data_type in self.unconsumed_outputs:
+            lines.append(f"  unconsumed {source or 'input'}:{data_type.value}")
+        for cycle in self.cycles:
+            lines.append(f"  cycle {' -> '.join(cycle)}")
+        return "\n".join(lines)
+
+
+# Compiled plans of an engine keyed by the declarations they were compiled from, handlers that declare differently
+# per session get a plan for each variant.
+class RoutingPlanCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.plans: Dict[Tuple, RoutingPlan] = {}
+
+    def get_plan(self, declarations: List[HandlerDeclaration], outputs: Dict[RouteKey, EngineChannelType],
+                 input_types: Tuple[ChatDataType, ...]) -> RoutingPlan:
+        signature = (tuple(sorted(x.get_signature() for x in declarations)),
+                     tuple(sorted((x[0], x[1].value, y.value) for x, y in outputs.items())),
+                     tuple(sorted(x.value for x in input_types)))
+        with self.lock:
+            plan = self.plans.get(signature)
+        if plan is not None:
+            return plan
+        compiled = RoutingPlan(declarations, outputs, input_types)
+        with self.lock:
+            plan = self.plans.setdefault(signature, compiled)
+        if plan is not compiled:
+            return plan
+        logger.info(str(plan))
+        for source, data_type in plan.unconsumed_outputs:
+            logger.warning(f"{data_type} produced by {source or 'engine input'} is consumed by no handler or output.")
+        for cycle in plan.cycles:
+            logger.warning(f"Handlers {cycle} feed each other in a cycle.")
+        return plan
+
+    def get_plans(self) -> List[RoutingPlan]:
+        with self.lock:
+            return list(self.plans.values())
@@ -0,0 +1,178 @@
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Optional, Any
+
+from loguru import logger
+
+from chat_engine.common.handler_base import HandlerBaseInfo, HandlerExecutionPool
+from chat_engine.contexts.session_context import SharedStates
+from chat_engine.data_models.chat_engine_config_data import SchedulerConfigModel
+from engine_utils.metrics_registry import MetricsRegistry
+
+HANDLER_QUEUE_DEPTH = MetricsRegistry().gauge(
+    "chat_handler_queue_depth", "Inputs waiting for a handler over all sessions.", ("handler",))
+
+
+class HandlerInputQueue(queue.Queue):
+    def __init__(self):
+        super().__init__()
+        self.on_put: Optional[Callable[[], None]] = None
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        on_put = self.on_put
+        if on_put is not None:
+            on_put()
+
+    def purge(self, predicate: Callable[[Any], bool]) -> int:
+        """Removes queued items the predicate is true for, returns the number removed."""
+        with self.mutex:
+            kept = deque(x for x in self.queue if not predicate(x))
+            removed = len(self.queue) - len(kept)
+            if removed > 0:
+                self.queue = kept
+                self.unfinished_tasks = max(0, self.unfinished_tasks - removed)
+                if self.unfinished_tasks == 0:
+                    self.all_tasks_done.notify_all()
+                self.not_full.notify(removed)
+        return removed
+
+
+class HandlerLimiter:
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.running = 0
+        self.waiting: Deque["HandlerWorkItem"] = deque()
+
+
+# A work item is scheduled at most once at a time, so inputs of one handler context are processed in order.
+class HandlerWorkItem:
+    def __init__(self, scheduler: "SessionScheduler", name: str, input_queue: HandlerInputQueue,
+                 process_func: Callable[[Any], None], shared_states: SharedStates,
+                 limiter: HandlerLimiter, executor: ThreadPoolExecutor):
+        self.scheduler = scheduler
+        self.name = name
+        self.input_queue = input_queue
+        self.process_func = process_func
+        self.shared_states = shared_states
+        self.limiter = limiter
+        self.executor = executor
+
+        self.queue_depth = HANDLER_QUEUE_DEPTH.labels(name)
+
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.closed = False
+        self.idle = threading.Event()
+        self.idle.set()
+
+    def on_put(self):
+        self.queue_depth.inc()
+        self.notify()
+
+    def notify(self):
+        with self.lock:
+            if self.scheduled or self.closed:
+                return
+            self.scheduled = True
+            self.idle.clear()
+        self.scheduler.dispatch(self)
+
+    def run(self, max_items: int):
+        for _ in range(max_items):
+            if not self.shared_states.active:
+                break
+            try:
+                input_data = self.input_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue_depth.dec()
+            try:
+                self.process_func(input_data)
+            except Exception as e:
+                logger.opt(exception=e).error(f"Handler {self.name} failed to process input.")
+
+    def purge(self, predicate: Callable[[Any], bool]) -> int:
+        removed = self.input_queue.purge(predicate)
+        self.queue_depth.dec(removed)
+        return removed
+
+    def finish_run(self) -> bool:
+        with self.lock:
+            if self.closed or not self.shared_states.active or self.input_queue.empty():
+                self.scheduled = False
+                self.idle.set()
+                return False
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        with self.lock:
+            self.closed = True
+            self.input_queue.on_put = None
+            self.queue_depth.dec(self.input_queue.qsize())
+        if not self.idle.wait(timeout):
+            logger.warning(f"Handler {self.name} is still running after session stopped.")
+
+
+class SessionScheduler:
+    def __init__(self, config: Optional[SchedulerConfigModel] = None):
+        if config is None:
+            config = SchedulerConfigModel()
+        self.config = config
+        cpu_worker_num = config.cpu_worker_num if config.cpu_worker_num > 0 else os.cpu_count()
+        self.executors: Dict[HandlerExecutionPool, ThreadPoolExecutor] = {
+            HandlerExecutionPool.CPU: ThreadPoolExecutor(max_workers=cpu_worker_num,
+                                                         thread_name_prefix="chat_cpu_worker"),
+            HandlerExecutionPool.IO: ThreadPoolExecutor(max_workers=max(1, config.io_worker_num),
+                                                        thread_name_prefix="chat_io_worker"),
+        }
+        self.limiters: Dict[str, HandlerLimiter] = {}
+        self.lock = threading.Lock()
+
+    def create_work_item(self, handler_info: HandlerBaseInfo, input_queue: HandlerInputQueue,
+                         process_func: Callable[[Any], None], shared_states: SharedStates) -> HandlerWorkItem:
+        with self.lock:
+            limiter = self.limiters.get(handler_info.name)
+            if limiter is None:
+                limiter = HandlerLimiter(handler_info.max_concurrency)
+                self.limiters[handler_info.name] = limiter
+        executor = self.executors.get(handler_info.execution_pool, self.executors[HandlerExecutionPool.CPU])
+        work_item = HandlerWorkItem(self, handler_info.name, input_queue, process_func, shared_states,
+                                    limiter, executor)
+        # inputs queued before the session started were not counted
+        work_item.queue_depth.inc(input_queue.qsize())
+        input_queue.on_put = work_item.on_put
+        return work_item
+
+    def dispatch(self, work_item: HandlerWorkItem):
+        limiter = work_item.limiter
+        with self.lock:
+            if 0 < limiter.max_concurrency <= limiter.running:
+                limiter.waiting.append(work_item)
+                return
+            limiter.running += 1
+        work_item.executor.submit(self._run_work_item, work_item)
+
+    def _run_work_item(self, work_item: HandlerWorkItem):
+        try:
+            work_item.run(self.config.max_items_per_run)
+        finally:
+            limiter = work_item.limiter
+            next_item = None
+            with self.lock:
+                limiter.running -= 1
+                if len(limiter.waiting) > 0:
+                    next_item = limiter.waiting.popleft()
+                    limiter.running += 1
+            if next_item is not None:
+                next_item.executor.submit(self._run_work_item, next_item)
+            # Reschedule to the back of the pool queue instead of looping here to keep sessions fair.
+            if work_item.finish_run():
+                self.dispatch(work_item)
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,307 @@
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+import zlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+from uuid import uuid4
+
+from loguru import logger
+
+from chat_engine.data_models.chat_data.chat_data_model import ChatData
+from chat_engine.data_models.chat_data.chat_data_trace import HopRecord, TurnMilestone, TurnSpan
+from chat_engine.data_models.chat_data_type import ChatDataType
+from chat_engine.data_models.chat_engine_config_data import TracingConfigModel
+
+
+class TraceExporter:
+    def export(self, turn: TurnSpan, clock_offset: float):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class JsonLinesTraceExporter(TraceExporter):
+    def __init__(self, path: str):
+        path_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(path_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def export(self, turn: TurnSpan, clock_offset: float):
+        line = json.dumps(turn.to_dict(clock_offset), ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def _otlp_attributes(attributes: Dict) -> List[Dict]:
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, float):
+            result.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            result.append({"key": key, "value": {"stringValue": str(value)}})
+    return result
+
+
+def _otlp_span(trace_id: str, span_id: str, parent_span_id: Optional[str], name: str,
+               start: float, end: float, attributes: Dict) -> Dict:
+    span = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": 1,
+        "startTimeUnixNano": str(int(start * 1e9)),
+        "endTimeUnixNano": str(int(max(start, end) * 1e9)),
+        "attributes": _otlp_attributes(attributes),
+    }
+    if parent_span_id is not None:
+        span["parentSpanId"] = parent_span_id
+    return span
+
+
+# Posts every turn as one OTLP/HTTP json trace: a turn span, a span per stage between reached milestones and a span
+# per hop. Posting happens on a background thread, turns are dropped if the collector can not keep up.
+class OtlpTraceExporter(TraceExporter):
+    def __init__(self, endpoint: str, service_name: str = "open-avatar-chat", timeout: float = 2.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+        self.pending: queue.Queue = queue.Queue(maxsize=256)
+        self.worker = threading.Thread(target=self._post_loop, name="otlp_trace_exporter", daemon=True)
+        self.worker.start()
+
+    def build_payload(self, turn: TurnSpan, clock_offset: float) -> Dict:
+        trace_id = uuid4().hex
+        turn_span_id = uuid4().hex[:16]
+        times = [milestone_time for milestone_time in turn.milestones.values()]
+        times += [hop.enqueue_time for hop in turn.hops]
+        times += [hop.dequeue_time + hop.handle_duration for hop in turn.hops if hop.handle_duration is not None]
+        if not times:
+            return {}
+        spans = [_otlp_span(trace_id, turn_span_id, None, "turn", min(times) + clock_offset,
+                            max(times) + clock_offset, {"speech_id": turn.speech_id,
+                                                        "session_id": turn.session_id})]
+        last_milestone = None
+        for milestone in TurnMilestone:
+            milestone_time = turn.milestones.get(milestone)
+            if milestone_time is None:
+                continue
+            if last_milestone is not None:
+                spans.append(_otlp_span(trace_id, uuid4().hex[:16], turn_span_id, milestone.value,
+                                        turn.milestones[last_milestone] + clock_offset,
+                                        milestone_time + clock_offset, {"from": last_milestone.value}))
+            last_milestone = milestone
+        for hop in turn.hops:
+            end = hop.enqueue_time
+            attributes = {"data_type": hop.data_type}
+            if hop.dequeue_time is not None:
+                attributes["queue_wait"] = hop.dequeue_time - hop.enqueue_time
+                end = hop.dequeue_time + (hop.handle_duration or 0.0)
+            spans.append(_otlp_span(trace_id, uuid4().hex[:16], turn_span_id, hop.consumer,
+                                    hop.enqueue_time + clock_offset, end + clock_offset, attributes))
+        return {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "chat_engine.turn_tracer"}, "spans": spans}],
+        }]}
+
+    def export(self, turn: TurnSpan, clock_offset: float):
+        payload = self.build_payload(turn, clock_offset)
+        if not payload:
+            return
+        try:
+            self.pending.put_nowait(payload)
+        except queue.Full:
+            logger.warning(f"OTLP exporter is behind, trace of turn {turn.speech_id} dropped.")
+
+    def _post_loop(self):
+        while True:
+            payload = self.pending.get()
+            if payload is None:
+                break
+            request = urllib.request.Request(self.endpoint, data=json.dumps(payload).encode("utf-8"),
+                                             headers={"Content-Type": "application/json"}, method="POST")
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+            except Exception as e:
+                logger.warning(f"Failed to post turn trace to {self.endpoint}: {e}")
+
+    def close(self):
+        """Posts the traces still pending, waits at most timeout for the worker to take the stop mark."""
+        try:
+            self.pending.put(None, timeout=self.timeout)
+        except queue.Full:
+            logger.warning("OTLP exporter is behind, pending traces are dropped.")
+            return
+        self.worker.join(self.timeout)
+
+
+def create_trace_exporters(config: TracingConfigModel) -> List[TraceExporter]:
+    exporters = []
+    if not config.enabled:
+        return exporters
+    if config.jsonl_path:
+        exporters.append(JsonLinesTraceExporter(config.jsonl_path))
+    if config.otlp_endpoint:
+        exporters.append(OtlpTraceExporter(config.otlp_endpoint))
+    return exporters
+
+
+@dataclass
+class ConsumerHopStats:
+    count: int = 0
+    total_queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+    total_handle_duration: float = 0.0
+    max_handle_duration: float = 0.0
+
+
+# Stamps sampled chat data with hop records as the session moves it between handlers and groups them by speech_id
+# into turns, along with the time each turn reached its milestones. A turn is finished and exported when a newer
+# turn starts or the session stops, so milestones of slow outputs like motion data still make it into the turn.
+class TurnTracer:
+    def __init__(self, session_id: str, config: TracingConfigModel, exporters: Optional[List[TraceExporter]] = None):
+        self.session_id = session_id
+        self.enabled = config.enabled
+        self.sample_threshold = int(min(max(config.sample_rate, 0.0), 1.0) * 0xFFFFFFFF)
+        self.exporters = exporters or []
+        # hop and milestone times are monotonic, exports add this offset to get unix time
+        self.clock_offset = time.time() - time.monotonic()
+        self.lock = threading.Lock()
+        self.open_turns: OrderedDict[str, TurnSpan] = OrderedDict()
+        self.finished_turns: Deque[TurnSpan] = deque(maxlen=max(1, config.max_turns))
+        self.consumer_stats: Dict[str, ConsumerHopStats] = {}
+
+    def is_sampled(self, speech_id: Optional[str]) -> bool:
+        if speech_id is None:
+            # data ahead of speech detection belongs to no turn, it is only traced along with every turn
+            return self.sample_threshold >= 0xFFFFFFFF
+        return zlib.crc32(speech_id.encode("utf-8")) <= self.sample_threshold
+
+    def on_distribute(self, chat_data: ChatData):
+        speech_id = chat_data.data.get_meta("speech_id") if chat_data.data is not None else None
+        if chat_data.trace is None:
+            if not self.is_sampled(speech_id):
+                return
+            chat_data.trace = []
+        if speech_id is not None:
+            self.mark(speech_id, self._get_milestone(chat_data))
+
+    @classmethod
+    def _get_milestone(cls, chat_data: ChatData) -> Optional[TurnMilestone]:
+        data = chat_data.data
+        if chat_data.type == ChatDataType.HUMAN_AUDIO and data.get_meta("human_speech_end", False):
+            return TurnMilestone.HUMAN_SPEECH_END
+        if chat_data.type == ChatDataType.HUMAN_TEXT:
+            return TurnMilestone.HUMAN_TEXT
+        if chat_data.type == ChatDataType.AVATAR_TEXT:
+            return TurnMilestone.FIRST_LLM_TOKEN
+        if chat_data.type == ChatDataType.AVATAR_AUDIO:
+            if data.get_meta("avatar_speech_end", False):
+                return TurnMilestone.AVATAR_SPEECH_END
+            return TurnMilestone.FIRST_TTS_AUDIO
+        return None
+
+    def mark(self, speech_id: str, milestone: Optional[TurnMilestone], milestone_time: Optional[float] = None):
+        """Records the first time a turn reaches the milestone, a turn that is not known yet is started."""
+        if milestone_time is None:
+            milestone_time = time.monotonic()
+        finished = []
+        with self.lock:
+            turn = self.open_turns.get(speech_id)
+            if turn is None:
+                if not self.is_sampled(speech_id) or any(x.speech_id == speech_id for x in self.finished_turns):
+                    return
+                # a new turn ends every earlier one, the conversation has moved on
+                finished = list(self.open_turns.values())
+                self.open_turns.clear()
+                turn = TurnSpan(speech_id=speech_id, session_id=self.session_id)
+                self.open_turns[speech_id] = turn
+            if milestone is not None and milestone not in turn.milestones:
+                turn.milestones[milestone] = milestone_time
+        self._finish(finished)
+
+    def record_enqueue(self, chat_data: ChatData, consumer: str) -> HopRecord:
+        hop = HopRecord(consumer=consumer, data_type=chat_data.type.value, enqueue_time=time.monotonic())
+        chat_data.trace.append(hop)
+        return hop
+
+    def record_output(self, chat_data: ChatData, consumer: str):
+        """Engine outputs leave the session when they are enqueued, their hop is complete right away."""
+        hop = self.record_enqueue(chat_data, consumer)
+        self._add_hop(chat_data, hop)
+
+    def record_dequeue(self, chat_data: ChatData, consumer: str) -> Optional[HopRecord]:
+        now = time.monotonic()
+        for hop in chat_data.trace:
+            if hop.consumer == consumer and hop.dequeue_time is None:
+                hop.dequeue_time = now
+                return hop
+        return None
+
+    def record_handled(self, chat_data: ChatData, hop: HopRecord, handle_duration: float):
+        hop.handle_duration = handle_duration
+        queue_wait = hop.dequeue_time - hop.enqueue_time
+        with self.lock:
+            stats = self.consumer_stats.get(hop.consumer)
+            if stats is None:
+                stats = ConsumerHopStats()
+                self.consumer_stats[hop.consumer] = stats
+            stats.count += 1
+            stats.total_queue_wait += queue_wait
+            stats.max_queue_wait = max(stats.max_queue_wait, queue_wait)
+            stats.total_handle_duration += handle_duration
+            stats.max_handle_duration = max(stats.max_handle_duration, handle_duration)
+        self._add_hop(chat_data, hop)
+
+    def _add_hop(self, chat_data: ChatData, hop: HopRecord):
+        speech_id = chat_data.data.get_meta("speech_id") if chat_data.data is not None else None
+        if speech_id is None:
+            return
+        with self.lock:
+            turn = self.open_turns.get(speech_id)
+            if turn is not None:
+                turn.hops.append(hop)
+
+    def _finish(self, turns: List[TurnSpan]):
+        for turn in turns:
+            turn.finished = True
+            with self.lock:
+                self.finished_turns.append(turn)
+            for exporter in self.exporters:
+                try:
+                    exporter.export(turn, self.clock_offset)
+                except Exception as e:
+                    logger.opt(exception=e).warning(f"Failed to export trace of turn {turn.speech_id}.")
+
+    def get_turn(self, speech_id: str) -> Optional[TurnSpan]:
+        with self.lock:
+            turn = self.open_turns.get(speech_id)
+            if turn is not None:
+                return turn
+            return next((x for x in self.finished_turns if x.speech_id == speech_id), None)
+
+    def get_turns(self) -> List[TurnSpan]:
+        with self.lock:
+            return list(self.finished_turns) + list(self.open_turns.values())
+
+    def get_consumer_stats(self) -> Dict[str, ConsumerHopStats]:
+        with self.lock:
+            return dict(self.consumer_stats)
+
+    def close(self):
+        with self.lock:
+            finished = list(self.open_turns.values())
+            self.open_turns.clear()
+        self._finish(finished)
@@ -0,0 +1,61 @@
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional
+
+
+class TurnMilestone(str, Enum):
+    HUMAN_SPEECH_END = "human_speech_end"
+    HUMAN_TEXT = "human_text"
+    FIRST_LLM_TOKEN = "first_llm_token"
+    FIRST_TTS_AUDIO = "first_tts_audio"
+    FIRST_MOTION_SENT = "first_motion_sent"
+    AVATAR_SPEECH_END = "avatar_speech_end"
+
+
+# A hop of chat data to one consumer, times are time.monotonic() seconds. dequeue_time and handle_duration stay
+# unset for engine outputs, which are consumed outside of the session.
+@dataclass
+class HopRecord:
+    consumer: str
+    data_type: str
+    enqueue_time: float
+    dequeue_time: Optional[float] = None
+    handle_duration: Optional[float] = None
+
+
+@dataclass
+class TurnSpan:
+    speech_id: str
+    session_id: str
+    milestones: Dict[TurnMilestone, float] = field(default_factory=dict)
+    hops: List[HopRecord] = field(default_factory=list)
+    finished: bool = False
+
+    def get_stage_durations(self) -> Dict[str, float]:
+        """Time between consecutive milestones that were reached, keyed by the later milestone."""
+        durations = {}
+        last_time = None
+        for milestone in TurnMilestone:
+            milestone_time = self.milestones.get(milestone)
+            if milestone_time is None:
+                continue
+            if last_time is not None:
+                durations[milestone.value] = milestone_time - last_time
+            last_time = milestone_time
+        return durations
+
+    def to_dict(self, clock_offset: float = 0.0) -> Dict:
+        return {
+            "speech_id": self.speech_id,
+            "session_id": self.session_id,
+            "milestones": {milestone.value: milestone_time + clock_offset
+                           for milestone, milestone_time in self.milestones.items()},
+            "stage_durations": self.get_stage_durations(),
+            "hops": [{
+                "consumer": hop.consumer,
+                "data_type": hop.data_type,
+                "enqueue_time": hop.enqueue_time + clock_offset,
+                "queue_wait": None if hop.dequeue_time is None else hop.dequeue_time - hop.enqueue_time,
+                "handle_duration": hop.handle_duration,
+            } for hop in self.hops],
+        }
@@ -16,9 +16,30 @@ class ChatEngineOutputSource(BaseModel):
     type: ChatDataType
 
 
+class SchedulerConfigModel(BaseModel):
+    # 0 means using cpu count of the machine
+    cpu_worker_num: int = Field(default=0)
+    io_worker_num: int = Field(default=32)
+    # Max inputs processed for one handler context before yielding the worker to others
+    max_items_per_run: int = Field(default=16)
+
+
+class TracingConfigModel(BaseModel):
+    enabled: bool = Field(default=False)
+    # share of turns traced, sampled by speech_id so a turn is traced in every handler or in none
+    sample_rate: float = Field(default=1.0)
+    # finished turns kept per session for in-process queries
+    max_turns: int = Field(default=64)
+    jsonl_path: Optional[str] = Field(default=None)
+    # e.g. http://127.0.0.1:4318/v1/traces of a local OpenTelemetry collector
+    otlp_endpoint: Optional[str] = Field(default=None)
+
+
 class ChatEngineConfigModel(BaseModel):
     model_root: str = ""
     handler_search_path: List[str] = Field(default_factory=list)
     handler_configs: Optional[Dict[str, Dict]] = None
     outputs: Dict[EngineChannelType, ChatEngineOutputSource] = Field(default_factory=dict)
     turn_config: Optional[Dict] = Field(default=None)
+    scheduler: SchedulerConfigModel = Field(default_factory=SchedulerConfigModel)
+    tracing: TracingConfigModel = Field(default_factory=TracingConfigModel)
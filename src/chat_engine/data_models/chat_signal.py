@@ -11,3 +11,5 @@ class ChatSignal(BaseModel):
     stream_type: Optional[ChatDataType] = Field(default=None)
     source_type: Optional[ChatSignalSourceType] = Field(default=None)
     source_name: str = Field(default="")
+    # speech the signal applies to, interrupts without one apply to the speech the avatar is responding with
+    speech_id: Optional[str] = Field(default=None)
@@ -1,6 +1,6 @@
 import copy
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Sequence, Any, Union
+from typing import List, Dict, Optional, Sequence, Any, Union, Tuple
 
 import numpy as np
 
@@ -112,6 +112,54 @@ class DataBundleEntry:
         return self.time_unit != TimeUnitType.NONE
 
 
+# Shape check of arrays set to an entry, built once per locked definition. It accepts the same shapes as comparing
+# against calculate_shape, without building the allowed shape for every array.
+class EntryShapeValidator:
+    __slots__ = ("name", "temporal", "time_axis", "ndim", "bounds")
+
+    def __init__(self, entry: DataBundleEntry):
+        self.name = entry.name
+        self.temporal = entry.is_temporal_data()
+        self.time_axis = entry.time_axis
+        self.ndim = len(entry.shape)
+        bounds = []
+        for axis, size in enumerate(entry.shape):
+            if axis == self.time_axis:
+                continue
+            if isinstance(size, VariableSize):
+                if size.min_size is not None or size.max_size is not None:
+                    bounds.append((axis, size.min_size, size.max_size))
+            else:
+                bounds.append((axis, size, size))
+        self.bounds: Tuple[Tuple[int, Optional[int], Optional[int]], ...] = tuple(bounds)
+
+    def check(self, shape: Tuple[int, ...]):
+        if not self.temporal:
+            raise RuntimeError(f"Dimension mismatch: {self.name}: {shape} is not valid")
+        if self.time_axis < 0 or self.time_axis >= len(shape):
+            raise RuntimeError(f"Invalid time axis {self.time_axis} for shape {shape}")
+        if shape[self.time_axis] <= 0:
+            raise RuntimeError(f"Dimension mismatch: {self.name}: {shape} is not valid")
+        if len(shape) != self.ndim:
+            raise RuntimeError(f"Reference shape size {shape} does not match definition of {self.name}")
+        for axis, min_size, max_size in self.bounds:
+            size = shape[axis]
+            if (min_size is not None and size < min_size) or (max_size is not None and size > max_size):
+                raise RuntimeError(f"Shape mismatch: Shape of {self.name} is {shape}, "
+                                   f"axis {axis} should be within [{min_size}, {max_size}]")
+
+
+class DataBundleLayout:
+    __slots__ = ("entries", "index", "validators", "main_index", "entry_num")
+
+    def __init__(self, definition: "DataBundleDefinition"):
+        self.entries: Tuple[DataBundleEntry, ...] = tuple(definition.entries.values())
+        self.index: Dict[str, int] = {entry.name: entry.index for entry in self.entries}
+        self.validators: Tuple[EntryShapeValidator, ...] = tuple(EntryShapeValidator(x) for x in self.entries)
+        self.main_index: int = self.index.get(definition.main_entry_name, -1)
+        self.entry_num = len(self.entries)
+
+
 @dataclass
 class DataBundleDefinition:
     entries: Dict[str, DataBundleEntry] = field(default_factory=dict)
@@ -119,6 +167,8 @@ class DataBundleDefinition:
     _conformed: bool = True
     _locked: bool = False
     _lockdown_copy: Optional["DataBundleDefinition"] = None
+    # entry index and shape validators of a locked definition, bundles share them
+    _layout: Optional[DataBundleLayout] = field(default=None, repr=False, compare=False)
 
     def _mark_dirty(self):
         self._conformed = False
@@ -187,9 +237,17 @@ class DataBundleDefinition:
         result.main_entry_name = self.main_entry_name
         result._conformed = True
         result._locked = True
+        result._layout = DataBundleLayout(result)
         self._lockdown_copy = result
         return result
 
+    def get_layout(self) -> DataBundleLayout:
+        if not self._locked:
+            return self.lockdown().get_layout()
+        if self._layout is None:
+            self._layout = DataBundleLayout(self)
+        return self._layout
+
     @property
     def locked(self) -> bool:
         return self._locked
@@ -199,25 +257,52 @@ class DataBundleDefinition:
         return self._conformed
 
 
+# Data of an entry is kept in a DataStore, stores are only created for entries that are set.
 class DataBundle:
+    __slots__ = ("_definition", "_layout", "metadata", "events", "data", "start_of_stream", "end_of_stream")
+
     def __init__(self, definition: DataBundleDefinition):
         self._definition: DataBundleDefinition = definition.lockdown()
+        self._layout: DataBundleLayout = self._definition.get_layout()
         self.metadata: dict[str, Any] = {}
         self.events: List[EventData] = []
-        self._data_entries: List[DataBundleEntry] = []
-        self.data: List[DataStore] = []
+        self.data: List[Optional[DataStore]] = [None] * self._layout.entry_num
         self.start_of_stream: bool = False
         self.end_of_stream: bool = False
-        for entry_name, entry in self._definition.entries.items():
-            self._data_entries.append(entry)
-            self.data.append(DataStore(None, DataStoreType.INVALID))
+
+    @classmethod
+    def create_with_main_data(cls, definition: DataBundleDefinition,
+                              data: Union[np.ndarray, str]) -> "DataBundle":
+        """Creates a bundle with its main data set, the common case of single entry bundles."""
+        bundle = cls(definition)
+        main_index = bundle._layout.main_index
+        if main_index < 0:
+            raise RuntimeError("No main data entry")
+        bundle._set_data_at(main_index, data)
+        return bundle
+
+    @property
+    def _data_entries(self) -> Tuple[DataBundleEntry, ...]:
+        return self._layout.entries
+
+    def _set_data_at(self, index: int, data: Union[np.ndarray, str]):
+        if isinstance(data, np.ndarray):
+            self._layout.validators[index].check(data.shape)
+        elif not isinstance(data, str):
+            msg = f"Input data type {type(data)} is not supported."
+            raise RuntimeError(msg)
+        data_store = self.data[index]
+        if data_store is None:
+            self.data[index] = DataStore(data, DataStoreType.LOCAL_MEMORY)
+        else:
+            data_store.set_data(data, DataStoreType.LOCAL_MEMORY)
 
     def __str__(self):
         data_infos = ""
         not_set_entries = ""
         meta_str = ""
         for entry, data_store in zip(self._data_entries, self.data):
-            if data_store.valid:
+            if data_store is not None and data_store.valid:
                 if len(data_infos) > 0:
                     data_infos += ", "
                 if isinstance(data_store.data, np.ndarray):
@@ -256,32 +341,31 @@ class DataBundle:
     def get_main_definition_entry(self) -> DataBundleEntry:
         return self._definition.get_main_entry()
 
-    # noinspection PyUnusedLocal
     def get_data_store(self, name: str, read_only: bool=True) -> DataStore:
-        entry = self.get_definition_entry(name)
-        if entry is None:
+        index = self._layout.index.get(name)
+        if index is None:
             return DataStore(None, DataStoreType.INVALID)
-        return self.data[entry.index]
+        data_store = self.data[index]
+        if data_store is None:
+            data_store = DataStore(None, DataStoreType.INVALID)
+            if not read_only:
+                self.data[index] = data_store
+        return data_store
 
     def set_data_store(self, name: str, data_store: DataStore):
         if data_store is None or not data_store.valid:
             return
-        entry = self.get_definition_entry(name)
-        if entry is None:
+        index = self._layout.index.get(name)
+        if index is None:
             return
-        self.data[entry.index] = data_store
+        self.data[index] = data_store
 
     # noinspection PyMethodMayBeStatic
     def is_base_layer(self) -> bool:
         return True
 
     def set_array_data(self, name: str, entry: DataBundleEntry, data: np.ndarray):
-        timed_axis_size = entry.get_time_axis_size(data.shape)
-        if timed_axis_size is None or timed_axis_size <= 0:
-            raise RuntimeError(f"Dimension mismatch: {name}: {data.shape} is not valid")
-        allowed_shape = entry.calculate_shape(timed_axis_size=timed_axis_size, reference_shape=data.shape)
-        if not np.array_equal(data.shape, allowed_shape):
-            raise RuntimeError(f"Shape mismatch: Shape of {name} is {data.shape}, not fit defined {allowed_shape}")
+        self._layout.validators[entry.index].check(data.shape)
         data_store = self.get_data_store(name, read_only=False)
         return data_store.set_data(data, DataStoreType.LOCAL_MEMORY)
 
@@ -290,32 +374,30 @@ class DataBundle:
         return data_store.set_data(data, DataStoreType.LOCAL_MEMORY)
 
     def set_data(self, name: str, data: Union[np.ndarray, str]):
-        entry = self._definition.entries.get(name, None)
-        if entry is None:
+        index = self._layout.index.get(name)
+        if index is None:
             raise RuntimeError(f"Unknown data name {name}")
-        if isinstance(data, np.ndarray):
-            return self.set_array_data(name, entry, data)
-        elif isinstance(data, str):
-            return self.set_text_data(name, entry, data)
-        else:
-            msg = f"Input data type {type(data)} is not supported."
-            raise RuntimeError(msg)
+        self._set_data_at(index, data)
 
     def set_main_data(self, data: Union[np.ndarray, str]):
-        main_data_name = self._definition.main_entry_name
-        if main_data_name is None:
+        main_index = self._layout.main_index
+        if main_index < 0:
             raise RuntimeError("No main data entry")
-        return self.set_data(main_data_name, data)
+        self._set_data_at(main_index, data)
 
     def get_data(self, name: str) -> Union[np.ndarray, str]:
-        data_store = self.get_data_store(name, read_only=True)
-        return data_store.get_data()
+        index = self._layout.index.get(name)
+        if index is None:
+            return None
+        data_store = self.data[index]
+        return None if data_store is None else data_store.data
 
     def get_main_data(self) -> Optional[Union[np.ndarray, str]]:
-        main_entry = self._definition.main_entry_name
-        if main_entry is None:
+        main_index = self._layout.main_index
+        if main_index < 0:
             return None
-        return self.get_data(main_entry)
+        data_store = self.data[main_index]
+        return None if data_store is None else data_store.data
 
     def add_meta(self, name, value):
         self.metadata[name] = value
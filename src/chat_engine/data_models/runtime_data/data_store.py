@@ -8,7 +8,7 @@ class DataStoreType(IntEnum):
     LOCAL_MEMORY = 1
 
 
-@dataclass
+@dataclass(slots=True)
 class DataStore:
     data: Any
     storage: DataStoreType = DataStoreType.INVALID
@@ -1,11 +1,15 @@
 import struct
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Union, Any
+from functools import lru_cache
+from typing import List, Optional, Dict, Union, Any, Tuple
 
 import numpy as np
 from loguru import logger
 
 from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundle
+from chat_engine.data_models.runtime_data.motion_data_compact import MotionDataDescriptorFormat, COMPACT_FOURCC, \
+    COMPACT_FRAME_HEADER, MOTION_DATA_PROTOCOL_VERSION, DESCRIPTOR_FORMAT_KEY, PROTOCOL_VERSION_KEY, RECORD_NAMES_KEY, \
+    can_pack_compact, pack_compact_records, get_compact_flags
 from chat_engine.data_models.runtime_data.motion_data_descriptors import MotionDataDescription, BufferDescription
 from chat_engine.data_models.runtime_data.motion_entry_serializer_base import BaseMotionEntrySerializer
 from chat_engine.data_models.runtime_data.motion_entry_serializers.int16_audio_serializer import \
@@ -20,12 +24,35 @@ class MotionDataEntryRegistry:
     serializer_context: Any = None
 
 
+@dataclass
+class MotionDataBuffer:
+    data: Union[bytes, np.ndarray]
+    registry: Optional[MotionDataEntryRegistry] = None
+
+
+@lru_cache(maxsize=None)
+def get_dtype_name(data_type: np.dtype) -> str:
+    # dtype.name is computed in python on every access
+    return data_type.name
+
+
+JBIN_HEADER = struct.Struct("<4sII")
+# data records are the first field of a description json, followed by the remaining fields
+RECORDS_PREFIX = b'{"data_records":'
+
+
 class MotionDataSerializer:
     def __init__(self):
         self.name_mapping: Dict[str, MotionDataEntryRegistry] = {}
         self.record_serializer: Dict[str, ]
         self.last_batch_name: Optional[str] = None
         self.batch_num: int = 0
+        # data records are the same for every chunk unless shapes change, keep their json
+        self.records_key: Optional[Tuple] = None
+        self.records_json: bytes = b""
+        self.descriptor_format = MotionDataDescriptorFormat.JSON
+        # record name to index in the record order announced by the last compact welcome message
+        self.compact_record_indices: Dict[str, int] = {}
 
     def register_data(self, data_name: str, output_name: str, data_type: str,
                       entry_serializer: Optional[BaseMotionEntrySerializer] = None):
@@ -47,7 +74,12 @@ class MotionDataSerializer:
             MotionEntryAudioInt16Serializer(),
         )
 
-    def _update_description(self, description: MotionDataDescription, data_list: List[np.ndarray],
+    def set_descriptor_format(self, descriptor_format: MotionDataDescriptorFormat):
+        """Frames use the new format after the next serialized definition, which announces it to the client."""
+        self.descriptor_format = descriptor_format
+        self.compact_record_indices = {}
+
+    def _update_description(self, description: MotionDataDescription, data_list: List[MotionDataBuffer],
                             data_bundle: DataBundle, write_channel_names: bool):
         definition = data_bundle.definition
         for data_name, registry in self.name_mapping.items():
@@ -66,8 +98,8 @@ class MotionDataSerializer:
 
             if isinstance(data_item, np.ndarray):
                 data_desc.shape = list(data_item.shape)
-                data_desc.data_type = data_item.dtype.name
                 if registry.serializer is not None:
+                    data_desc.data_type = get_dtype_name(data_item.dtype)
                     serialize_result = registry.serializer.serialize(
                         registry.serializer_context,
                         description,
@@ -77,49 +109,100 @@ class MotionDataSerializer:
                     data_desc = serialize_result.buffer_descriptor
                     data_item = serialize_result.data
                 else:
-                    data_desc.data_type = registry.output_data_type.name
-                    if registry.output_data_type.name != str(data_item.dtype):
-                        data_item = data_item.astype(registry.output_data_type)
+                    data_desc.data_type = get_dtype_name(registry.output_data_type)
             elif isinstance(data_item, str):
-                data_desc.data_type = np.dtype(np.uint8).name
+                data_item = data_item.encode("utf-8")
+                data_desc.data_type = "uint8"
                 data_desc.shape = [len(data_item)]
             else:
                 logger.warning(f"Unsupported data type {type(data_item)} for data {data_name}.")
                 continue
 
             description.data_records[registry.name] = data_desc
-            data_list.append(data_item)
+            data_list.append(MotionDataBuffer(data=data_item, registry=registry))
 
     @classmethod
-    def _dump_to_bytes(cls, description: MotionDataDescription, data_list: List[np.ndarray]):
+    def _get_records_key(cls, description: MotionDataDescription) -> Tuple:
+        return tuple(
+            (name, desc.data_type, tuple(desc.shape), desc.data_offset, desc.sample_rate, desc.data_id,
+             desc.timeline_axis, desc.channel_axis, tuple(desc.channel_names or ()), tuple(desc.metadata.items()))
+            for name, desc in description.data_records.items()
+        )
+
+    def _dump_description(self, description: MotionDataDescription) -> bytes:
+        # only metadata, events and batch fields change between chunks of the same shape
+        tail = description.model_dump_json(exclude={"data_records"}).encode("utf-8")
+        records_key = self._get_records_key(description)
+        if records_key != self.records_key:
+            desc_bytes = description.model_dump_json().encode("utf-8")
+            self.records_json = desc_bytes[len(RECORDS_PREFIX):len(desc_bytes) - len(tail)]
+            self.records_key = records_key
+            return desc_bytes
+        return RECORDS_PREFIX + self.records_json + b"," + tail[1:]
+
+    def _dump_compact_head(self, description: MotionDataDescription, binary_size: int) -> bytes:
+        records = pack_compact_records(description, self.compact_record_indices)
+        extension_fields = set()
+        if description.start_of_batch:
+            extension_fields.update(("batch_name", "metadata"))
+        if description.events:
+            extension_fields.add("events")
+        extension = b""
+        if extension_fields:
+            extension = description.model_dump_json(include=extension_fields).encode("utf-8")
+        header = COMPACT_FRAME_HEADER.pack(
+            COMPACT_FOURCC,
+            MOTION_DATA_PROTOCOL_VERSION,
+            get_compact_flags(description),
+            len(description.data_records),
+            description.batch_id or 0,
+            len(extension),
+            binary_size,
+        )
+        return header + records + extension
+
+    def _dump_to_bytes(self, description: MotionDataDescription, data_list: List[MotionDataBuffer],
+                       compact: bool = False) -> bytearray:
+        # offsets are computed first, every buffer is then written once into the preallocated message
         binary_offset = 0
-        binary_data = bytes()
-        for data_name, data_desc in description.data_records.items():
+        layouts = []
+        for data_desc in description.data_records.values():
             if data_desc.data_id < 0:
                 continue
-            data_item = data_list[data_desc.data_id]
-            if isinstance(data_item, bytes):
-                data_size = len(data_item)
-                binary_data += data_item
-            elif isinstance(data_item, np.ndarray):
-                data_size = data_item.nbytes
-                binary_data += data_item.tobytes()
-            elif isinstance(data_item, str):
-                raw_bytes = data_item.encode("utf-8")
-                data_size = len(raw_bytes)
-                binary_data += raw_bytes
+            buffer = data_list[data_desc.data_id]
+            if isinstance(buffer.data, np.ndarray):
+                data_type = np.dtype(data_desc.data_type)
+                data_size = buffer.data.size * data_type.itemsize
+            elif isinstance(buffer.data, bytes):
+                data_type = None
+                data_size = len(buffer.data)
             else:
                 continue
             data_desc.data_offset = binary_offset
+            layouts.append((buffer, data_type, binary_offset, data_size))
             binary_offset += data_size
 
-        fourcc = b"JBIN"
-        json_str = description.model_dump_json()
-        desc_bytes = bytes(json_str, "utf-8")
-        json_size = len(desc_bytes)
-        bin_size = len(binary_data)
-        header = fourcc + struct.pack("<II", json_size, bin_size)
-        return header + desc_bytes + binary_data
+        if compact:
+            head = self._dump_compact_head(description, binary_offset)
+        else:
+            desc_bytes = self._dump_description(description)
+            head = JBIN_HEADER.pack(b"JBIN", len(desc_bytes), binary_offset) + desc_bytes
+        binary_start = len(head)
+        message = bytearray(binary_start + binary_offset)
+        message[:binary_start] = head
+        for buffer, data_type, data_offset, data_size in layouts:
+            start = binary_start + data_offset
+            if data_type is None:
+                message[start:start + data_size] = buffer.data
+                continue
+            out = np.frombuffer(message, dtype=data_type, count=buffer.data.size, offset=start)
+            out = out.reshape(buffer.data.shape)
+            registry = buffer.registry
+            if registry is not None and registry.serializer is not None:
+                registry.serializer.write(registry.serializer_context, buffer.data, out)
+            else:
+                np.copyto(out, buffer.data, casting="unsafe")
+        return message
 
     def _serialize_data_bundle(self, data: DataBundle, include_channel_names: bool = False,
                                definition_only: bool = False):
@@ -150,7 +233,18 @@ class MotionDataSerializer:
         write_channel_names = include_channel_names or definition_only
         self._update_description(description, data_items, data, write_channel_names)
 
-        return self._dump_to_bytes(description, data_items)
+        compact = False
+        if self.descriptor_format == MotionDataDescriptorFormat.COMPACT:
+            if definition_only:
+                record_names = list(description.data_records.keys())
+                self.compact_record_indices = {name: index for index, name in enumerate(record_names)}
+                description.metadata[DESCRIPTOR_FORMAT_KEY] = self.descriptor_format.value
+                description.metadata[PROTOCOL_VERSION_KEY] = str(MOTION_DATA_PROTOCOL_VERSION)
+                description.metadata[RECORD_NAMES_KEY] = ",".join(record_names)
+            else:
+                # records the client does not know about go out as a self describing JBIN message
+                compact = can_pack_compact(description, self.compact_record_indices)
+        return self._dump_to_bytes(description, data_items, compact)
 
     def _serialize_definition(self, definition: DataBundleDefinition, include_channel_names: bool = False):
         data_bundle = DataBundle(definition)
@@ -0,0 +1,106 @@
+import json
+import struct
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from chat_engine.data_models.runtime_data.motion_data_descriptors import MotionDataDescription
+
+
+class MotionDataDescriptorFormat(str, Enum):
+    JSON = "json"
+    COMPACT = "compact"
+
+
+# Protocol 1 sends every motion data message as JBIN: header, json description and binary data.
+# Protocol 2 clients announce themselves after connecting and get compact frames after a new welcome message.
+# The welcome stays JBIN, carrying channel names, sample rates and the record order in its metadata. Frames are
+#   frame header   "<4sBBHIII"  b"JBCF", protocol version, flags, record num, batch id, extension size, binary size
+#   record         "<BBBxI4I"   record index in welcome order, dtype code, ndim, data offset, shape padded to 4 dims
+#   extension      optional utf-8 json with batch_name and metadata at start of batch and events if there are any
+#   binary data
+MOTION_DATA_PROTOCOL_VERSION = 2
+COMPACT_FOURCC = b"JBCF"
+COMPACT_FRAME_HEADER = struct.Struct("<4sBBHIII")
+COMPACT_RECORD = struct.Struct("<BBBxI4I")
+COMPACT_MAX_DIMS = 4
+COMPACT_FLAG_START_OF_BATCH = 1
+COMPACT_FLAG_END_OF_BATCH = 2
+COMPACT_DATA_TYPES = ["uint8", "int8", "int16", "int32", "float16", "float32", "float64"]
+COMPACT_DATA_TYPE_CODES = {name: code for code, name in enumerate(COMPACT_DATA_TYPES)}
+
+# welcome metadata keys of the compact format
+DESCRIPTOR_FORMAT_KEY = "descriptor_format"
+PROTOCOL_VERSION_KEY = "protocol_version"
+RECORD_NAMES_KEY = "record_names"
+
+
+def get_descriptor_format(protocol_version: int) -> MotionDataDescriptorFormat:
+    if protocol_version >= MOTION_DATA_PROTOCOL_VERSION:
+        return MotionDataDescriptorFormat.COMPACT
+    return MotionDataDescriptorFormat.JSON
+
+
+def can_pack_compact(description: MotionDataDescription, record_indices: Dict[str, int]) -> bool:
+    for name, data_desc in description.data_records.items():
+        if name not in record_indices or data_desc.data_type not in COMPACT_DATA_TYPE_CODES:
+            return False
+        if len(data_desc.shape) > COMPACT_MAX_DIMS:
+            return False
+    return True
+
+
+def pack_compact_records(description: MotionDataDescription, record_indices: Dict[str, int]) -> bytes:
+    records = []
+    for name, data_desc in description.data_records.items():
+        shape = list(data_desc.shape) + [0] * (COMPACT_MAX_DIMS - len(data_desc.shape))
+        records.append(COMPACT_RECORD.pack(
+            record_indices[name],
+            COMPACT_DATA_TYPE_CODES[data_desc.data_type],
+            len(data_desc.shape),
+            data_desc.data_offset,
+            *shape,
+        ))
+    return b"".join(records)
+
+
+def get_compact_flags(description: MotionDataDescription) -> int:
+    flags = 0
+    if description.start_of_batch:
+        flags |= COMPACT_FLAG_START_OF_BATCH
+    if description.end_of_batch:
+        flags |= COMPACT_FLAG_END_OF_BATCH
+    return flags
+
+
+def parse_record_names(metadata: Optional[Dict[str, str]]) -> List[str]:
+    if not metadata or not metadata.get(RECORD_NAMES_KEY):
+        return []
+    return metadata[RECORD_NAMES_KEY].split(",")
+
+
+def unpack_compact_frame(message: bytes, record_names: List[str]) -> Dict[str, Any]:
+    """Decodes a compact frame into the fields of a json description, data records are keyed by name."""
+    fourcc, version, flags, record_num, batch_id, extension_size, binary_size = \
+        COMPACT_FRAME_HEADER.unpack_from(message, 0)
+    if fourcc != COMPACT_FOURCC:
+        raise ValueError(f"Unexpected fourcc {fourcc} of compact motion data frame.")
+    data_records = {}
+    offset = COMPACT_FRAME_HEADER.size
+    for _ in range(record_num):
+        index, data_type_code, dim_num, data_offset, *shape = COMPACT_RECORD.unpack_from(message, offset)
+        data_records[record_names[index]] = {
+            "data_type": COMPACT_DATA_TYPES[data_type_code],
+            "data_offset": data_offset,
+            "shape": shape[:dim_num],
+        }
+        offset += COMPACT_RECORD.size
+    fields = json.loads(bytes(message[offset:offset + extension_size])) if extension_size > 0 else {}
+    fields.update(
+        data_records=data_records,
+        batch_id=batch_id,
+        start_of_batch=bool(flags & COMPACT_FLAG_START_OF_BATCH),
+        end_of_batch=bool(flags & COMPACT_FLAG_END_OF_BATCH),
+        binary_offset=offset + extension_size,
+        binary_size=binary_size,
+    )
+    return fields
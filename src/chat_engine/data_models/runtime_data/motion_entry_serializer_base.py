@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Union
 
 import numpy as np
 
@@ -10,7 +10,8 @@ from chat_engine.data_models.runtime_data.motion_data_descriptors import BufferD
 @dataclass
 class EntrySerializeResult:
     buffer_descriptor: BufferDescription
-    data: bytes
+    # arrays are converted to buffer_descriptor.data_type by write() directly into the output message
+    data: Union[bytes, np.ndarray]
 
 
 class BaseMotionEntrySerializer(ABC):
@@ -27,3 +28,6 @@ class BaseMotionEntrySerializer(ABC):
     @abstractmethod
     def reset(self, context: Any):
         pass
+
+    def write(self, context: Any, data: np.ndarray, out: np.ndarray):
+        np.copyto(out, data, casting="unsafe")
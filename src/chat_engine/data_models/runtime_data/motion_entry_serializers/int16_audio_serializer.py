@@ -17,22 +17,18 @@ class MotionEntryAudioInt16Serializer(BaseMotionEntrySerializer):
     def serialize(self, _context, motion_data_descriptor: MotionDataDescription,
                buffer_descriptor: BufferDescription,
                data: np.ndarray, force_flush: bool = False) -> EntrySerializeResult:
-        if str(data.dtype) == "int16":
-            return EntrySerializeResult(
-                data=data.tobytes(),
-                buffer_descriptor=buffer_descriptor,
-            )
-        out_descriptor = BufferDescription.model_validate(buffer_descriptor.model_dump())
-        out_data = data
-        if data.dtype in (np.float16, np.float32, np.float64):
-            out_data = data * 32767
-        out_data = out_data.astype(np.int16)
-        out_descriptor.data_type = str(out_data.dtype)
-        result = EntrySerializeResult(
-            data=out_data.tobytes(),
-            buffer_descriptor=out_descriptor,
+        # conversion happens in write(), straight into the output message
+        buffer_descriptor.data_type = "int16"
+        return EntrySerializeResult(
+            data=data,
+            buffer_descriptor=buffer_descriptor,
         )
-        return result
+
+    def write(self, context: Any, data: np.ndarray, out: np.ndarray):
+        if data.dtype.kind == "f":
+            np.multiply(data, 32767, out=out, casting="unsafe")
+        else:
+            np.copyto(out, data, casting="unsafe")
 
     def reset(self, context: Any):
         pass
@@ -3,9 +3,10 @@ import sys
 import gradio
 import uvicorn
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, PlainTextResponse
 
 from engine_utils.directory_info import DirectoryInfo
+from engine_utils.metrics_registry import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
 from service.service_utils.logger_utils import config_loggers
 from service.service_utils.service_config_loader import load_configs
 from service.service_utils.ssl_helpers import create_ssl_context
@@ -46,6 +47,10 @@ def setup_demo():
         # remove confusing error
         return {}
 
+    @app.get("/metrics")
+    def get_metrics():
+        return PlainTextResponse(MetricsRegistry().render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
     css = """
 
 
@@ -83,7 +88,10 @@ def main():
 
     ssl_context = create_ssl_context(args, service_config)
     print(f"http://localhost:{service_config.port}")
-    uvicorn.run(demo_app, host=service_config.host, port=service_config.port, **ssl_context)
+    try:
+        uvicorn.run(demo_app, host=service_config.host, port=service_config.port, **ssl_context)
+    finally:
+        chat_engine.shutdown()
 
 
 if __name__ == "__main__":
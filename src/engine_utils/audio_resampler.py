@@ -0,0 +1,109 @@
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided, sliding_window_view
+
+
+def design_resample_filter(up: int, down: int, zero_crossings: int = 16,
+                           rolloff: float = 0.9, beta: float = 8.0) -> np.ndarray:
+    # kaiser windowed sinc low-pass at the upsampled rate, with gain up to compensate zero stuffing,
+    # zero padded at the end to split evenly into up phases
+    rate = max(up, down)
+    tap_num = 2 * zero_crossings * rate + 1
+    cutoff = rolloff / (2 * rate)
+    t = np.arange(tap_num) - (tap_num - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(tap_num, beta)
+    taps = np.pad(taps * (up / taps.sum()), (0, -tap_num % up))
+    return taps.astype(np.float32)
+
+
+# Polyphase resampler for a continuous mono stream. Filters are precomputed and the input tail needed by the
+# next chunk is kept, so chunk boundaries are filtered as if the stream was resampled at once.
+# Output is delayed by half the filter length, zero_crossings samples at the lower of both rates.
+class StreamingResampler:
+    def __init__(self, input_rate: int, output_rate: int, zero_crossings: int = 16,
+                 rolloff: float = 0.9, beta: float = 8.0):
+        divisor = gcd(input_rate, output_rate)
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.up = output_rate // divisor
+        self.down = input_rate // divisor
+        taps = design_resample_filter(self.up, self.down, zero_crossings, rolloff, beta)
+        taps_per_phase = taps.shape[0] // self.up
+        self.taps_per_phase = taps_per_phase
+        # in output samples
+        self.delay = zero_crossings * max(self.up, self.down) / self.down
+        self.phase_filters = [taps[phase::self.up][::-1] for phase in range(self.up)]
+        self.period_filters = {}
+        self.max_cached_filters = 16
+        self.history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        self.input_count = 0
+        self.output_count = 0
+
+    def reset(self):
+        self.history[:] = 0
+        self.input_count = 0
+        self.output_count = 0
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+        if self.up == self.down:
+            return audio.copy()
+        input_end = self.input_count + audio.shape[0]
+        # produce every output whose last input has arrived
+        output_end = (input_end * self.up + self.down - 1) // self.down
+        output_num = output_end - self.output_count
+        if output_num <= 0:
+            self._update_history(np.concatenate([self.history, audio]), input_end, output_end)
+            return np.zeros(0, dtype=np.float32)
+        period_filter = self._get_period_filter(self.output_count % self.up)
+        period_num = (output_num + self.up - 1) // self.up
+        # buffer starts taps_per_phase - 1 samples before input_count, which is where window of output_count starts
+        window_start = (self.output_count * self.down) // self.up - self.input_count
+        buffer_size = window_start + (period_num - 1) * self.down + period_filter.shape[0]
+        buffer = np.zeros(max(buffer_size, self.history.shape[0] + audio.shape[0]), dtype=np.float32)
+        buffer[:self.history.shape[0]] = self.history
+        buffer[self.history.shape[0]:self.history.shape[0] + audio.shape[0]] = audio
+        windows = as_strided(buffer[window_start:], shape=(period_num, period_filter.shape[0]),
+                             strides=(self.down * buffer.itemsize, buffer.itemsize), writeable=False)
+        output = (np.ascontiguousarray(windows) @ period_filter).reshape(-1)[:output_num]
+        self._update_history(buffer[:self.history.shape[0] + audio.shape[0]], input_end, output_end)
+        return output
+
+    def _get_period_filter(self, slot: int) -> np.ndarray:
+        # Every up outputs consume down new inputs with a repeating phase pattern. Output m = m0 + r of a
+        # period applies phase ((m0 + r) * down) % up to the taps_per_phase inputs ending at ((m0 + r) * down) // up.
+        # Filters of a whole period are packed into one matrix per start slot m0 % up, so resampling a chunk is
+        # a single matrix multiplication of strided input windows. Built on first use, as chunks of equal size
+        # usually start on the same few slots.
+        period_filter = self.period_filters.get(slot)
+        if period_filter is None:
+            if len(self.period_filters) >= self.max_cached_filters:
+                self.period_filters.clear()
+            positions = [(slot + r) * self.down for r in range(self.up)]
+            offsets = [position // self.up - positions[0] // self.up for position in positions]
+            period_filter = np.zeros((self.taps_per_phase + offsets[-1], self.up), dtype=np.float32)
+            for r, position in enumerate(positions):
+                period_filter[offsets[r]:offsets[r] + self.taps_per_phase, r] = self.phase_filters[position % self.up]
+            self.period_filters[slot] = period_filter
+        return period_filter
+
+    def _update_history(self, stream: np.ndarray, input_end: int, output_end: int):
+        history_size = self.history.shape[0]
+        if history_size > 0:
+            self.history = stream[stream.shape[0] - history_size:].copy()
+        self.input_count = input_end
+        self.output_count = output_end
+
+
+def framewise_rms(audio: np.ndarray, frame_length: int, hop_length: int, center: bool = True) -> np.ndarray:
+    # same framing as librosa.feature.rms with constant padding, returns one value per frame
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    if center:
+        padded = np.zeros(audio.shape[0] + 2 * (frame_length // 2), dtype=np.float32)
+        padded[frame_length // 2:frame_length // 2 + audio.shape[0]] = audio
+        audio = padded
+    if audio.shape[0] < frame_length:
+        return np.zeros(0, dtype=np.float32)
+    frames = sliding_window_view(audio, frame_length)[::hop_length]
+    return np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame_length)
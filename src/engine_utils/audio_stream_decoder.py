@@ -0,0 +1,50 @@
+from typing import List, Optional
+
+import av
+import numpy as np
+
+
+# Decodes a compressed audio stream (e.g. mp3 from a tts service) chunk by chunk into mono float32 pcm
+# at the target sample rate. Partial frames are buffered by the parser until the rest of them arrives.
+class StreamingAudioDecoder:
+    def __init__(self, codec_name: str = "mp3", sample_rate: int = 24000):
+        self.codec_name = codec_name
+        self.sample_rate = sample_rate
+        self.codec = av.CodecContext.create(codec_name, "r")
+        self.resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+
+    def decode(self, data: bytes) -> Optional[np.ndarray]:
+        return self._decode_packets(self.codec.parse(data))
+
+    def flush(self) -> Optional[np.ndarray]:
+        pcms = []
+        remainder = self._decode_packets(self.codec.parse(None))
+        if remainder is not None:
+            pcms.append(remainder)
+        for frame in self.codec.decode(None):
+            pcms.extend(self._resample(frame))
+        pcms.extend(self._resample(None))
+        return self._concat(pcms)
+
+    def _decode_packets(self, packets) -> Optional[np.ndarray]:
+        pcms = []
+        for packet in packets:
+            try:
+                frames = self.codec.decode(packet)
+            except av.error.InvalidDataError:
+                # id3 tags and other non-audio data in the stream
+                continue
+            for frame in frames:
+                pcms.extend(self._resample(frame))
+        return self._concat(pcms)
+
+    def _resample(self, frame) -> List[np.ndarray]:
+        return [resampled.to_ndarray().reshape(-1) for resampled in self.resampler.resample(frame)]
+
+    @staticmethod
+    def _concat(pcms: List[np.ndarray]) -> Optional[np.ndarray]:
+        if len(pcms) == 0:
+            return None
+        if len(pcms) == 1:
+            return pcms[0]
+        return np.concatenate(pcms)
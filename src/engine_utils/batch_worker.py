@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+
+@dataclass
+class BatchRequest:
+    payload: Any
+    enqueue_time: float = field(default_factory=time.monotonic)
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[Exception] = None
+
+
+@dataclass
+class BatchWorkerMetrics:
+    request_count: int = 0
+    batch_count: int = 0
+    batch_size_histogram: Dict[int, int] = field(default_factory=lambda: defaultdict(int))
+    total_queue_delay: float = 0.0
+    max_queue_delay: float = 0.0
+    total_infer_time: float = 0.0
+
+
+# Runs requests submitted from handler threads of all sessions through one run_batch call on a shared model.
+# The worker takes everything pending as soon as it is idle and requests arriving while a batch runs form the
+# next one, so a lone request never waits for sessions that have nothing to submit. Requests are batched only
+# with those of the same group_key as the oldest one, e.g. inputs of the same length.
+class BatchWorker:
+    def __init__(self, name: str, run_batch: Callable[[List[Any]], List[Any]], max_batch_size: int = 8,
+                 group_key: Optional[Callable[[Any], Any]] = None):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.group_key = group_key
+
+        self.pending: List[BatchRequest] = []
+        self.condition = threading.Condition()
+        self.worker: Optional[threading.Thread] = None
+        self.metrics = BatchWorkerMetrics()
+
+    def submit(self, payload: Any) -> Any:
+        """Blocks until the batch holding payload has run, errors of run_batch are raised to every caller."""
+        request = BatchRequest(payload=payload)
+        with self.condition:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._batch_worker, name=self.name, daemon=True)
+                self.worker.start()
+            self.pending.append(request)
+            self.condition.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def get_queue_depth(self) -> int:
+        with self.condition:
+            return len(self.pending)
+
+    def get_metrics(self) -> dict:
+        with self.condition:
+            metrics = self.metrics
+            batch_count = max(1, metrics.batch_count)
+            return {
+                "queue_depth": len(self.pending),
+                "request_count": metrics.request_count,
+                "batch_count": metrics.batch_count,
+                "avg_batch_size": metrics.request_count / batch_count,
+                "batch_size_histogram": dict(sorted(metrics.batch_size_histogram.items())),
+                "avg_queue_delay_ms": metrics.total_queue_delay / max(1, metrics.request_count) * 1000,
+                "max_queue_delay_ms": metrics.max_queue_delay * 1000,
+                "avg_infer_ms": metrics.total_infer_time / batch_count * 1000,
+            }
+
+    def _take_batch(self) -> List[BatchRequest]:
+        if self.group_key is None:
+            batch = self.pending[:self.max_batch_size]
+            del self.pending[:self.max_batch_size]
+            return batch
+        key = self.group_key(self.pending[0].payload)
+        batch = []
+        remaining = []
+        for request in self.pending:
+            if len(batch) < self.max_batch_size and self.group_key(request.payload) == key:
+                batch.append(request)
+            else:
+                remaining.append(request)
+        self.pending = remaining
+        return batch
+
+    def _batch_worker(self):
+        while True:
+            with self.condition:
+                while len(self.pending) == 0:
+                    self.condition.wait()
+                batch = self._take_batch()
+            start_time = time.monotonic()
+            try:
+                results = self.run_batch([request.payload for request in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} returned {len(results)} results for {len(batch)} requests.")
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                logger.opt(exception=e).error(f"Batch of {len(batch)} requests failed in {self.name}.")
+                for request in batch:
+                    request.error = e
+            self._update_metrics(batch, start_time, time.monotonic() - start_time)
+            for request in batch:
+                request.done.set()
+
+    def _update_metrics(self, batch: List[BatchRequest], start_time: float, infer_time: float):
+        with self.condition:
+            metrics = self.metrics
+            metrics.batch_count += 1
+            metrics.request_count += len(batch)
+            metrics.batch_size_histogram[len(batch)] += 1
+            metrics.total_infer_time += infer_time
+            for request in batch:
+                queue_delay = start_time - request.enqueue_time
+                metrics.total_queue_delay += queue_delay
+                metrics.max_queue_delay = max(metrics.max_queue_delay, queue_delay)
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Callable, Any, List
+from typing import Callable, Any, List, Optional
 
 import numpy as np
 from loguru import logger
@@ -25,6 +25,73 @@ class SliceManipulator:
         )
         return manipulator
 
+
+class NumpyRingBuffer:
+    def __init__(self, axis: int, capacity: int):
+        self.axis = axis
+        self.capacity = capacity
+        self.buffer: Optional[np.ndarray] = None
+        self.read_pos = 0
+        self.size = 0
+
+    def _reserve(self, data: np.ndarray, append_size: int):
+        if self.buffer is None:
+            self.capacity = max(self.capacity, append_size)
+            self.buffer = np.empty((self.capacity,) + data.shape[1:], dtype=data.dtype)
+            return
+        if self.buffer.shape[1:] != data.shape[1:]:
+            msg = f"Slice data shape {data.shape[1:]} does not match buffered shape {self.buffer.shape[1:]}"
+            raise RuntimeError(msg)
+        if self.size == 0:
+            self.read_pos = 0
+        if self.size + append_size <= self.capacity:
+            return
+        new_capacity = max(self.capacity * 2, self.size + append_size)
+        new_buffer = np.empty((new_capacity,) + self.buffer.shape[1:], dtype=self.buffer.dtype)
+        pending_size = self.size
+        if pending_size > 0:
+            new_buffer[:pending_size] = self._take(pending_size)
+        self.buffer = new_buffer
+        self.capacity = new_capacity
+        self.read_pos = 0
+        self.size = pending_size
+
+    def append(self, data: np.ndarray):
+        if self.axis != 0:
+            data = np.moveaxis(data, self.axis, 0)
+        append_size = data.shape[0]
+        self._reserve(data, append_size)
+        write_pos = (self.read_pos + self.size) % self.capacity
+        head_size = min(append_size, self.capacity - write_pos)
+        self.buffer[write_pos:write_pos + head_size] = data[:head_size]
+        if append_size > head_size:
+            self.buffer[:append_size - head_size] = data[head_size:]
+        self.size += append_size
+
+    def _take(self, take_size: int):
+        start = self.read_pos
+        if start + take_size <= self.capacity:
+            result = self.buffer[start:start + take_size]
+        else:
+            result = np.concatenate([self.buffer[start:], self.buffer[:take_size - (self.capacity - start)]], axis=0)
+        self.read_pos = (start + take_size) % self.capacity
+        self.size -= take_size
+        return result
+
+    def take(self, take_size: int):
+        if self.axis == 0:
+            return self._take(take_size)
+        return np.moveaxis(self._take(take_size), 0, self.axis)
+
+    def flush(self):
+        if self.size == 0:
+            return None
+        result = self.take(self.size).copy()
+        self.read_pos = 0
+        self.size = 0
+        return result
+
+
 @dataclass
 class SliceContext:
     slice_size: int
@@ -33,6 +100,8 @@ class SliceContext:
     sliced_sample_num: int = 0      # num of input data
     next_slice_start_id: int = 0
     last_slice_size: int = 0
+    # if set, input is appended into this buffer and slices are yielded as views of it
+    ring_buffer: Optional[NumpyRingBuffer] = None
 
     @classmethod
     def create_numpy_slice_context(cls, slice_size: int, slice_axis: int):
@@ -42,9 +111,23 @@ class SliceContext:
         )
         return context
 
+    @classmethod
+    def create_numpy_ring_slice_context(cls, slice_size: int, slice_axis: int, capacity: Optional[int] = None):
+        # Slices are views of the ring buffer and only valid until next slice_data call, copy them to keep longer.
+        if capacity is None:
+            capacity = slice_size * 4
+        context = SliceContext(
+            slice_size=slice_size,
+            data_manipulator=SliceManipulator.create_numpy_manipulator(slice_axis),
+            ring_buffer=NumpyRingBuffer(slice_axis, capacity),
+        )
+        return context
+
     def flush(self):
         remainder = self.last_remainder
         self.last_remainder = None
+        if self.ring_buffer is not None:
+            remainder = self.ring_buffer.flush()
         self.sliced_sample_num = 0
         self.next_slice_start_id = 0
         self.last_slice_size = 0
@@ -62,8 +145,22 @@ class SliceContext:
         return self.next_slice_start_id
 
 
+def _slice_ring_data(context: SliceContext, data: np.ndarray):
+    ring_buffer = context.ring_buffer
+    context.sliced_sample_num += data.shape[ring_buffer.axis]
+    ring_buffer.append(data)
+    while ring_buffer.size >= context.slice_size:
+        result = ring_buffer.take(context.slice_size)
+        context.last_slice_size = context.slice_size
+        context.next_slice_start_id += context.last_slice_size
+        yield result
+
+
 def slice_data(context: SliceContext, data):
     # TODO update slice start id
+    if context.ring_buffer is not None:
+        yield from _slice_ring_data(context, data)
+        return
     slice_func = context.data_manipulator.slice_func
 
     remainder_size = 0
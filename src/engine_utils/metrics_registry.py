@@ -0,0 +1,191 @@
+import bisect
+import math
+import threading
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+from engine_utils.singleton import SingletonMeta
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class CounterChild:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+    def collect(self, name: str, labels: str):
+        return [f"{name}{labels} {_format_value(self.value)}"]
+
+
+class GaugeChild:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self.lock:
+            self.value -= amount
+
+    def collect(self, name: str, labels: str):
+        return [f"{name}{labels} {_format_value(self.value)}"]
+
+
+class HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        # the last count is for values above every bucket bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def get_mean(self) -> float:
+        with self.lock:
+            count = sum(self.counts)
+            return self.sum / count if count > 0 else 0.0
+
+    def collect(self, name: str, labels: str):
+        with self.lock:
+            counts = list(self.counts)
+            value_sum = self.sum
+        label_prefix = labels[:-1] + "," if labels else "{"
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{label_prefix}le=\"{_format_value(bound)}\"}} {cumulative}")
+        lines.append(f"{name}_sum{labels} {_format_value(value_sum)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+MetricChild = Union[CounterChild, GaugeChild, HistogramChild]
+
+
+# A named metric with children per label values. Callers on hot paths should keep the child returned by labels()
+# instead of looking it up every time. A family without labels forwards inc, set, dec and observe to its only child.
+class MetricFamily:
+    def __init__(self, name: str, documentation: str, metric_type: str, label_names: Sequence[str],
+                 buckets: Optional[Tuple[float, ...]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.label_names = tuple(label_names)
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.children: Dict[Tuple[str, ...], MetricChild] = {}
+        self.default_child: Optional[MetricChild] = None
+        if not self.label_names:
+            self.default_child = self._create_child()
+            self.children[()] = self.default_child
+
+    def _create_child(self) -> MetricChild:
+        if self.metric_type == "counter":
+            return CounterChild()
+        if self.metric_type == "gauge":
+            return GaugeChild()
+        return HistogramChild(self.buckets)
+
+    def labels(self, *label_values) -> MetricChild:
+        child = self.children.get(label_values)
+        if child is None:
+            key = tuple(str(value) for value in label_values)
+            if len(key) != len(self.label_names):
+                raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {key}.")
+            with self.lock:
+                child = self.children.get(key)
+                if child is None:
+                    child = self._create_child()
+                    self.children[key] = child
+        return child
+
+    def inc(self, amount: float = 1.0):
+        self.default_child.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.default_child.dec(amount)
+
+    def set(self, value: float):
+        self.default_child.set(value)
+
+    def observe(self, value: float):
+        self.default_child.observe(value)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self.lock:
+            children = list(self.children.items())
+        for label_values, child in children:
+            labels = ""
+            if label_values:
+                labels = "{" + ",".join(f"{label_name}=\"{_escape_label_value(label_value)}\""
+                                        for label_name, label_value in zip(self.label_names, label_values)) + "}"
+            lines.extend(child.collect(self.name, labels))
+        return lines
+
+
+# Engine wide metrics in the Prometheus text format. Metrics are declared where they are used, declaring the same
+# name again returns the existing family, so modules can be reloaded or imported in any order.
+class MetricsRegistry(metaclass=SingletonMeta):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.families: Dict[str, MetricFamily] = {}
+
+    def _get_family(self, name: str, documentation: str, metric_type: str, label_names: Sequence[str],
+                    buckets: Optional[Tuple[float, ...]] = None) -> MetricFamily:
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = MetricFamily(name, documentation, metric_type, label_names, buckets)
+                self.families[name] = family
+            elif family.metric_type != metric_type or family.label_names != tuple(label_names):
+                raise ValueError(f"Metric {name} is already registered as {family.metric_type} "
+                                 f"with labels {family.label_names}.")
+        return family
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._get_family(name, documentation, "counter", label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._get_family(name, documentation, "gauge", label_names)
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> MetricFamily:
+        return self._get_family(name, documentation, "histogram", label_names, tuple(sorted(buckets)))
+
+    def render(self) -> str:
+        with self.lock:
+            families = list(self.families.values())
+        lines = []
+        for family in families:
+            lines.extend(family.collect())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,33 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from engine_utils.batch_worker import BatchWorker
+
+
+# Decodes pending utterances of all sessions with one generate call on the shared model.
+class SenseVoiceBatchService:
+    def __init__(self, model, max_batch_size: int = 8):
+        self.model = model
+        self.batch_worker = BatchWorker("sensevoice_batch", self._run_batch, max_batch_size)
+
+    def generate(self, speech_id: str, audio: np.ndarray) -> Optional[dict]:
+        try:
+            return self.batch_worker.submit((speech_id, audio))
+        except Exception as e:
+            logger.warning(f"Batched ASR inference failed on speech {speech_id}: {e}")
+            return None
+
+    def get_queue_depth(self) -> int:
+        return self.batch_worker.get_queue_depth()
+
+    def get_metrics(self) -> dict:
+        return self.batch_worker.get_metrics()
+
+    def _run_batch(self, batch: List[Tuple[str, np.ndarray]]) -> List[Optional[dict]]:
+        # no key is passed, funasr would give every result the whole key list, results come back in input order
+        results = self.model.generate(input=[audio for _, audio in batch], batch_size=len(batch), batch_size_s=10)
+        if len(results) != len(batch):
+            logger.warning(f"ASR returned {len(results)} results for a batch of {len(batch)} utterances.")
+        return [results[i] if i < len(results) else None for i in range(len(batch))]
@@ -1,6 +1,7 @@
 
 
 import re
+import time
 from typing import Dict, Optional, cast
 from loguru import logger
 import numpy as np
@@ -19,10 +20,24 @@ from funasr import AutoModel
 
 from engine_utils.directory_info import DirectoryInfo
 from engine_utils.general_slicer import SliceContext, slice_data
+from engine_utils.metrics_registry import MetricsRegistry
+from handlers.asr.sensevoice.asr_batch_service import SenseVoiceBatchService
+
+ASR_INFERENCE_SECONDS = MetricsRegistry().histogram(
+    "chat_inference_seconds", "Model inference time of one call, batched calls included.",
+    ("model",)).labels("sensevoice")
 
 
 class ASRConfig(HandlerBaseConfigModel, BaseModel):
     model_name: str = Field(default="iic/SenseVoiceSmall")
+    # Decode audio before each pause marked by VAD while human is still speaking, so the decode at speech end
+    # only covers audio after the last pause
+    streaming: bool = Field(default=False)
+    # Audio before a pause shorter than this (in seconds) is kept for the next decode
+    streaming_min_segment: float = Field(default=1.0)
+    # Decode utterances of all sessions through one batched generate call
+    batch_inference: bool = Field(default=False)
+    max_batch_size: int = Field(default=8)
 
 
 class ASRContext(HandlerContext):
@@ -36,6 +51,8 @@ class ASRContext(HandlerContext):
             slice_axis=0,
         )
         self.cache = {}
+        # text of the audio decoded at pauses of the current speech
+        self.committed_text = ''
 
         self.dump_audio = True
         self.audio_dump_file = None
@@ -51,6 +68,7 @@ class HandlerASR(HandlerBase, ABC):
         super().__init__()
 
         self.model_name = 'iic/SenseVoiceSmall'
+        self.batch_service: Optional[SenseVoiceBatchService] = None
 
         if torch.cuda.is_available():
             self.device = torch.device("cuda:0")
@@ -87,13 +105,18 @@ class HandlerASR(HandlerBase, ABC):
     def load(self, engine_config: ChatEngineConfigModel, handler_config: Optional[BaseModel] = None):
         if isinstance(handler_config, ASRConfig):
             self.model_name = handler_config.model_name
+        else:
+            handler_config = ASRConfig()
 
         self.model = AutoModel(model=self.model_name, disable_update=True)
+        if handler_config.batch_inference:
+            self.batch_service = SenseVoiceBatchService(self.model, max_batch_size=handler_config.max_batch_size)
 
     def create_context(self, session_context, handler_config=None):
         if not isinstance(handler_config, ASRConfig):
             handler_config = ASRConfig()
         context = ASRContext(session_context.session_info.session_id)
+        context.config = handler_config
         context.shared_states = session_context.shared_states
         return context
     
@@ -124,6 +147,9 @@ class HandlerASR(HandlerBase, ABC):
 
         speech_end = inputs.data.get_meta("human_speech_end", False)
         if not speech_end:
+            if context.config.streaming and inputs.data.get_meta("human_speech_pause", False):
+                sample_rate = inputs.data.get_main_definition_entry().sample_rate
+                self._decode_segment(context, speech_id, sample_rate)
             return
 
         # prefill remainder audio in slice context
@@ -134,15 +160,12 @@ class HandlerASR(HandlerBase, ABC):
                     [remainder_audio,
                      np.zeros(shape=(context.audio_slice_context.slice_size - remainder_audio.shape[0]))])
                 context.output_audios.append(remainder_audio)
-        output_audio = np.concatenate(context.output_audios)
-        if context.audio_dump_file is not None:
-            logger.info('dump audio')
-            context.audio_dump_file.write(output_audio.tobytes())
-
-        res = self.model.generate(input=output_audio, batch_size_s=10)
-        logger.info(res)
+        output_text = context.committed_text
+        if len(context.output_audios) > 0:
+            output_text = self._join_text(output_text,
+                                          self._decode(context, speech_id, np.concatenate(context.output_audios)))
         context.output_audios.clear()
-        output_text = re.sub(r"<\|.*?\|>", "", res[0]['text'])
+        context.committed_text = ''
         if len(output_text) == 0:
             # 如果 ASR 识别结果为空，则需要重新开启vad
             context.shared_states.enable_vad = True
@@ -159,5 +182,43 @@ class HandlerASR(HandlerBase, ABC):
         end_output.add_meta("speech_id", speech_id)
         yield end_output
 
+    def _decode(self, context: ASRContext, speech_id, audio: np.ndarray) -> str:
+        if context.audio_dump_file is not None:
+            logger.info('dump audio')
+            context.audio_dump_file.write(audio.tobytes())
+        t_start = time.monotonic()
+        if self.batch_service is not None:
+            res = self.batch_service.generate(speech_id, audio)
+        else:
+            res = self.model.generate(input=audio, batch_size_s=10)[0]
+        ASR_INFERENCE_SECONDS.observe(time.monotonic() - t_start)
+        logger.info(res)
+        if res is None:
+            return ''
+        return re.sub(r"<\|.*?\|>", "", res['text'])
+
+    def _decode_segment(self, context: ASRContext, speech_id, sample_rate: int):
+        remainder_audio = context.audio_slice_context.flush()
+        if remainder_audio is not None:
+            context.output_audios.append(remainder_audio)
+        if len(context.output_audios) == 0:
+            return
+        audio = np.concatenate(context.output_audios)
+        context.output_audios.clear()
+        if audio.shape[0] < context.config.streaming_min_segment * sample_rate:
+            # too short to be decoded on its own, sliced again with the audio after the pause
+            context.output_audios.extend(slice_data(context.audio_slice_context, audio))
+            return
+        context.committed_text = self._join_text(context.committed_text, self._decode(context, speech_id, audio))
+
+    @classmethod
+    def _join_text(cls, head: str, tail: str) -> str:
+        # segments of languages written with spaces, e.g. english, need one between them
+        if len(head) > 0 and len(tail) > 0 and head[-1].isascii() and head[-1].isalnum() \
+                and tail[0].isascii() and tail[0].isalnum():
+            return head + " " + tail
+        return head + tail
+
     def destroy_context(self, context: HandlerContext):
-        pass
+        if self.batch_service is not None:
+            logger.info(f"ASR batch metrics: {self.batch_service.get_metrics()}")
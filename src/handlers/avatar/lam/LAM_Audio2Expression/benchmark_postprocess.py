@@ -0,0 +1,91 @@
+"""
+Compares streaming post-processing against the original implementation, which concatenated the previous
+64 processed frames with every new chunk, on recorded audio. Reports parity and post-processing time.
+
+python benchmark_postprocess.py --options audio_input=./assets/sample_audio/BarackObama.wav
+"""
+
+import time
+
+import librosa
+import numpy as np
+
+from engines.defaults import (
+    default_argument_parser,
+    default_config_parser,
+    default_setup,
+)
+from engines.infer import INFER, ExpressionHistoryPostprocessor
+
+HISTORY_FRAMES = [64, 32, 16, 8]
+
+
+def record_raw_chunks(infer, audio, sample_rate):
+    chunks = []
+    postprocess_streaming = infer.postprocess_streaming
+
+    def recording_postprocess(out_exp, volume, context):
+        chunks.append((out_exp.copy(), volume.copy()))
+        return postprocess_streaming(out_exp, volume, context)
+
+    infer.postprocess_streaming = recording_postprocess
+    context = None
+    for start in range(0, audio.shape[0], sample_rate):
+        _, context = infer.infer_streaming_audio(audio[start:start + sample_rate], sample_rate, context)
+    infer.postprocess_streaming = postprocess_streaming
+    return chunks
+
+
+def legacy_postprocess(infer, chunks, max_frame_length=64):
+    np.random.seed(0)
+    previous_expression = None
+    previous_volume = None
+    outputs = []
+    for out_exp, volume in chunks:
+        if previous_expression is None:
+            out_exp = infer.apply_expression_postprocessing(out_exp, audio_volume=volume)
+            previous_expression = out_exp.copy()
+            previous_volume = volume.copy()
+        else:
+            previous_length = previous_expression.shape[0]
+            out_exp = infer.apply_expression_postprocessing(
+                expression_params=np.concatenate([previous_expression, out_exp], axis=0),
+                audio_volume=np.concatenate([previous_volume, volume], axis=0),
+                processed_frames=previous_length)[previous_length:, :]
+            previous_expression = np.concatenate([previous_expression, out_exp], axis=0)[-max_frame_length:, :]
+            previous_volume = np.concatenate([previous_volume, volume], axis=0)[-max_frame_length:]
+        outputs.append(out_exp)
+    return np.concatenate(outputs, axis=0)
+
+
+def streaming_postprocess(infer, chunks, history_frames):
+    np.random.seed(0)
+    postprocessor = ExpressionHistoryPostprocessor(infer.apply_expression_postprocessing, history_frames)
+    return np.concatenate([postprocessor.process(out_exp, volume) for out_exp, volume in chunks], axis=0)
+
+
+def timed(func, *args):
+    t_start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t_start
+
+
+if __name__ == '__main__':
+    args = default_argument_parser().parse_args()
+    args.config_file = 'configs/lam_audio2exp_config_streaming.py'
+    cfg = default_config_parser(args.config_file, args.options)
+
+    cfg = default_setup(cfg)
+    infer = INFER.build(dict(type=cfg.infer.type, cfg=cfg))
+    infer.model.eval()
+
+    audio, sample_rate = librosa.load(cfg.audio_input, sr=16000)
+    chunks = record_raw_chunks(infer, audio, sample_rate)
+
+    reference, dur_legacy = timed(legacy_postprocess, infer, chunks)
+    print(f"{'history':>8} {'ms/chunk':>9} {'max diff':>9} {'identical':>10}")
+    print(f"{'legacy':>8} {dur_legacy / len(chunks) * 1000:>9.3f} {0.0:>9.4f} {'-':>10}")
+    for history_frames in HISTORY_FRAMES:
+        output, duration = timed(streaming_postprocess, infer, chunks, history_frames)
+        print(f"{history_frames:>8} {duration / len(chunks) * 1000:>9.3f} "
+              f"{np.abs(output - reference).max():>9.4f} {str(np.array_equal(output, reference)):>10}")
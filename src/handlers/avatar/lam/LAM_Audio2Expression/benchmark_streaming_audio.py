@@ -0,0 +1,65 @@
+"""
+Benchmark of streaming inference, compares the full 64 frame window against incremental mode with shorter
+left context. Reports per-chunk latency, real time factor and blendshape difference to the full window mode.
+
+python benchmark_streaming_audio.py --options audio_input=./assets/sample_audio/BarackObama.wav
+"""
+
+import time
+
+import librosa
+import numpy as np
+
+from engines.defaults import (
+    default_argument_parser,
+    default_config_parser,
+    default_setup,
+)
+from engines.infer import INFER
+
+CONTEXT_FRAMES = [0, 32, 16, 8]
+
+
+def run_streaming(infer, audio, sample_rate, chunk_size, context_frames):
+    infer.cfg.streaming_context_frames = context_frames
+    # post-processing draws random eye blinks, seed it so that outputs of all modes are comparable
+    np.random.seed(0)
+    context = None
+    all_exp = []
+    latencies = []
+    for start in range(0, audio.shape[0], chunk_size):
+        chunk = audio[start:start + chunk_size]
+        t_start = time.perf_counter()
+        output, context = infer.infer_streaming_audio(chunk, sample_rate, context)
+        latencies.append(time.perf_counter() - t_start)
+        all_exp.append(output['expression'])
+    return np.concatenate(all_exp, axis=0), np.array(latencies)
+
+
+if __name__ == '__main__':
+    args = default_argument_parser().parse_args()
+    args.config_file = 'configs/lam_audio2exp_config_streaming.py'
+    cfg = default_config_parser(args.config_file, args.options)
+
+    cfg = default_setup(cfg)
+    infer = INFER.build(dict(type=cfg.infer.type, cfg=cfg))
+    infer.model.eval()
+
+    audio, sample_rate = librosa.load(cfg.audio_input, sr=16000)
+    chunk_size = sample_rate
+    audio_duration = audio.shape[0] / sample_rate
+
+    # warmup
+    run_streaming(infer, audio[:chunk_size * 2], sample_rate, chunk_size, 0)
+
+    reference_exp = None
+    print(f"{'context':>8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'rtf':>7} {'max diff':>9} {'mean diff':>10}")
+    for context_frames in CONTEXT_FRAMES:
+        exp, latencies = run_streaming(infer, audio, sample_rate, chunk_size, context_frames)
+        if reference_exp is None:
+            reference_exp = exp
+        diff = np.abs(exp - reference_exp)
+        name = 'full' if context_frames <= 0 else str(context_frames)
+        print(f"{name:>8} {latencies.mean() * 1000:>8.1f} {np.percentile(latencies, 50) * 1000:>8.1f} "
+              f"{np.percentile(latencies, 95) * 1000:>8.1f} {latencies.sum() / audio_duration:>7.3f} "
+              f"{diff.max():>9.4f} {diff.mean():>10.5f}")
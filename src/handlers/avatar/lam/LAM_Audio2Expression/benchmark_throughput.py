@@ -0,0 +1,53 @@
+"""
+Throughput benchmark of streaming inference on the configured device and precision, e.g.
+
+python benchmark_throughput.py --options device=cpu precision=int8 cpu_threads=4
+"""
+
+import time
+
+import numpy as np
+
+from engines.defaults import (
+    default_argument_parser,
+    default_config_parser,
+    default_setup,
+)
+from engines.infer import INFER
+
+CHUNK_NUM = 50
+
+
+if __name__ == '__main__':
+    args = default_argument_parser().parse_args()
+    args.config_file = 'configs/lam_audio2exp_config_streaming.py'
+    cfg = default_config_parser(args.config_file, args.options)
+
+    cfg = default_setup(cfg)
+    infer = INFER.build(dict(type=cfg.infer.type, cfg=cfg))
+    infer.model.eval()
+
+    sample_rate = cfg.audio_sr
+    rng = np.random.default_rng(0)
+    chunks = [rng.uniform(-0.3, 0.3, sample_rate).astype(np.float32) for _ in range(CHUNK_NUM)]
+
+    context = None
+    for chunk in chunks[:3]:
+        _, context = infer.infer_streaming_audio(chunk, sample_rate, context)
+
+    context = None
+    latencies = []
+    t_start = time.perf_counter()
+    for chunk in chunks:
+        t_chunk = time.perf_counter()
+        _, context = infer.infer_streaming_audio(chunk, sample_rate, context)
+        latencies.append(time.perf_counter() - t_chunk)
+    duration = time.perf_counter() - t_start
+    latencies = np.array(latencies)
+
+    audio_duration = CHUNK_NUM * chunks[0].shape[0] / sample_rate
+    print(f"device: {infer.device}, precision: {infer.precision}")
+    print(f"chunks/s: {CHUNK_NUM / duration:.2f}, rtf: {duration / audio_duration:.3f}, "
+          f"realtime streams: {audio_duration / duration:.1f}")
+    print(f"chunk latency ms mean: {latencies.mean() * 1000:.1f}, p50: {np.percentile(latencies, 50) * 1000:.1f}, "
+          f"p95: {np.percentile(latencies, 95) * 1000:.1f}")
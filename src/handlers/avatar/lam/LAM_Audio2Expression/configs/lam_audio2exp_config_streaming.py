@@ -9,6 +9,13 @@ fps = 30.0
 movement_smooth = False
 brow_movement = False
 id_idx = 0
+device = 'auto'  # auto, cpu, cuda, cuda:N
+precision = 'fp32'  # fp32, bf16 (autocast) or int8 (dynamic quantization of wav2vec encoder, cpu only)
+cpu_threads = 0  # torch intra-op threads on cpu, 0 keeps torch default
+onnx_path = 'pretrained_models/lam_audio2exp_streaming.onnx'  # used by Audio2ExpressionOnnxInfer
+onnx_intra_op_threads = 0  # 0 keeps onnxruntime default
+streaming_context_frames = 0  # left context frames re-encoded per streaming chunk, 0 for full 64 frame window
+postprocess_history_frames = 64  # processed frames re-processed with each chunk, 64 keeps original output
 
 resume = False  # whether to resume training process
 evaluate = True  # evaluate after each epoch training process
@@ -18,6 +18,8 @@ limitations under the License.
 import os
 import math
 import time
+from contextlib import nullcontext
+from typing import Callable, List, Optional
 import librosa
 import numpy as np
 from collections import OrderedDict
@@ -39,8 +41,78 @@ from models.utils import smooth_mouth_movements, apply_frame_blending, apply_sav
     symmetrize_blendshapes, apply_random_eye_blinks, apply_random_eye_blinks_context, export_blendshape_animation, \
     RETURN_CODE, DEFAULT_CONTEXT, ARKitBlendShape
 
+try:
+    from engine_utils.audio_resampler import StreamingResampler, framewise_rms
+except ImportError:
+    # running standalone without the chat engine sources, streaming falls back to librosa
+    StreamingResampler = None
+    framewise_rms = None
+
 INFER = Registry("infer")
 
+
+class FrameHistory:
+    """Keeps the latest history_frames frames of a stream in preallocated buffers."""
+
+    def __init__(self, history_frames: int):
+        self.history_frames = history_frames
+        self.length = 0
+        self.history: Optional[np.ndarray] = None
+        self.work: Optional[np.ndarray] = None
+
+    def stage(self, frames: np.ndarray) -> np.ndarray:
+        """Returns history followed by frames, written to a reusable work buffer."""
+        total = self.length + frames.shape[0]
+        # same dtype promotion as concatenating history and frames
+        dtype = frames.dtype if self.history is None else np.result_type(self.history, frames)
+        if self.work is None or self.work.shape[0] < total or self.work.dtype != dtype:
+            self.work = np.empty((max(total, self.history_frames * 2),) + frames.shape[1:], dtype=dtype)
+        self.work[:self.length] = self.history[:self.length]
+        self.work[self.length:total] = frames
+        return self.work[:total]
+
+    def append(self, frames: np.ndarray):
+        if self.history is None:
+            self.history = np.empty((self.history_frames,) + frames.shape[1:], dtype=frames.dtype)
+        frame_num = frames.shape[0]
+        if frame_num >= self.history_frames:
+            self.history[:] = frames[-self.history_frames:]
+            self.length = self.history_frames
+            return
+        keep = min(self.length, self.history_frames - frame_num)
+        self.history[:keep] = self.history[self.length - keep:self.length]
+        self.history[keep:keep + frame_num] = frames
+        self.length = keep + frame_num
+
+
+class ExpressionHistoryPostprocessor:
+    """Post-processes streaming expressions of a chunk together with the last history_frames processed frames.
+
+    The filter chain is not incremental, every chunk re-processes its history so smoothing and blending continue
+    across chunks. History is kept in preallocated buffers instead of being concatenated per chunk. 64 frames
+    reproduces the original streaming output, fewer frames bound the repeated work on history.
+    """
+
+    def __init__(self, postprocess_func: Callable, history_frames: int = 64):
+        self.postprocess_func = postprocess_func
+        self.expression_history = FrameHistory(history_frames)
+        self.volume_history = FrameHistory(history_frames)
+
+    def process(self, expression: np.ndarray, volume: np.ndarray) -> np.ndarray:
+        processed_frames = self.expression_history.length
+        if self.expression_history.history is None:
+            expression = self.postprocess_func(expression, audio_volume=volume)
+        else:
+            expression = self.postprocess_func(expression_params=self.expression_history.stage(expression),
+                                               audio_volume=self.volume_history.stage(volume),
+                                               processed_frames=processed_frames)[processed_frames:, :]
+            if np.may_share_memory(expression, self.expression_history.work):
+                # work buffer is reused by the next chunk
+                expression = expression.copy()
+        self.expression_history.append(expression)
+        self.volume_history.append(volume)
+        return expression
+
 class InferBase:
     def __init__(self, cfg, model=None, verbose=False) -> None:
         torch.multiprocessing.set_sharing_strategy("file_system")
@@ -51,6 +123,12 @@ class InferBase:
         self.logger.info("=> Loading config ...")
         self.cfg = cfg
         self.verbose = verbose
+        self.device = self.resolve_device(getattr(cfg, 'device', 'auto'))
+        self.precision = getattr(cfg, 'precision', 'fp32')
+        cpu_threads = getattr(cfg, 'cpu_threads', 0)
+        if self.device.type == 'cpu' and cpu_threads > 0:
+            torch.set_num_threads(cpu_threads)
+        self.logger.info(f"Device: {self.device}, precision: {self.precision}, threads: {torch.get_num_threads()}")
         if self.verbose:
             self.logger.info(f"Save path: {cfg.save_path}")
             self.logger.info(f"Config:\n{cfg.pretty_text}")
@@ -65,13 +143,13 @@ class InferBase:
         n_parameters = sum(p.numel() for p in model.parameters() if p.requires_grad)
         self.logger.info(f"Num params: {n_parameters}")
         model = create_ddp_model(
-            model.cuda(),
+            model.to(self.device),
             broadcast_buffers=False,
             find_unused_parameters=self.cfg.find_unused_parameters,
         )
         if os.path.isfile(self.cfg.weight):
             self.logger.info(f"Loading weight at: {self.cfg.weight}")
-            checkpoint = torch.load(self.cfg.weight)
+            checkpoint = torch.load(self.cfg.weight, map_location=self.device)
             weight = OrderedDict()
             for key, value in checkpoint["state_dict"].items():
                 if key.startswith("module."):
@@ -89,8 +167,39 @@ class InferBase:
             )
         else:
             raise RuntimeError("=> No checkpoint found at '{}'".format(self.cfg.weight))
+        if self.precision == 'int8':
+            model = self.quantize_audio_encoder(model)
         return model
 
+    @staticmethod
+    def resolve_device(device: str) -> torch.device:
+        if device == 'auto':
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        return torch.device(device)
+
+    def quantize_audio_encoder(self, model):
+        if self.device.type != 'cpu':
+            self.logger.warning("int8 dynamic quantization is only supported on cpu, keep fp32 model.")
+            return model
+        model.eval()
+        # named_modules is pre-order, first wav2vec module found is the top level encoder
+        for name, module in model.named_modules():
+            if type(module).__name__.startswith('Wav2Vec2'):
+                quantized = torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+                if name == '':
+                    return quantized
+                parent_name, _, attr_name = name.rpartition('.')
+                setattr(model.get_submodule(parent_name), attr_name, quantized)
+                self.logger.info(f"=> Quantized audio encoder '{name}' to int8")
+                return model
+        self.logger.info("=> Audio encoder not found, quantize all linear layers to int8")
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def autocast(self):
+        if self.precision == 'bf16':
+            return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16)
+        return nullcontext()
+
 
     def infer(self):
         raise NotImplementedError
@@ -99,6 +208,34 @@ class InferBase:
 
 @INFER.register_module()
 class Audio2ExpressionInfer(InferBase):
+    def __init__(self, cfg, model=None, verbose=False) -> None:
+        super().__init__(cfg, model, verbose)
+        # identity condition is constant, build it once on target device
+        self.id_one_hot = F.one_hot(torch.tensor(self.cfg.id_idx, device=self.device),
+                                    self.cfg.model.backbone.num_identity_classes)[None, ...]
+
+    def predict_expression(self, input_audio: np.ndarray) -> np.ndarray:
+        input_dict = {
+            'id_idx': self.id_one_hot,
+            'input_audio_array': torch.from_numpy(
+                np.ascontiguousarray(input_audio, dtype=np.float32)).to(self.device, non_blocking=True)[None, ...],
+        }
+        with torch.inference_mode(), self.autocast():
+            output_dict = self.model(input_dict)
+        return output_dict['pred_exp'].squeeze().float().cpu().numpy()
+
+    def predict_expression_batch(self, input_audios: List[np.ndarray]) -> List[np.ndarray]:
+        """Runs windows of equal length in one forward pass, returns expressions of each window."""
+        input_dict = {
+            'id_idx': self.id_one_hot.expand(len(input_audios), -1),
+            'input_audio_array': torch.from_numpy(
+                np.stack(input_audios).astype(np.float32, copy=False)).to(self.device, non_blocking=True),
+        }
+        with torch.inference_mode(), self.autocast():
+            output_dict = self.model(input_dict)
+        pred_exp = output_dict['pred_exp'].float().cpu().numpy()
+        return [pred_exp[i] for i in range(pred_exp.shape[0])]
+
     def infer(self):
         logger = get_root_logger()
         logger.info(">>>>>>>>>>>>>>>> Start Inference >>>>>>>>>>>>>>>>")
@@ -114,26 +251,18 @@ class Audio2ExpressionInfer(InferBase):
             if(os.path.exists(vocal_path)):
                 self.cfg.audio_input = vocal_path
 
-        with torch.no_grad():
-            input_dict = {}
-            input_dict['id_idx'] = F.one_hot(torch.tensor(self.cfg.id_idx),
-                                             self.cfg.model.backbone.num_identity_classes).cuda(non_blocking=True)[None,...]
-            speech_array, ssr = librosa.load(self.cfg.audio_input, sr=16000)
-            input_dict['input_audio_array'] = torch.FloatTensor(speech_array).cuda(non_blocking=True)[None,...]
-
-            end = time.time()
-            output_dict = self.model(input_dict)
-            batch_time.update(time.time() - end)
+        speech_array, ssr = librosa.load(self.cfg.audio_input, sr=16000)
+        end = time.time()
+        out_exp = self.predict_expression(speech_array)
+        batch_time.update(time.time() - end)
 
-            logger.info(
-                "Infer: [{}] "
-                "Running Time: {batch_time.avg:.3f} ".format(
-                    self.cfg.audio_input,
-                    batch_time=batch_time,
-                )
+        logger.info(
+            "Infer: [{}] "
+            "Running Time: {batch_time.avg:.3f} ".format(
+                self.cfg.audio_input,
+                batch_time=batch_time,
             )
-
-        out_exp = output_dict['pred_exp'].squeeze().cpu().numpy()
+        )
 
         frame_length = math.ceil(speech_array.shape[0] / ssr * 30)
         volume = librosa.feature.rms(y=speech_array, frame_length=int(1 / 30 * ssr), hop_length=int(1 / 30 * ssr))[0]
@@ -159,78 +288,93 @@ class Audio2ExpressionInfer(InferBase):
     def infer_streaming_audio(self,
                            audio: np.ndarray,
                            ssr: float,
-                           context: dict):
+                           context: dict,
+                           predictor: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+        """predictor replaces predict_expression, e.g. to run the window in a batch shared by sessions."""
 
         if (context is None):
             context = DEFAULT_CONTEXT.copy()
         max_frame_length = 64
+        # frames of already seen audio encoded again as left context, full window if not positive
+        context_frame_length = getattr(self.cfg, 'streaming_context_frames', 0)
 
         frame_length = math.ceil(audio.shape[0] / ssr * 30)
         output_context = DEFAULT_CONTEXT.copy()
 
-        volume = librosa.feature.rms(y=audio, frame_length=int(1 / 30 * ssr), hop_length=int(1 / 30 * ssr))[0]
+        volume = self.compute_volume(audio, ssr)
         if (volume.shape[0] > frame_length):
             volume = volume[:frame_length]
 
         # resample audio
         if (ssr != self.cfg.audio_sr):
-            in_audio = librosa.resample(audio.astype(np.float32), orig_sr=ssr, target_sr=self.cfg.audio_sr)
+            in_audio, output_context['resampler'] = self.resample_streaming(audio, ssr, context)
         else:
             in_audio = audio.copy()
 
-        start_frame = int(max_frame_length - in_audio.shape[0] / self.cfg.audio_sr * 30)
+        if context_frame_length > 0:
+            # incremental mode, only a short tail of previous audio is encoded with the new audio
+            pre_audio_length = self.cfg.audio_sr * context_frame_length // 30
+            window_frame_length = math.ceil((pre_audio_length + in_audio.shape[0]) / self.cfg.audio_sr * 30)
+        else:
+            pre_audio_length = self.cfg.audio_sr * max_frame_length // 30 - in_audio.shape[0]
+            window_frame_length = max_frame_length
+        start_frame = int(window_frame_length - in_audio.shape[0] / self.cfg.audio_sr * 30)
 
         if (context['is_initial_input'] or (context['previous_audio'] is None)):
-            blank_audio_length = self.cfg.audio_sr * max_frame_length // 30 - in_audio.shape[0]
-            blank_audio = np.zeros(blank_audio_length, dtype=np.float32)
+            blank_audio = np.zeros(pre_audio_length, dtype=np.float32)
 
             # pre-append
             input_audio = np.concatenate([blank_audio, in_audio])
             output_context['previous_audio'] = input_audio
 
         else:
-            clip_pre_audio_length = self.cfg.audio_sr * max_frame_length // 30 - in_audio.shape[0]
-            clip_pre_audio = context['previous_audio'][-clip_pre_audio_length:]
+            clip_pre_audio = context['previous_audio'][-pre_audio_length:]
             input_audio = np.concatenate([clip_pre_audio, in_audio])
             output_context['previous_audio'] = input_audio
 
-        with torch.no_grad():
-            try:
-                input_dict = {}
-                input_dict['id_idx'] = F.one_hot(torch.tensor(self.cfg.id_idx),
-                                                 self.cfg.model.backbone.num_identity_classes).cuda(non_blocking=True)[
-                    None, ...]
-                input_dict['input_audio_array'] = torch.FloatTensor(input_audio).cuda(non_blocking=True)[None, ...]
-                output_dict = self.model(input_dict)
-                out_exp = output_dict['pred_exp'].squeeze().cpu().numpy()[start_frame:, :]
-            except:
-                self.logger.error('Error: faided to predict expression.')
-                output_dict['pred_exp'] = torch.zeros((max_frame_length, 52)).float()
-                return
+        try:
+            if predictor is None:
+                predictor = self.predict_expression
+            out_exp = predictor(input_audio)[start_frame:, :]
+        except Exception as e:
+            self.logger.error(f'Error: failed to predict expression. {e}')
+            return
 
 
         # post-process
-        if (context['previous_expression'] is None):
-            out_exp = self.apply_expression_postprocessing(out_exp, audio_volume=volume)
-        else:
-            previous_length = context['previous_expression'].shape[0]
-            out_exp = self.apply_expression_postprocessing(expression_params = np.concatenate([context['previous_expression'], out_exp], axis=0),
-                                                           audio_volume=np.concatenate([context['previous_volume'], volume], axis=0),
-                                                           processed_frames=previous_length)[previous_length:, :]
-
-        if (context['previous_expression'] is not None):
-            output_context['previous_expression'] = np.concatenate([context['previous_expression'], out_exp], axis=0)[
-                                                -max_frame_length:, :]
-            output_context['previous_volume'] = np.concatenate([context['previous_volume'], volume], axis=0)[-max_frame_length:]
-        else:
-            output_context['previous_expression'] = out_exp.copy()
-            output_context['previous_volume'] = volume.copy()
+        out_exp, output_context['postprocessor'] = self.postprocess_streaming(out_exp, volume, context)
 
         output_context['first_input_flag'] = False
 
         return {"code": RETURN_CODE['SUCCESS'],
                 "expression": out_exp,
                 "headpose": None}, output_context
+
+    @staticmethod
+    def compute_volume(audio: np.ndarray, ssr: float) -> np.ndarray:
+        frame_length = int(1 / 30 * ssr)
+        if framewise_rms is None:
+            return librosa.feature.rms(y=audio, frame_length=frame_length, hop_length=frame_length)[0]
+        return framewise_rms(audio, frame_length=frame_length, hop_length=frame_length)
+
+    def resample_streaming(self, audio: np.ndarray, ssr: float, context: dict):
+        """Resamples a chunk to audio_sr, keeping filter state of the stream in the returned resampler."""
+        if StreamingResampler is None:
+            return librosa.resample(audio.astype(np.float32), orig_sr=ssr, target_sr=self.cfg.audio_sr), None
+        resampler = context.get('resampler')
+        if resampler is None or resampler.input_rate != int(ssr):
+            resampler = StreamingResampler(int(ssr), self.cfg.audio_sr)
+        elif context['is_initial_input']:
+            resampler.reset()
+        return resampler.process(audio), resampler
+
+    def postprocess_streaming(self, out_exp: np.ndarray, volume: np.ndarray, context: dict):
+        postprocessor = context.get('postprocessor')
+        if postprocessor is None:
+            postprocessor = ExpressionHistoryPostprocessor(self.apply_expression_postprocessing,
+                                                             getattr(self.cfg, 'postprocess_history_frames', 64))
+        return postprocessor.process(out_exp, volume), postprocessor
+
     def apply_expression_postprocessing(
             self,
             expression_params: np.ndarray,
@@ -283,3 +427,52 @@ class Audio2ExpressionInfer(InferBase):
         bs_array = apply_random_eye_blinks(bs_array)
 
         return bs_array
+
+
+class OnnxAudio2ExpressionModel:
+    """Runs an exported Audio2Expression graph (see export_onnx.py) through onnxruntime."""
+
+    def __init__(self, onnx_path: str, intra_op_threads: int = 0):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(onnx_path, sess_options=options,
+                                                    providers=["CPUExecutionProvider"])
+        audio_length = self.session.get_inputs()[0].shape[1]
+        # graph exported with static window length, shorter windows are left padded with silence
+        self.window_length = audio_length if isinstance(audio_length, int) else None
+
+    def eval(self):
+        return self
+
+    def run(self, input_audios: List[np.ndarray], id_one_hot: np.ndarray, audio_sr: int) -> List[np.ndarray]:
+        frame_num = math.ceil(input_audios[0].shape[0] / audio_sr * 30)
+        input_audio = np.stack(input_audios).astype(np.float32, copy=False)
+        if self.window_length is not None and input_audio.shape[1] != self.window_length:
+            if input_audio.shape[1] > self.window_length:
+                input_audio = input_audio[:, -self.window_length:]
+            else:
+                input_audio = np.pad(input_audio, ((0, 0), (self.window_length - input_audio.shape[1], 0)))
+        pred_exp, = self.session.run(None, {
+            "input_audio_array": np.ascontiguousarray(input_audio),
+            "id_idx": np.repeat(id_one_hot, input_audio.shape[0], axis=0),
+        })
+        return [pred_exp[i, -frame_num:] for i in range(pred_exp.shape[0])]
+
+
+@INFER.register_module()
+class Audio2ExpressionOnnxInfer(Audio2ExpressionInfer):
+    def __init__(self, cfg, model=None, verbose=False) -> None:
+        if model is None:
+            model = OnnxAudio2ExpressionModel(cfg.onnx_path, getattr(cfg, 'onnx_intra_op_threads', 0))
+        super().__init__(cfg, model, verbose)
+        self.id_one_hot_array = self.id_one_hot.cpu().numpy()
+
+    def predict_expression(self, input_audio: np.ndarray) -> np.ndarray:
+        return self.model.run([input_audio], self.id_one_hot_array, self.cfg.audio_sr)[0]
+
+    def predict_expression_batch(self, input_audios: List[np.ndarray]) -> List[np.ndarray]:
+        return self.model.run(input_audios, self.id_one_hot_array, self.cfg.audio_sr)
@@ -0,0 +1,96 @@
+"""
+Export the Audio2Expression model to onnx for the streaming window shape and check parity against torch.
+
+python export_onnx.py --options weight=pretrained_models/lam_audio2exp_streaming.tar \
+    onnx_path=pretrained_models/lam_audio2exp_streaming.onnx device=cpu
+"""
+
+import os
+
+import numpy as np
+import torch
+
+from engines.defaults import (
+    default_argument_parser,
+    default_config_parser,
+    default_setup,
+)
+from engines.infer import INFER
+
+PARITY_ATOL = 1e-3
+
+
+class Audio2ExpressionExportWrapper(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_audio_array, id_idx):
+        return self.model({'input_audio_array': input_audio_array, 'id_idx': id_idx})['pred_exp']
+
+
+def get_window_length(cfg):
+    context_frames = getattr(cfg, 'streaming_context_frames', 0)
+    if context_frames > 0:
+        return cfg.audio_sr * context_frames // 30 + cfg.audio_sr
+    return cfg.audio_sr * 64 // 30
+
+
+def export(infer, cfg):
+    window_length = get_window_length(cfg)
+    wrapper = Audio2ExpressionExportWrapper(infer.model).eval()
+    dummy_audio = torch.zeros((1, window_length), dtype=torch.float32, device=infer.device)
+    os.makedirs(os.path.dirname(os.path.abspath(cfg.onnx_path)), exist_ok=True)
+    with torch.inference_mode():
+        torch.onnx.export(
+            wrapper,
+            (dummy_audio, infer.id_one_hot),
+            cfg.onnx_path,
+            input_names=['input_audio_array', 'id_idx'],
+            output_names=['pred_exp'],
+            dynamic_axes={
+                'input_audio_array': {0: 'batch'},
+                'id_idx': {0: 'batch'},
+                'pred_exp': {0: 'batch'},
+            },
+            opset_version=17,
+            do_constant_folding=True,
+        )
+    print(f"Exported onnx model with window of {window_length} samples to {cfg.onnx_path}")
+
+
+def run_streaming(infer, audio, sample_rate):
+    # post-processing draws random eye blinks, seed it so that both backends are comparable
+    np.random.seed(0)
+    context = None
+    all_exp = []
+    for start in range(0, audio.shape[0], sample_rate):
+        output, context = infer.infer_streaming_audio(audio[start:start + sample_rate], sample_rate, context)
+        all_exp.append(output['expression'])
+    return np.concatenate(all_exp, axis=0)
+
+
+def check_parity(torch_infer, cfg):
+    onnx_infer = INFER.build(dict(type='Audio2ExpressionOnnxInfer', cfg=cfg))
+    rng = np.random.default_rng(0)
+    window = rng.uniform(-0.3, 0.3, get_window_length(cfg)).astype(np.float32)
+    raw_diff = np.abs(torch_infer.predict_expression(window) - onnx_infer.predict_expression(window)).max()
+
+    audio = rng.uniform(-0.3, 0.3, cfg.audio_sr * 5).astype(np.float32)
+    stream_diff = np.abs(run_streaming(torch_infer, audio, cfg.audio_sr) -
+                         run_streaming(onnx_infer, audio, cfg.audio_sr)).max()
+    print(f"Max abs diff of model output: {raw_diff:.6f}, of streaming blendshapes: {stream_diff:.6f}")
+    assert raw_diff < PARITY_ATOL and stream_diff < PARITY_ATOL, "onnx model does not match torch model"
+
+
+if __name__ == '__main__':
+    args = default_argument_parser().parse_args()
+    args.config_file = 'configs/lam_audio2exp_config_streaming.py'
+    cfg = default_config_parser(args.config_file, args.options)
+
+    cfg = default_setup(cfg)
+    infer = INFER.build(dict(type='Audio2ExpressionInfer', cfg=cfg))
+    infer.model.eval()
+
+    export(infer, cfg)
+    check_parity(infer, cfg)
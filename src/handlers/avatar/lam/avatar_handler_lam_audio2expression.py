@@ -15,15 +15,40 @@ from chat_engine.contexts.handler_context import HandlerContext
 from chat_engine.contexts.session_context import SessionContext
 from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_engine_config_data import HandlerBaseConfigModel, ChatEngineConfigModel
+from chat_engine.data_models.chat_signal import ChatSignal
+from chat_engine.data_models.chat_signal_type import ChatSignalType
 from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundleEntry, DataBundle
 from engine_utils.directory_info import DirectoryInfo
 from engine_utils.general_slicer import SliceContext, slice_data
+from engine_utils.metrics_registry import MetricsRegistry
+from handlers.avatar.lam.lam_batch_server import LAMBatchInferenceServer
+
+LAM_INFERENCE_SECONDS = MetricsRegistry().histogram(
+    "chat_inference_seconds", "Model inference time of one call, batched calls included.",
+    ("model",)).labels("lam_audio2expression")
 
 
 class AvatarLAMConfig(HandlerBaseConfigModel, BaseModel):
     model_name: str = "LAM_audio2exp"
     feature_extractor_model_name: str = "wav2vec2-base-960h"
     audio_sample_rate: int = Field(default=24000)
+    # Frames of previous audio re-encoded with each new chunk, 0 keeps the full 64 frame window
+    streaming_context_frames: int = Field(default=0)
+    # Processed frames re-processed with each chunk, 64 keeps the original output
+    postprocess_history_frames: int = Field(default=64)
+    # auto, cpu, cuda or cuda:N
+    device: str = Field(default="auto")
+    # fp32, bf16 or int8 (dynamic quantization of the wav2vec encoder, cpu only)
+    precision: str = Field(default="fp32")
+    # torch threads used on cpu, 0 keeps torch default
+    cpu_threads: int = Field(default=0)
+    # torch or onnx, onnx model is exported by LAM_Audio2Expression/export_onnx.py
+    backend: str = Field(default="torch")
+    onnx_model_name: str = Field(default="lam_audio2exp_streaming.onnx")
+    onnx_intra_op_threads: int = Field(default=0)
+    # Run encoder windows of all sessions through one batched forward pass
+    batch_inference: bool = Field(default=False)
+    max_batch_size: int = Field(default=8)
 
 
 class AvatarLAMContext(HandlerContext):
@@ -33,12 +58,16 @@ class AvatarLAMContext(HandlerContext):
         self.inference_context = None
         self.input_slice_context: Optional[SliceContext] = None
         self.last_speech_id: Optional[str] = None
+        # set by on_signal, handle drops the rest of the speech and restarts inference state on its next call
+        self.cancelled_speech_id: Optional[str] = None
+        self.reset_pending = False
 
 
 class HandlerAvatarLAM(HandlerBase):
     def __init__(self):
         super().__init__()
         self.infer = None
+        self.batch_server: Optional[LAMBatchInferenceServer] = None
         self.arkit_channels: List[str] = []
 
     def get_handler_info(self) -> HandlerBaseInfo:
@@ -65,14 +94,23 @@ class HandlerAvatarLAM(HandlerBase):
         wav2vec_config_file = os.path.join(self.handler_root, "LAM_Audio2Expression",
                                    "configs", "wav2vec2_config.json")
         weight_path = os.path.join(model_path, "pretrained_models", "lam_audio2exp_streaming.tar")
+        onnx_path = os.path.join(model_path, "pretrained_models", handler_config.onnx_model_name)
 
         weight_path = weight_path.replace("\\", "/")
         wav2vec_path = wav2vec_path.replace("\\", "/")
         config_file = config_file.replace("\\", "/")
         wav2vec_config_file = wav2vec_config_file.replace("\\", "/")
+        onnx_path = onnx_path.replace("\\", "/")
 
         cfg = default_config_parser(config_file, {
             "weight": weight_path,
+            "streaming_context_frames": handler_config.streaming_context_frames,
+            "postprocess_history_frames": handler_config.postprocess_history_frames,
+            "device": handler_config.device,
+            "precision": handler_config.precision,
+            "cpu_threads": handler_config.cpu_threads,
+            "onnx_path": onnx_path,
+            "onnx_intra_op_threads": handler_config.onnx_intra_op_threads,
             "model": {
                 "backbone": {
                     "pretrained_encoder_path": wav2vec_path,
@@ -81,7 +119,8 @@ class HandlerAvatarLAM(HandlerBase):
             }
         })
         cfg = default_setup(cfg)
-        self.infer = INFER.build(dict(type=cfg.infer.type, cfg=cfg))
+        infer_type = "Audio2ExpressionOnnxInfer" if handler_config.backend == "onnx" else cfg.infer.type
+        self.infer = INFER.build(dict(type=infer_type, cfg=cfg))
         self.infer.model.eval()
         arkit_channel_list_path = os.path.join(self.handler_root, "assets", "arkit_face_channels.txt")
         self.arkit_channels.clear()
@@ -98,6 +137,8 @@ class HandlerAvatarLAM(HandlerBase):
         )
         dur_warmup = time.monotonic() - t_start
         logger.info(f"LAM_Audio2Expression warmup finished in {dur_warmup * 1000} milliseconds.")
+        if handler_config.batch_inference:
+            self.batch_server = LAMBatchInferenceServer(self.infer, max_batch_size=handler_config.max_batch_size)
 
     def create_context(self, session_context: SessionContext,
                        handler_config: Optional[HandlerBaseConfigModel] = None) -> HandlerContext:
@@ -155,6 +196,13 @@ class HandlerAvatarLAM(HandlerBase):
         speech_id = inputs.data.get_meta("speech_id")
         speech_end = inputs.data.get_meta("avatar_speech_end", False)
         speech_text = inputs.data.get_meta("avatar_speech_text")
+        if context.reset_pending:
+            context.reset_pending = False
+            context.inference_context = None
+            context.input_slice_context.flush()
+            context.last_speech_id = None
+        if speech_id is not None and speech_id == context.cancelled_speech_id:
+            return
 
         audio = inputs.data.get_main_data()
         audio_segments = queue.Queue()
@@ -167,13 +215,17 @@ class HandlerAvatarLAM(HandlerBase):
         if audio_segments.empty() and speech_end:
             audio_segments.put_nowait(np.zeros([50], dtype=np.float32))
         while not audio_segments.empty():
+            if speech_id is not None and speech_id == context.cancelled_speech_id:
+                break
             t_start = time.monotonic()
             audio_segment = audio_segments.get_nowait()
             result, context_update = self.infer.infer_streaming_audio(
                 audio=audio_segment,
                 ssr=context.config.audio_sample_rate,
                 context=context.inference_context,
+                predictor=self.batch_server.predict if self.batch_server is not None else None,
             )
+            LAM_INFERENCE_SECONDS.observe(time.monotonic() - t_start)
             context.inference_context = context_update
             need_flush = speech_end and audio_segments.empty()
             if need_flush:
@@ -202,5 +254,12 @@ class HandlerAvatarLAM(HandlerBase):
             if need_flush:
                 context.last_speech_id = None
 
+    def on_signal(self, context: HandlerContext, signal: ChatSignal):
+        context = cast(AvatarLAMContext, context)
+        if signal.type == ChatSignalType.INTERRUPT and signal.speech_id is not None:
+            context.cancelled_speech_id = signal.speech_id
+            context.reset_pending = True
+
     def destroy_context(self, context: HandlerContext):
-        pass
+        if self.batch_server is not None:
+            logger.info(f"LAM batch inference metrics: {self.batch_server.get_metrics()}")
@@ -0,0 +1,25 @@
+from typing import List
+
+import numpy as np
+
+from engine_utils.batch_worker import BatchWorker
+
+
+# Runs encoder windows of all sessions through the shared audio2expression model in one forward pass,
+# post-processing stays in each session. Only windows of the same length are batched together.
+class LAMBatchInferenceServer:
+    def __init__(self, infer, max_batch_size: int = 8):
+        self.infer = infer
+        self.batch_worker = BatchWorker("lam_batch", self._run_batch, max_batch_size,
+                                        group_key=lambda input_audio: input_audio.shape[0])
+
+    def predict(self, input_audio: np.ndarray) -> np.ndarray:
+        return self.batch_worker.submit(input_audio)
+
+    def get_metrics(self) -> dict:
+        metrics = self.batch_worker.get_metrics()
+        metrics["batch_fill_rate"] = metrics["avg_batch_size"] / self.batch_worker.max_batch_size
+        return metrics
+
+    def _run_batch(self, input_audios: List[np.ndarray]) -> List[np.ndarray]:
+        return self.infer.predict_expression_batch(input_audios)
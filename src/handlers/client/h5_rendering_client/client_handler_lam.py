@@ -1,6 +1,7 @@
 import asyncio
 import json
 import os.path
+import time
 from typing import Dict, Optional, cast
 
 import gradio
@@ -12,17 +13,23 @@ from starlette.responses import JSONResponse, FileResponse
 from starlette.websockets import WebSocket, WebSocketState
 
 from chat_engine.common.client_handler_base import ClientHandlerInfo, ClientSessionDelegate
-from chat_engine.common.engine_channel_type import EngineChannelType
 from chat_engine.common.handler_base import HandlerDataInfo, HandlerDetail, HandlerBaseInfo
 from chat_engine.contexts.handler_context import HandlerContext
 from chat_engine.contexts.session_context import SessionContext
+from chat_engine.core.turn_tracer import TurnTracer
+from chat_engine.data_models.chat_data.chat_data_trace import TurnMilestone
 from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.data_models.chat_engine_config_data import HandlerBaseConfigModel, ChatEngineConfigModel
 from chat_engine.data_models.chat_signal import ChatSignal
 from chat_engine.data_models.chat_signal_type import ChatSignalSourceType, ChatSignalType
 from chat_engine.data_models.runtime_data.motion_data import MotionDataSerializer
+from chat_engine.data_models.runtime_data.motion_data_compact import MOTION_DATA_PROTOCOL_VERSION, \
+    get_descriptor_format
 from engine_utils.directory_info import DirectoryInfo
+from handlers.client.h5_rendering_client.motion_data_pacer import MotionDataPacer
+from handlers.client.h5_rendering_client.motion_data_send_queue import MotionDataSendQueue, MotionDataQueuePolicy, \
+    get_speech_id
 from handlers.client.rtc_client.client_handler_rtc import RtcClientSessionDelegate, ClientHandlerRtc, \
     ClientRtcConfigModel, ClientRtcContext
 
@@ -30,8 +37,15 @@ from handlers.client.rtc_client.client_handler_rtc import RtcClientSessionDelega
 class LamClientSessionDelegate(RtcClientSessionDelegate):
     def __init__(self):
         super().__init__()
-        self.output_queues[EngineChannelType.MOTION_DATA] = asyncio.Queue()
+        # motion data is put from handler threads, it goes through a thread safe bounded queue instead
+        self.motion_data_queue = MotionDataSendQueue()
         self.quit = asyncio.Event()
+        # clients without a ClientHello message only understand protocol 1, JBIN with json descriptions
+        self.motion_data_protocol_version = 1
+        self.motion_data_pacer = MotionDataPacer()
+        self.turn_tracer: Optional[TurnTracer] = None
+        # motion data of this speech is not sent anymore, set from the thread emitting the interrupt
+        self.cancelled_speech_id: Optional[str] = None
 
     async def _ws_output_task(self, websocket: WebSocket):
         logger.warning(f"Send task started on {websocket}")
@@ -42,20 +56,51 @@ class LamClientSessionDelegate(RtcClientSessionDelegate):
             "arkit_face",
             "float32"
         )
-        welcome_message_sent = False
+        self.motion_data_queue.bind(asyncio.get_running_loop())
+        welcome_format = None
         while not self.quit.is_set():
-            try:
-                chat_data: ChatData = await asyncio.wait_for(self.get_data(EngineChannelType.MOTION_DATA), timeout=0.1)
-                logger.info(f"Got chat data {str(chat_data)}")
-            except asyncio.TimeoutError:
+            queued = await self.motion_data_queue.get(timeout=0.1)
+            if queued is None:
                 continue
-            if not welcome_message_sent:
+            chat_data: ChatData = queued[0]
+            logger.info(f"Got chat data {str(chat_data)}")
+            descriptor_format = get_descriptor_format(self.motion_data_protocol_version)
+            if descriptor_format != welcome_format:
+                # a new welcome message announces the format of following frames
+                self.motion_data_serializer.set_descriptor_format(descriptor_format)
                 welcome_message = self.motion_data_serializer.serialize(chat_data.data.definition)
                 await websocket.send_bytes(welcome_message)
-                welcome_message_sent = True
+                welcome_format = descriptor_format
             if chat_data.type == ChatDataType.AVATAR_MOTION_DATA:
-                msg = self.motion_data_serializer.serialize(chat_data.data)
-                await websocket.send_bytes(msg)
+                for chunk in self.motion_data_pacer.split(chat_data.data):
+                    if self._is_cancelled(chunk.bundle.get_meta("speech_id")):
+                        self.motion_data_pacer.reset()
+                        break
+                    await self.motion_data_pacer.pace(chunk)
+                    msg = self.motion_data_serializer.serialize(chunk.bundle)
+                    send_start = time.monotonic()
+                    await websocket.send_bytes(msg)
+                    self.motion_data_queue.record_send(time.monotonic() - send_start)
+                    speech_id = chunk.bundle.get_meta("speech_id")
+                    if self.turn_tracer is not None and speech_id is not None:
+                        self.turn_tracer.mark(speech_id, TurnMilestone.FIRST_MOTION_SENT)
+        logger.info(f"Motion data send task stopped, {self.motion_data_queue.metrics}")
+
+    def put_motion_data(self, chat_data: ChatData):
+        self.motion_data_queue.put(chat_data)
+
+    def cancel_speech(self, speech_id: str):
+        super().cancel_speech(speech_id)
+        self.cancelled_speech_id = speech_id
+        # data of a newer speech may already be queued behind the interrupted one
+        self.motion_data_queue.discard(lambda chat_data: get_speech_id(chat_data) == speech_id)
+
+    def _is_cancelled(self, speech_id: Optional[str]) -> bool:
+        return speech_id is not None and speech_id == self.cancelled_speech_id
+
+    def clear_data(self):
+        super().clear_data()
+        self.motion_data_queue.discard()
 
     async def _ws_input_task(self, websocket: WebSocket):
         while not self.quit.is_set() and websocket.client_state != WebSocketState.DISCONNECTED:
@@ -67,7 +112,11 @@ class LamClientSessionDelegate(RtcClientSessionDelegate):
             try:
                 msg = json.loads(raw_msg)
                 msg_type = msg.get("header", {}).get("name")
-                if msg_type == "EndSpeech":
+                if msg_type == "ClientHello":
+                    protocol_version = int(msg.get("payload", {}).get("protocol_version", 1))
+                    self.motion_data_protocol_version = min(protocol_version, MOTION_DATA_PROTOCOL_VERSION)
+                    logger.info(f"Client uses motion data protocol {self.motion_data_protocol_version}")
+                elif msg_type == "EndSpeech":
                     signal = ChatSignal(
                         source_type=ChatSignalSourceType.CLIENT,
                         type=ChatSignalType.END,
@@ -78,7 +127,6 @@ class LamClientSessionDelegate(RtcClientSessionDelegate):
                 continue
 
     def emit_signal(self, signal):
-        # TODO: this is temp implementation a full signal infrastructure is needed.
         super().emit_signal(signal)
         logger.info(signal)
         if signal.source_type == ChatSignalSourceType.CLIENT and signal.type == ChatSignalType.END:
@@ -96,6 +144,13 @@ class LamClientSessionDelegate(RtcClientSessionDelegate):
 
 class ClientLamConfigModel(ClientRtcConfigModel, BaseModel):
     asset_path: Optional[str] = Field(default=None)
+    # motion data is sent in chunks of about motion_chunk_ms, at most motion_max_lead_ms ahead of playback,
+    # 0 sends every bundle as soon as it arrives
+    motion_chunk_ms: int = Field(default=160)
+    motion_max_lead_ms: int = Field(default=300)
+    # seconds of motion data waiting for a slow client, what to drop of earlier speeches when there are more
+    motion_queue_seconds: float = Field(default=30.0)
+    motion_queue_policy: MotionDataQueuePolicy = Field(default=MotionDataQueuePolicy.DROP_STALE)
 
 
 class ClientLamContext(ClientRtcContext):
@@ -186,6 +241,17 @@ class ClientHandlerLam(ClientHandlerRtc):
     def on_setup_session_delegate(self, session_context: SessionContext, handler_context: HandlerContext,
                                   session_delegate: ClientSessionDelegate):
         super().on_setup_session_delegate(session_context, handler_context, session_delegate)
+        config = cast(ClientLamContext, handler_context).config
+        session_delegate = cast(LamClientSessionDelegate, session_delegate)
+        session_delegate.motion_data_pacer = MotionDataPacer(
+            chunk_ms=config.motion_chunk_ms,
+            max_lead_ms=config.motion_max_lead_ms,
+        )
+        session_delegate.motion_data_queue = MotionDataSendQueue(
+            max_seconds=config.motion_queue_seconds,
+            policy=config.motion_queue_policy,
+        )
+        session_delegate.turn_tracer = session_context.turn_tracer
 
     def get_handler_detail(self, session_context: SessionContext, context: HandlerContext) -> HandlerDetail:
         handler_detail = self.create_handler_detail(session_context, context)
@@ -196,6 +262,11 @@ class ClientHandlerLam(ClientHandlerRtc):
 
     def handle(self, context: HandlerContext, inputs: ChatData,
                output_definitions: Dict[ChatDataType, HandlerDataInfo]):
+        if inputs.type == ChatDataType.AVATAR_MOTION_DATA:
+            context = cast(ClientLamContext, context)
+            if context.client_session_delegate is not None:
+                cast(LamClientSessionDelegate, context.client_session_delegate).put_motion_data(inputs)
+            return
         super().handle(context, inputs, output_definitions)
 
     def destroy_context(self, context: HandlerContext):
@@ -0,0 +1,105 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle
+from chat_engine.data_models.runtime_data.time_unit_type import TimeUnitType
+
+
+@dataclass
+class MotionDataChunk:
+    bundle: DataBundle
+    duration: float
+
+
+# Splits motion data bundles into sub chunks of about chunk_ms, cut at frames of the main entry with the other
+# temporal entries (audio) cut at the same time, and sends them on a monotonic clock. The client is assumed to
+# play from the first chunk of a batch on, a chunk is released at most max_lead before its playback time.
+# Batch start, end and speech end only go out with the first and last chunk of a bundle.
+class MotionDataPacer:
+    def __init__(self, chunk_ms: int = 160, max_lead_ms: int = 300):
+        self.chunk_duration = chunk_ms / 1000.0
+        self.max_lead = max_lead_ms / 1000.0
+        self.stream_start: Optional[float] = None
+        self.media_time = 0.0
+
+    @property
+    def enabled(self):
+        return self.chunk_duration > 0
+
+    def reset(self):
+        self.stream_start = None
+        self.media_time = 0.0
+
+    def split(self, bundle: DataBundle) -> List[MotionDataChunk]:
+        main_entry = bundle.get_main_definition_entry()
+        main_data = bundle.get_main_data()
+        if main_entry is None or main_entry.time_unit != TimeUnitType.FRAME or main_entry.sample_rate <= 0 \
+                or not isinstance(main_data, np.ndarray):
+            return [MotionDataChunk(bundle, 0.0)]
+        fps = main_entry.sample_rate
+        frame_num = main_data.shape[main_entry.time_axis]
+        if not self.enabled:
+            return [MotionDataChunk(bundle, frame_num / fps)]
+        chunk_frames = max(1, round(self.chunk_duration * fps))
+        frame_bounds = list(range(0, frame_num, chunk_frames)) + [frame_num]
+        if len(frame_bounds) <= 2:
+            return [MotionDataChunk(bundle, frame_num / fps)]
+
+        # every temporal entry is cut at the time of the frame bounds, the last chunk takes all that remains
+        entry_bounds = {}
+        static_names = []
+        for name, entry in bundle.definition.entries.items():
+            data = bundle.get_data(name)
+            if data is None:
+                continue
+            if not isinstance(data, np.ndarray) or not entry.is_temporal_data():
+                static_names.append(name)
+                continue
+            sample_num = data.shape[entry.time_axis]
+            bounds = [math.floor(frame * entry.sample_rate / fps) for frame in frame_bounds[:-1]] + [sample_num]
+            if any(start >= end for start, end in zip(bounds[:-1], bounds[1:])):
+                return [MotionDataChunk(bundle, frame_num / fps)]
+            entry_bounds[name] = (entry, bounds)
+
+        chunks = []
+        chunk_num = len(frame_bounds) - 1
+        for i in range(chunk_num):
+            chunk = DataBundle(bundle.definition)
+            for name, (entry, bounds) in entry_bounds.items():
+                index = [slice(None)] * bundle.get_data(name).ndim
+                index[entry.time_axis] = slice(bounds[i], bounds[i + 1])
+                chunk.set_data(name, bundle.get_data(name)[tuple(index)])
+            chunk.metadata = bundle.metadata.copy()
+            if i < chunk_num - 1 and "avatar_speech_end" in chunk.metadata:
+                chunk.metadata["avatar_speech_end"] = False
+            if i == 0:
+                for name in static_names:
+                    chunk.set_data(name, bundle.get_data(name))
+                chunk.events = bundle.events.copy()
+                chunk.start_of_stream = bundle.start_of_stream
+            if i == chunk_num - 1:
+                chunk.end_of_stream = bundle.end_of_stream
+            chunks.append(MotionDataChunk(chunk, (frame_bounds[i + 1] - frame_bounds[i]) / fps))
+        return chunks
+
+    async def pace(self, chunk: MotionDataChunk):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if self.stream_start is None or chunk.bundle.start_of_stream:
+            self.stream_start = now
+            self.media_time = 0.0
+        # the client can not play ahead of what it received, a late chunk moves the playback clock
+        if now > self.stream_start + self.media_time:
+            self.stream_start = now - self.media_time
+        send_time = self.stream_start + self.media_time - self.max_lead
+        if send_time > now:
+            await asyncio.sleep(send_time - now)
+        self.media_time += chunk.duration
+        if chunk.bundle.end_of_stream:
+            self.reset()
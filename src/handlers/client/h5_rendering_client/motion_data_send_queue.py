@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Deque, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from chat_engine.data_models.chat_data.chat_data_model import ChatData
+from chat_engine.data_models.runtime_data.time_unit_type import TimeUnitType
+from engine_utils.metrics_registry import MetricsRegistry
+
+MOTION_QUEUE_DELAY_SECONDS = MetricsRegistry().histogram(
+    "lam_motion_queue_delay_seconds", "Time motion data waits for the websocket sender.")
+MOTION_SEND_SECONDS = MetricsRegistry().histogram(
+    "lam_motion_send_seconds", "Time a websocket send of motion data takes, grows when clients fall behind.")
+MOTION_DROPPED = MetricsRegistry().counter(
+    "lam_motion_dropped_total", "Motion data dropped by full send queues or interrupts.")
+
+
+class MotionDataQueuePolicy(str, Enum):
+    # a full queue drops the oldest motion data of earlier speeches until the new data fits
+    DROP_OLDEST = "drop_oldest"
+    # a full queue drops all motion data of earlier speeches, which the client discards after an interrupt anyway
+    DROP_STALE = "drop_stale"
+
+
+@dataclass
+class MotionDataQueueMetrics:
+    enqueued: int = 0
+    dropped: int = 0
+    sent_messages: int = 0
+    max_depth: int = 0
+    max_queued_seconds: float = 0.0
+    total_queue_delay: float = 0.0
+    max_queue_delay: float = 0.0
+    total_send_duration: float = 0.0
+    max_send_duration: float = 0.0
+
+    def __str__(self):
+        dequeued = max(1, self.enqueued - self.dropped)
+        messages = max(1, self.sent_messages)
+        return (f"enqueued {self.enqueued}, dropped {self.dropped}, max depth {self.max_depth} "
+                f"({self.max_queued_seconds:.1f} s), "
+                f"queue delay avg {self.total_queue_delay / dequeued * 1000:.1f} ms "
+                f"max {self.max_queue_delay * 1000:.1f} ms, "
+                f"send avg {self.total_send_duration / messages * 1000:.1f} ms "
+                f"max {self.max_send_duration * 1000:.1f} ms over {self.sent_messages} messages")
+
+
+def get_speech_id(chat_data: ChatData) -> Optional[str]:
+    if chat_data.data is None:
+        return None
+    return chat_data.data.get_meta("speech_id")
+
+
+def get_media_duration(chat_data: ChatData) -> float:
+    bundle = chat_data.data
+    if bundle is None:
+        return 0.0
+    main_entry = bundle.get_main_definition_entry()
+    main_data = bundle.get_main_data()
+    if main_entry is None or main_entry.time_unit != TimeUnitType.FRAME or main_entry.sample_rate <= 0 \
+            or not isinstance(main_data, np.ndarray):
+        return 0.0
+    return main_data.shape[main_entry.time_axis] / main_entry.sample_rate
+
+
+# Hands motion data from handler threads to the websocket sender on the event loop. The deque is guarded by a lock,
+# the sender is woken through call_soon_threadsafe, so handler threads never touch asyncio objects directly.
+# The queue is bounded by max_seconds of media waiting for the pacer. A full queue only drops data of earlier
+# speeches, data of the speech being sent and of the newest speech is always kept, so a reply longer than the bound
+# is delivered whole. Data put before the sender binds its loop is delivered once it does.
+class MotionDataSendQueue:
+    def __init__(self, max_seconds: float = 30.0, policy: MotionDataQueuePolicy = MotionDataQueuePolicy.DROP_STALE):
+        self.max_seconds = max_seconds
+        self.policy = policy
+        self.metrics = MotionDataQueueMetrics()
+        self._lock = threading.Lock()
+        self._items: Deque[Tuple[ChatData, float, float]] = deque()
+        self._queued_seconds = 0.0
+        self._sending_speech_id: Optional[str] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready: Optional[asyncio.Event] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Binds the queue to the loop of its consumer, must be called from that loop."""
+        with self._lock:
+            self._loop = loop
+            self._ready = asyncio.Event()
+            if self._items:
+                self._ready.set()
+
+    def put(self, chat_data: ChatData):
+        duration = get_media_duration(chat_data)
+        with self._lock:
+            if self._items and self._queued_seconds + duration > self.max_seconds:
+                self._drop_for(chat_data, duration)
+            self._items.append((chat_data, time.monotonic(), duration))
+            self._queued_seconds += duration
+            self.metrics.enqueued += 1
+            self.metrics.max_depth = max(self.metrics.max_depth, len(self._items))
+            self.metrics.max_queued_seconds = max(self.metrics.max_queued_seconds, self._queued_seconds)
+            loop, ready = self._loop, self._ready
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # the loop of the sender is already closed, the session is going away
+                pass
+
+    def _drop_for(self, chat_data: ChatData, duration: float):
+        kept_speech_ids = {get_speech_id(chat_data), self._sending_speech_id}
+        excess = self._queued_seconds + duration - self.max_seconds
+        kept = deque()
+        dropped = 0
+        for item in self._items:
+            if get_speech_id(item[0]) in kept_speech_ids \
+                    or (self.policy == MotionDataQueuePolicy.DROP_OLDEST and excess <= 0):
+                kept.append(item)
+                continue
+            excess -= item[2]
+            self._queued_seconds -= item[2]
+            dropped += 1
+        self._items = kept
+        if dropped > 0:
+            self.metrics.dropped += dropped
+            MOTION_DROPPED.inc(dropped)
+            logger.warning(f"Motion data queue is full, dropped {dropped} motion data of earlier speeches.")
+
+    async def get(self, timeout: Optional[float] = 0.1) -> Optional[Tuple[ChatData, float]]:
+        """Returns the next motion data with the monotonic time it was put, None if nothing arrives in time."""
+        while True:
+            with self._lock:
+                if self._items:
+                    chat_data, put_time, duration = self._items.popleft()
+                    self._queued_seconds -= duration
+                    self._sending_speech_id = get_speech_id(chat_data)
+                    queue_delay = time.monotonic() - put_time
+                    self.metrics.total_queue_delay += queue_delay
+                    self.metrics.max_queue_delay = max(self.metrics.max_queue_delay, queue_delay)
+                    MOTION_QUEUE_DELAY_SECONDS.observe(queue_delay)
+                    return chat_data, put_time
+                # puts after this clear schedule their set behind it on the loop
+                self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+    def discard(self, predicate: Optional[Callable[[ChatData], bool]] = None) -> int:
+        """Drops queued motion data matching predicate, all of it without one, returns the number dropped."""
+        with self._lock:
+            kept = deque(item for item in self._items if predicate is not None and not predicate(item[0]))
+            dropped = len(self._items) - len(kept)
+            self._items = kept
+            self._queued_seconds = sum(item[2] for item in kept)
+            self.metrics.dropped += dropped
+        MOTION_DROPPED.inc(dropped)
+        return dropped
+
+    def record_send(self, duration: float):
+        self.metrics.sent_messages += 1
+        self.metrics.total_send_duration += duration
+        self.metrics.max_send_duration = max(self.metrics.max_send_duration, duration)
+        MOTION_SEND_SECONDS.observe(duration)
+
+    @property
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._items)
@@ -19,6 +19,7 @@ from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.data_models.chat_engine_config_data import HandlerBaseConfigModel, ChatEngineConfigModel
 from chat_engine.data_models.chat_signal import ChatSignal
+from chat_engine.data_models.chat_signal_type import ChatSignalType
 from chat_engine.data_models.runtime_data.data_bundle import DataBundleDefinition, DataBundleEntry, VariableSize, \
     DataBundle
 from service.rtc_service.rtc_provider import RTCProvider
@@ -30,11 +31,14 @@ class RtcClientSessionDelegate(ClientSessionDelegate):
         self.timestamp_generator = None
         self.data_submitter = None
         self.shared_states = None
+        self.signal_emitter = None
         self.output_queues = {
             EngineChannelType.AUDIO: asyncio.Queue(),
             EngineChannelType.VIDEO: asyncio.Queue(),
             EngineChannelType.TEXT: asyncio.Queue(),
         }
+        # loop reading the output queues, known after the first get_data, queues are purged on it
+        self.output_loop: Optional[asyncio.AbstractEventLoop] = None
         self.input_data_definitions: Dict[EngineChannelType, DataBundleDefinition] = {}
         self.modality_mapping = {
             EngineChannelType.AUDIO: ChatDataType.MIC_AUDIO,
@@ -46,6 +50,8 @@ class RtcClientSessionDelegate(ClientSessionDelegate):
         data_queue = self.output_queues.get(modality)
         if data_queue is None:
             return None
+        if self.output_loop is None:
+            self.output_loop = asyncio.get_running_loop()
         if timeout is not None and timeout > 0:
             try:
                 data = await asyncio.wait_for(data_queue.get(), timeout)
@@ -90,13 +96,37 @@ class RtcClientSessionDelegate(ClientSessionDelegate):
         return self.timestamp_generator()
 
     def emit_signal(self, signal: ChatSignal):
-        pass
+        if self.signal_emitter is not None:
+            self.signal_emitter.emit(signal)
 
     def clear_data(self):
         for data_queue in self.output_queues.values():
             while not data_queue.empty():
                 data_queue.get_nowait()
 
+    def cancel_speech(self, speech_id: str):
+        """Drops queued outputs of speech_id, outputs of other speeches are kept in order."""
+        loop = self.output_loop
+        if loop is None:
+            # nothing reads the queues yet
+            self._drop_speech_outputs(speech_id)
+            return
+        try:
+            loop.call_soon_threadsafe(self._drop_speech_outputs, speech_id)
+        except RuntimeError:
+            # the loop reading the queues is already closed, the session is going away
+            pass
+
+    def _drop_speech_outputs(self, speech_id: str):
+        for data_queue in self.output_queues.values():
+            kept = []
+            while not data_queue.empty():
+                chat_data = data_queue.get_nowait()
+                if chat_data.data is None or chat_data.data.get_meta("speech_id") != speech_id:
+                    kept.append(chat_data)
+            for chat_data in kept:
+                data_queue.put_nowait(chat_data)
+
 
 class ClientRtcConfigModel(HandlerBaseConfigModel, BaseModel):
     connection_ttl: int = Field(default=900)
@@ -220,6 +250,7 @@ class ClientHandlerRtc(ClientHandlerBase):
         session_delegate.data_submitter = handler_context.data_submitter
         session_delegate.input_data_definitions = self.output_bundle_definitions
         session_delegate.shared_states = session_context.shared_states
+        session_delegate.signal_emitter = handler_context.signal_emitter
 
         handler_context.client_session_delegate = session_delegate
 
@@ -269,5 +300,11 @@ class ClientHandlerRtc(ClientHandlerBase):
         if data_queue is not None:
             data_queue.put_nowait(inputs)
 
+    def on_signal(self, context: HandlerContext, signal: ChatSignal):
+        context = cast(ClientRtcContext, context)
+        if signal.type == ChatSignalType.INTERRUPT and context.client_session_delegate is not None:
+            # outputs of the interrupted speech not yet played are dropped
+            context.client_session_delegate.cancel_speech(signal.speech_id)
+
     def destroy_context(self, context: HandlerContext):
         pass
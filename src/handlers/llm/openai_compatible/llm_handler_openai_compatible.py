@@ -9,13 +9,20 @@ from abc import ABC
 from openai import OpenAI
 from chat_engine.contexts.handler_context import HandlerContext
 from chat_engine.data_models.chat_engine_config_data import ChatEngineConfigModel, HandlerBaseConfigModel
-from chat_engine.common.handler_base import HandlerBase, HandlerBaseInfo, HandlerDataInfo, HandlerDetail
+from chat_engine.common.handler_base import HandlerBase, HandlerBaseInfo, HandlerDataInfo, HandlerDetail, \
+    HandlerExecutionPool
 from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.contexts.session_context import SessionContext
+from chat_engine.data_models.chat_signal import ChatSignal
+from chat_engine.data_models.chat_signal_type import ChatSignalType
 from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
+from engine_utils.metrics_registry import MetricsRegistry
 from handlers.llm.openai_compatible.chat_history_manager import ChatHistory, HistoryMessage
 
+LLM_CANCELLED_STREAMS = MetricsRegistry().counter(
+    "llm_cancelled_streams_total", "Completion streams closed because their speech was interrupted.")
+
 
 class LLMConfig(HandlerBaseConfigModel, BaseModel):
     model_name: str = Field(default="qwen-plus")
@@ -40,6 +47,10 @@ class LLMContext(HandlerContext):
         self.current_image = None
         self.history = ChatHistory()
         self.enable_video_input = False
+        # completion stream being read and the speech it answers, closed by interrupts
+        self.stream = None
+        self.stream_speech_id = None
+        self.cancelled_speech_id = None
 
 
 class HandlerLLM(HandlerBase, ABC):
@@ -49,6 +60,7 @@ class HandlerLLM(HandlerBase, ABC):
     def get_handler_info(self) -> HandlerBaseInfo:
         return HandlerBaseInfo(
             config_model=LLMConfig,
+            execution_pool=HandlerExecutionPool.IO,
         )
 
     def get_handler_detail(self, session_context: SessionContext,
@@ -142,18 +154,33 @@ class HandlerLLM(HandlerBase, ABC):
         context.current_image = None
         context.input_texts = ''
         context.output_texts = ''
-        for chunk in completion:
-            if (chunk and chunk.choices and chunk.choices[0] and chunk.choices[0].delta.content):
-                output_text = chunk.choices[0].delta.content
-                context.output_texts += output_text
-                logger.info(output_text)
-                output = DataBundle(output_definition)
-                output.set_main_data(output_text)
-                output.add_meta("avatar_text_end", False)
-                output.add_meta("speech_id", speech_id)
-                yield output
+        context.stream = completion
+        context.stream_speech_id = speech_id
+        try:
+            for chunk in completion:
+                if context.cancelled_speech_id == speech_id:
+                    break
+                if (chunk and chunk.choices and chunk.choices[0] and chunk.choices[0].delta.content):
+                    output_text = chunk.choices[0].delta.content
+                    context.output_texts += output_text
+                    logger.info(output_text)
+                    output = DataBundle.create_with_main_data(output_definition, output_text)
+                    output.add_meta("avatar_text_end", False)
+                    output.add_meta("speech_id", speech_id)
+                    yield output
+        except Exception:
+            # reading a stream closed by an interrupt fails, which is expected
+            if context.cancelled_speech_id != speech_id:
+                raise
+        finally:
+            context.stream = None
+            context.stream_speech_id = None
+        # the avatar said what was generated before an interrupt, it stays in the history
         context.history.add_message(HistoryMessage(role="avatar", content=context.output_texts))
         context.output_texts = ''
+        if context.cancelled_speech_id == speech_id:
+            logger.info(f"avatar text of speech {speech_id} interrupted")
+            return
         logger.info('avatar text end')
         end_output = DataBundle(output_definition)
         end_output.set_main_data('')
@@ -161,6 +188,19 @@ class HandlerLLM(HandlerBase, ABC):
         end_output.add_meta("speech_id", speech_id)
         yield end_output
 
+    def on_signal(self, context: HandlerContext, signal: ChatSignal):
+        if signal.type != ChatSignalType.INTERRUPT:
+            return
+        context = cast(LLMContext, context)
+        context.cancelled_speech_id = signal.speech_id
+        stream = context.stream
+        if stream is not None and context.stream_speech_id == signal.speech_id:
+            LLM_CANCELLED_STREAMS.inc()
+            try:
+                stream.close()
+            except Exception as e:
+                logger.warning(f"Failed to close completion stream: {e}")
+
     def destroy_context(self, context: HandlerContext):
         pass
 
@@ -0,0 +1,304 @@
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Deque, Optional
+
+import aiohttp
+import edge_tts
+import numpy as np
+from loguru import logger
+
+from engine_utils.audio_stream_decoder import StreamingAudioDecoder
+from engine_utils.metrics_registry import MetricsRegistry
+from handlers.tts.tts_phrase_cache import TTSPhraseCache
+
+TTS_CANCELLED_SENTENCES = MetricsRegistry().counter(
+    "tts_cancelled_sentences_total", "Sentences not synthesized or delivered because their speech was interrupted.")
+
+
+@dataclass
+class SentenceJob:
+    speech_id: str
+    text: Optional[str]
+    chunks: asyncio.Queue = field(default_factory=asyncio.Queue)
+    task: Optional[asyncio.Task] = None
+    cached_audio: Optional[np.ndarray] = None
+    failed: bool = False
+    cancelled: bool = False
+
+
+# Decodes the mp3 stream of one sentence and groups its pcm into chunks of at least chunk_size samples.
+class SentenceAudioAssembler:
+    def __init__(self, sample_rate: int, chunk_size: int):
+        self.decoder = StreamingAudioDecoder("mp3", sample_rate)
+        self.chunk_size = chunk_size
+        self.sentence_audios = []
+        self.pending_audios = []
+        self.pending_size = 0
+
+    def feed(self, data: bytes) -> Optional[np.ndarray]:
+        pcm = self.decoder.decode(data)
+        if pcm is None:
+            return None
+        self.sentence_audios.append(pcm)
+        self.pending_audios.append(pcm)
+        self.pending_size += pcm.shape[0]
+        if self.pending_size < self.chunk_size:
+            return None
+        return self._take_pending()
+
+    def finish(self) -> Optional[np.ndarray]:
+        pcm = self.decoder.flush()
+        if pcm is not None:
+            self.sentence_audios.append(pcm)
+            self.pending_audios.append(pcm)
+        if len(self.pending_audios) == 0:
+            return None
+        return self._take_pending()
+
+    def get_sentence_audio(self) -> Optional[np.ndarray]:
+        if len(self.sentence_audios) == 0:
+            return None
+        return np.concatenate(self.sentence_audios)
+
+    def _take_pending(self) -> np.ndarray:
+        audio = np.concatenate(self.pending_audios)
+        self.pending_audios = []
+        self.pending_size = 0
+        return audio
+
+
+# Runs tts requests of all sessions on one event loop thread. Connections to the tts service are
+# limited by max_connections across sessions. Only network io runs on the loop, phrase cache lookups, decoding
+# and handing audio to sessions run on decode_worker_num threads, one call at a time for each session to keep order.
+# If stub_server_url is set, sentences are posted to that url and the streamed response body is used
+# as mp3 audio, which allows testing without edge service.
+class EdgeTTSPipeline:
+    def __init__(self, voice: str, sample_rate: int, audio_chunk_size: int,
+                 max_connections: int = 16, stub_server_url: Optional[str] = None,
+                 phrase_cache: Optional[TTSPhraseCache] = None, decode_worker_num: int = 4):
+        self.voice = voice
+        self.sample_rate = sample_rate
+        self.audio_chunk_size = audio_chunk_size
+        self.max_connections = max(1, max_connections)
+        self.stub_server_url = stub_server_url
+        self.phrase_cache = phrase_cache
+        self.decode_executor = ThreadPoolExecutor(max_workers=max(1, decode_worker_num),
+                                                  thread_name_prefix="edge_tts_decode")
+
+        self.loop = asyncio.new_event_loop()
+        self.connection_limit: Optional[asyncio.Semaphore] = None
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run_loop, args=(ready,), name="edge_tts_loop", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready: threading.Event):
+        asyncio.set_event_loop(self.loop)
+        self.connection_limit = asyncio.Semaphore(self.max_connections)
+        ready.set()
+        self.loop.run_forever()
+
+    def create_session(self, max_in_flight: int,
+                       on_audio: Callable[[np.ndarray, str], None],
+                       on_speech_end: Callable[[str], None]) -> "TTSSessionPipeline":
+        return TTSSessionPipeline(self, max_in_flight, on_audio, on_speech_end)
+
+    async def stream_audio(self, text: str) -> AsyncIterator[bytes]:
+        async with self.connection_limit:
+            if self.stub_server_url is not None:
+                if self.http_session is None:
+                    self.http_session = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(limit=self.max_connections))
+                async with self.http_session.post(self.stub_server_url,
+                                                  json={"text": text, "voice": self.voice}) as response:
+                    response.raise_for_status()
+                    async for data in response.content.iter_any():
+                        yield data
+            else:
+                communicate = edge_tts.Communicate(text, self.voice)
+                async for chunk in communicate.stream():
+                    if chunk['type'] == 'audio':
+                        yield chunk['data']
+
+    def shutdown(self):
+        async def _close():
+            if self.http_session is not None:
+                await self.http_session.close()
+        asyncio.run_coroutine_threadsafe(_close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.decode_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Keeps up to max_in_flight sentences of one session synthesizing concurrently, while decoded audio
+# is delivered strictly in the order sentences were submitted.
+class TTSSessionPipeline:
+    def __init__(self, pipeline: EdgeTTSPipeline, max_in_flight: int,
+                 on_audio: Callable[[np.ndarray, str], None],
+                 on_speech_end: Callable[[str], None]):
+        self.pipeline = pipeline
+        self.loop = pipeline.loop
+        self.on_audio = on_audio
+        self.on_speech_end = on_speech_end
+        self.max_in_flight = max(1, max_in_flight)
+        self.in_flight: Optional[asyncio.Semaphore] = None
+        self.jobs: Optional[asyncio.Queue] = None
+        self.deliver_task: Optional[asyncio.Task] = None
+        self.current_job: Optional[SentenceJob] = None
+        # sentences of these speeches submitted later are dropped, only touched on the loop
+        self.cancelled_speech_ids: Deque[str] = deque(maxlen=16)
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    async def _start(self):
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        self.jobs = asyncio.Queue()
+        self.deliver_task = asyncio.create_task(self._deliver())
+
+    def submit_sentence(self, speech_id: str, text: str):
+        self.loop.call_soon_threadsafe(self._enqueue, speech_id, text)
+
+    def submit_speech_end(self, speech_id: str):
+        self.loop.call_soon_threadsafe(self._enqueue, speech_id, None)
+
+    def cancel_speech(self, speech_id: str):
+        """Drops sentences of the speech that are queued or being delivered and aborts their tts requests."""
+        self.loop.call_soon_threadsafe(self._cancel_speech, speech_id)
+
+    def _cancel_speech(self, speech_id: str):
+        if speech_id not in self.cancelled_speech_ids:
+            self.cancelled_speech_ids.append(speech_id)
+        cancelled = 0
+        kept = []
+        while not self.jobs.empty():
+            job = self.jobs.get_nowait()
+            if job.speech_id != speech_id:
+                kept.append(job)
+                continue
+            self._cancel_job(job)
+            if job.text is not None:
+                cancelled += 1
+        for job in kept:
+            self.jobs.put_nowait(job)
+        current_job = self.current_job
+        if current_job is not None and current_job.speech_id == speech_id and not current_job.cancelled:
+            self._cancel_job(current_job)
+            if current_job.text is not None:
+                cancelled += 1
+        TTS_CANCELLED_SENTENCES.inc(cancelled)
+
+    @classmethod
+    def _cancel_job(cls, job: SentenceJob):
+        job.cancelled = True
+        if job.task is not None:
+            job.task.cancel()
+
+    def _enqueue(self, speech_id: str, text: Optional[str]):
+        if speech_id in self.cancelled_speech_ids:
+            if text is not None:
+                TTS_CANCELLED_SENTENCES.inc()
+            return
+        job = SentenceJob(speech_id=speech_id, text=text)
+        if text is not None:
+            job.task = asyncio.create_task(self._synthesize(job))
+        self.jobs.put_nowait(job)
+
+    async def _synthesize(self, job: SentenceJob):
+        try:
+            phrase_cache = self.pipeline.phrase_cache
+            if phrase_cache is not None:
+                job.cached_audio = await self._run_in_executor(phrase_cache.get, self.pipeline.voice,
+                                                               self.pipeline.sample_rate, job.text)
+                if job.cached_audio is not None:
+                    return
+            async with self.in_flight:
+                async for data in self.pipeline.stream_audio(job.text):
+                    job.chunks.put_nowait(data)
+        except asyncio.CancelledError:
+            job.failed = True
+            raise
+        except Exception as e:
+            job.failed = True
+            logger.opt(exception=e).error(f"TTS failed on sentence {job.text}")
+        finally:
+            job.chunks.put_nowait(None)
+
+    async def _deliver(self):
+        while True:
+            job = await self.jobs.get()
+            self.current_job = job
+            try:
+                if job.cancelled:
+                    continue
+                if job.text is None:
+                    await self._run_in_executor(self.on_speech_end, job.speech_id)
+                else:
+                    await self._deliver_sentence(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.opt(exception=e).error(f"Failed to deliver tts audio of speech {job.speech_id}")
+            self.current_job = None
+
+    def _run_in_executor(self, func, *args):
+        return self.loop.run_in_executor(self.pipeline.decode_executor, func, *args)
+
+    async def _deliver_sentence(self, job: SentenceJob):
+        assembler = SentenceAudioAssembler(self.pipeline.sample_rate, self.pipeline.audio_chunk_size)
+        finished = False
+        while not finished:
+            # chunks that arrived meanwhile are decoded in one executor call
+            data_list = []
+            data = await job.chunks.get()
+            while True:
+                if data is None:
+                    finished = True
+                    break
+                data_list.append(data)
+                if job.chunks.empty():
+                    break
+                data = job.chunks.get_nowait()
+            if job.cancelled:
+                return
+            if job.cached_audio is not None:
+                # the sentence was found in the phrase cache, nothing was synthesized
+                await self._run_in_executor(self._emit_cached_audio, job)
+                return
+            await self._run_in_executor(self._emit_decoded_audio, job, assembler, data_list, finished)
+
+    def _emit_cached_audio(self, job: SentenceJob):
+        chunk_size = self.pipeline.audio_chunk_size
+        for start in range(0, job.cached_audio.shape[0], chunk_size):
+            if job.cancelled:
+                return
+            self.on_audio(np.array(job.cached_audio[start:start + chunk_size]), job.speech_id)
+
+    def _emit_decoded_audio(self, job: SentenceJob, assembler: SentenceAudioAssembler, data_list, finished: bool):
+        for data in data_list:
+            audio = assembler.feed(data)
+            if audio is not None and not job.cancelled:
+                self.on_audio(audio, job.speech_id)
+        if not finished or job.cancelled:
+            return
+        audio = assembler.finish()
+        if audio is not None:
+            self.on_audio(audio, job.speech_id)
+        phrase_cache = self.pipeline.phrase_cache
+        if phrase_cache is not None and not job.failed and phrase_cache.accept(job.text):
+            sentence_audio = assembler.get_sentence_audio()
+            if sentence_audio is not None:
+                phrase_cache.put(self.pipeline.voice, self.pipeline.sample_rate, job.text, sentence_audio)
+
+    def close(self):
+        def _cancel():
+            self.deliver_task.cancel()
+            if self.current_job is not None and self.current_job.task is not None:
+                self.current_job.task.cancel()
+            while not self.jobs.empty():
+                job = self.jobs.get_nowait()
+                if job.task is not None:
+                    job.task.cancel()
+        self.loop.call_soon_threadsafe(_cancel)
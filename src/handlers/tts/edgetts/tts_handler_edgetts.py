@@ -1,28 +1,47 @@
-import io
 import edge_tts
 import os
 import re
 import time
 from typing import Dict, Optional, cast
-import librosa
 import numpy as np
 from loguru import logger
 from pydantic import BaseModel, Field
 from abc import ABC
 from chat_engine.contexts.handler_context import HandlerContext
 from chat_engine.data_models.chat_engine_config_data import ChatEngineConfigModel, HandlerBaseConfigModel
-from chat_engine.common.handler_base import HandlerBase, HandlerBaseInfo, HandlerDataInfo, HandlerDetail
+from chat_engine.common.handler_base import HandlerBase, HandlerBaseInfo, HandlerDataInfo, HandlerDetail, \
+    HandlerExecutionPool
 from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.contexts.session_context import SessionContext
+from chat_engine.data_models.chat_signal import ChatSignal
+from chat_engine.data_models.chat_signal_type import ChatSignalType
 from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
 from engine_utils.directory_info import DirectoryInfo
+from handlers.tts.edgetts.tts_async_pipeline import EdgeTTSPipeline, TTSSessionPipeline
+from handlers.tts.tts_phrase_cache import TTSPhraseCache
 
 class TTSConfig(HandlerBaseConfigModel, BaseModel):
     ref_audio_path: str = Field(default=None)
     ref_audio_text: str = Field(default=None)
     voice: str = Field(default=None)
     sample_rate: int = Field(default=24000)
+    # Duration of each avatar audio chunk submitted while a sentence is being synthesized
+    audio_chunk_ms: int = Field(default=150)
+    # Sentences of one session synthesized concurrently, audio is still delivered in sentence order
+    max_in_flight_sentences: int = Field(default=3)
+    # Connections to tts service shared by all sessions
+    max_connections: int = Field(default=16)
+    # Threads decoding synthesized audio of all sessions, network io stays on the pipeline event loop
+    decode_worker_num: int = Field(default=4)
+    # Post sentences to this url instead of edge service, used for testing with a local stub server
+    stub_server_url: Optional[str] = Field(default=None)
+    # Cache synthesized audio of short phrases like greetings on disk, relative paths are under project dir
+    phrase_cache_enabled: bool = Field(default=False)
+    phrase_cache_dir: str = Field(default="cache/tts_phrase")
+    phrase_cache_memory_mb: int = Field(default=64)
+    phrase_cache_disk_mb: int = Field(default=1024)
+    phrase_cache_max_text_length: int = Field(default=32)
 
 
 class TTSContext(HandlerContext):
@@ -33,6 +52,10 @@ class TTSContext(HandlerContext):
         self.input_text = ''
         self.dump_audio = False
         self.audio_dump_file = None
+        self.pipeline: Optional[TTSSessionPipeline] = None
+        self.output_definition = None
+        # speech input_text was collected for, text left by an interrupted speech is dropped
+        self.input_speech_id = None
 
 
 class HandlerTTS(HandlerBase, ABC):
@@ -44,11 +67,16 @@ class HandlerTTS(HandlerBase, ABC):
         self.voice = None
         self.ref_audio_buffer = None
         self.sample_rate = None
-      
+        self.audio_chunk_size = None
+        self.max_in_flight_sentences = 3
+        self.pipeline: Optional[EdgeTTSPipeline] = None
+        self.phrase_cache: Optional[TTSPhraseCache] = None
+
 
     def get_handler_info(self) -> HandlerBaseInfo:
         return HandlerBaseInfo(
             config_model=TTSConfig,
+            execution_pool=HandlerExecutionPool.IO,
         )
 
     def get_handler_detail(self, session_context: SessionContext,
@@ -76,6 +104,19 @@ class HandlerTTS(HandlerBase, ABC):
        self.sample_rate = config.sample_rate
        self.ref_audio_path = config.ref_audio_path
        self.ref_audio_text = config.ref_audio_text
+       self.audio_chunk_size = max(1, config.sample_rate * config.audio_chunk_ms // 1000)
+       self.max_in_flight_sentences = config.max_in_flight_sentences
+       if config.phrase_cache_enabled:
+           self.phrase_cache = TTSPhraseCache(
+               os.path.join(DirectoryInfo.get_project_dir(), config.phrase_cache_dir),
+               memory_capacity=config.phrase_cache_memory_mb << 20,
+               disk_capacity=config.phrase_cache_disk_mb << 20,
+               max_text_length=config.phrase_cache_max_text_length)
+       self.pipeline = EdgeTTSPipeline(self.voice, self.sample_rate, self.audio_chunk_size,
+                                       max_connections=config.max_connections,
+                                       stub_server_url=config.stub_server_url,
+                                       phrase_cache=self.phrase_cache,
+                                       decode_worker_num=config.decode_worker_num)
 
 
     def create_context(self, session_context, handler_config=None):
@@ -92,6 +133,11 @@ class HandlerTTS(HandlerBase, ABC):
     def start_context(self, session_context, context: HandlerContext):
         context = cast(TTSContext, context)
         edge_tts.Communicate(text="测试音频启动", voice=self.voice)
+        context.pipeline = self.pipeline.create_session(
+            self.max_in_flight_sentences,
+            on_audio=lambda audio, speech_id: self.submit_audio(context, audio, speech_id),
+            on_speech_end=lambda speech_id: self.submit_speech_end(context, speech_id),
+        )
 
     def filter_text(self, text):
         pattern = r"[^a-zA-Z0-9\u4e00-\u9fff,.\~!?，。！？ ]"  # 匹配不在范围内的字符
@@ -100,8 +146,8 @@ class HandlerTTS(HandlerBase, ABC):
 
     def handle(self, context: HandlerContext, inputs: ChatData,
                output_definitions: Dict[ChatDataType, HandlerDataInfo]):
-        output_definition = output_definitions.get(ChatDataType.AVATAR_AUDIO).definition
         context = cast(TTSContext, context)
+        context.output_definition = output_definitions.get(ChatDataType.AVATAR_AUDIO).definition
         if inputs.type == ChatDataType.AVATAR_TEXT:
             text = inputs.data.get_main_data()
         else:
@@ -109,6 +155,9 @@ class HandlerTTS(HandlerBase, ABC):
         speech_id = inputs.data.get_meta("speech_id")
         if (speech_id is None):
             speech_id = context.session_id
+        if speech_id != context.input_speech_id:
+            context.input_text = ''
+            context.input_speech_id = speech_id
 
         if text is not None:
             text = re.sub(r"<\|.*?\|>", "", text)
@@ -126,48 +175,48 @@ class HandlerTTS(HandlerBase, ABC):
                     if len(sentence.strip()) < 1:
                         continue
                     logger.info('current sentence' + sentence)
-                    
-                    communicate = edge_tts.Communicate(sentence, self.voice)
-                    data = b''
-
-                    for chunk in communicate.stream_sync():
-                        if chunk['type'] == 'audio':
-                            # tts_audio = chunk['data']
-                            data += chunk['data']
-                    
-                    output_audio = librosa.load(io.BytesIO(data), sr=None)[0]
-                    output_audio = output_audio[np.newaxis, ...]
-                    output = DataBundle(output_definition)
-                    output.set_main_data(output_audio)
-                    output.add_meta("avatar_speech_end", False)
-                    output.add_meta("speech_id", speech_id)
-                    context.submit_data(output)
+                    context.pipeline.submit_sentence(speech_id, sentence)
         else:
             logger.info('last sentence' + context.input_text)
             if context.input_text is not None and len(context.input_text.strip()) > 0:
-                    communicate = edge_tts.Communicate(context.input_text, self.voice)
-                    data = b''
-
-                    for chunk in communicate.stream_sync():
-                        if chunk['type'] == 'audio':
-                            # tts_audio = chunk['data']
-                            data += chunk['data']
-                    output_audio = librosa.load(io.BytesIO(data), sr=None)[0]
-                    output_audio = output_audio[np.newaxis, ...]
-                    output = DataBundle(output_definition)
-                    output.set_main_data(output_audio)
-                    output.add_meta("avatar_speech_end", False)
-                    output.add_meta("speech_id", speech_id)
-                    context.submit_data(output)
+                context.pipeline.submit_sentence(speech_id, context.input_text)
             context.input_text = ''
-            output = DataBundle(output_definition)
-            output.set_main_data(np.zeros(shape=(1, 240), dtype=np.float32))
-            output.add_meta("avatar_speech_end", True)
-            output.add_meta("speech_id", speech_id)
-            context.submit_data(output)
-            logger.info(f"speech end")
+            context.pipeline.submit_speech_end(speech_id)
+
+    @staticmethod
+    def submit_audio(context: TTSContext, audio: np.ndarray, speech_id):
+        output_audio = audio[np.newaxis, ...]
+        if context.audio_dump_file is not None:
+            context.audio_dump_file.write(output_audio.tobytes())
+        output = DataBundle.create_with_main_data(context.output_definition, output_audio)
+        output.add_meta("avatar_speech_end", False)
+        output.add_meta("speech_id", speech_id)
+        context.submit_data(output)
+
+    @staticmethod
+    def submit_speech_end(context: TTSContext, speech_id):
+        output = DataBundle(context.output_definition)
+        output.set_main_data(np.zeros(shape=(1, 240), dtype=np.float32))
+        output.add_meta("avatar_speech_end", True)
+        output.add_meta("speech_id", speech_id)
+        context.submit_data(output)
+        logger.info(f"speech end")
+
+    def on_signal(self, context: HandlerContext, signal: ChatSignal):
+        context = cast(TTSContext, context)
+        if signal.type == ChatSignalType.INTERRUPT and context.pipeline is not None:
+            context.pipeline.cancel_speech(signal.speech_id)
 
     def destroy_context(self, context: HandlerContext):
         context = cast(TTSContext, context)
+        if context.pipeline is not None:
+            context.pipeline.close()
+        if self.phrase_cache is not None:
+            logger.info(f"tts phrase cache stats: {self.phrase_cache.get_stats()}")
         logger.info('destroy context')
 
+    def destroy(self):
+        if self.pipeline is not None:
+            self.pipeline.shutdown()
+            self.pipeline = None
+
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from engine_utils.metrics_registry import MetricsRegistry
+
+PHRASE_CACHE_LOOKUPS = MetricsRegistry().counter(
+    "tts_phrase_cache_lookups_total", "Phrase cache lookups by result.", ("result",))
+PHRASE_CACHE_MEMORY_HITS = PHRASE_CACHE_LOOKUPS.labels("memory_hit")
+PHRASE_CACHE_DISK_HITS = PHRASE_CACHE_LOOKUPS.labels("disk_hit")
+PHRASE_CACHE_MISSES = PHRASE_CACHE_LOOKUPS.labels("miss")
+
+
+@dataclass
+class TTSPhraseCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    memory_bytes: int = 0
+    disk_bytes: int = 0
+
+
+# Content addressed cache of synthesized phrases, keyed by (voice, sample_rate, text). Only whitespace of the text
+# is normalized, casing can change pronunciation, e.g. "US" and "us".
+# Decoded float32 pcm is kept in an in-memory lru and persisted to cache_dir as raw files that are
+# memory mapped on read. Both tiers evict least recently used entries once over their byte budget.
+class TTSPhraseCache:
+    file_suffix = ".f32"
+
+    def __init__(self, cache_dir: str, memory_capacity: int = 64 << 20, disk_capacity: int = 1 << 30,
+                 max_text_length: int = 32):
+        self.cache_dir = cache_dir
+        self.memory_capacity = memory_capacity
+        self.disk_capacity = disk_capacity
+        self.max_text_length = max_text_length
+
+        self.lock = threading.Lock()
+        self.memory_entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.disk_entries: OrderedDict[str, int] = OrderedDict()
+        self.stats = TTSPhraseCacheStats()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip()
+
+    @classmethod
+    def make_key(cls, voice: str, sample_rate: int, text: str) -> str:
+        content = f"{voice}\n{sample_rate}\n{cls.normalize_text(text)}"
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def accept(self, text: str) -> bool:
+        return 0 < len(self.normalize_text(text)) <= self.max_text_length
+
+    def get(self, voice: str, sample_rate: int, text: str) -> Optional[np.ndarray]:
+        if not self.accept(text):
+            return None
+        key = self.make_key(voice, sample_rate, text)
+        with self.lock:
+            audio = self.memory_entries.get(key)
+            if audio is not None:
+                self.memory_entries.move_to_end(key)
+                self.stats.memory_hits += 1
+                PHRASE_CACHE_MEMORY_HITS.inc()
+                return audio
+            if key not in self.disk_entries:
+                self.stats.misses += 1
+                PHRASE_CACHE_MISSES.inc()
+                return None
+            try:
+                audio = np.memmap(self._get_path(key), dtype=np.float32, mode="r")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to read cached phrase {key}: {e}")
+                self._remove_disk_entry(key)
+                self.stats.misses += 1
+                PHRASE_CACHE_MISSES.inc()
+                return None
+            self.disk_entries.move_to_end(key)
+            self._touch(key)
+            self.stats.disk_hits += 1
+            PHRASE_CACHE_DISK_HITS.inc()
+            self._put_memory(key, audio)
+            return audio
+
+    def put(self, voice: str, sample_rate: int, text: str, audio: np.ndarray):
+        if not self.accept(text) or audio.size == 0:
+            return
+        key = self.make_key(voice, sample_rate, text)
+        audio = np.ascontiguousarray(audio, dtype=np.float32).reshape(-1)
+        path = self._get_path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            audio.tofile(temp_path)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cached phrase {key}: {e}")
+            return
+        with self.lock:
+            self._put_memory(key, audio)
+            self.stats.disk_bytes -= self.disk_entries.pop(key, 0)
+            self.disk_entries[key] = audio.nbytes
+            self.stats.disk_bytes += audio.nbytes
+            while self.stats.disk_bytes > self.disk_capacity and len(self.disk_entries) > 1:
+                self._remove_disk_entry(next(iter(self.disk_entries)))
+
+    def get_stats(self) -> TTSPhraseCacheStats:
+        with self.lock:
+            return TTSPhraseCacheStats(**self.stats.__dict__)
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.file_suffix)
+
+    def _put_memory(self, key: str, audio: np.ndarray):
+        old_audio = self.memory_entries.pop(key, None)
+        if old_audio is not None:
+            self.stats.memory_bytes -= old_audio.nbytes
+        self.memory_entries[key] = audio
+        self.stats.memory_bytes += audio.nbytes
+        while self.stats.memory_bytes > self.memory_capacity and len(self.memory_entries) > 1:
+            _, evicted = self.memory_entries.popitem(last=False)
+            self.stats.memory_bytes -= evicted.nbytes
+
+    def _touch(self, key: str):
+        try:
+            os.utime(self._get_path(key))
+        except OSError:
+            pass
+
+    def _remove_disk_entry(self, key: str):
+        self.stats.disk_bytes -= self.disk_entries.pop(key, 0)
+        evicted = self.memory_entries.pop(key, None)
+        if evicted is not None:
+            self.stats.memory_bytes -= evicted.nbytes
+        try:
+            os.remove(self._get_path(key))
+        except OSError:
+            pass
+
+    def _load_disk_index(self):
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, file_name)
+            if file_name.endswith(".tmp"):
+                os.remove(path)
+                continue
+            if not file_name.endswith(self.file_suffix):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, file_name[:-len(self.file_suffix)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk_entries[key] = size
+            self.stats.disk_bytes += size
+        while self.stats.disk_bytes > self.disk_capacity and len(self.disk_entries) > 0:
+            self._remove_disk_entry(next(iter(self.disk_entries)))
+        logger.info(f"Loaded {len(self.disk_entries)} cached tts phrases from {self.cache_dir}")
@@ -0,0 +1,34 @@
+from typing import List, Tuple
+
+import numpy as np
+from loguru import logger
+
+from engine_utils.batch_worker import BatchWorker
+
+
+# Runs pending clips of all sessions through the shared silero onnx session in one call.
+class SileroVADBatchEngine:
+    def __init__(self, model, sample_rate: int = 16000, max_batch_size: int = 64):
+        self.model = model
+        self.sample_rate = np.array([sample_rate], dtype=np.int64)
+        self.batch_worker = BatchWorker("silero_vad_batch", self._run_batch, max_batch_size)
+
+    def infer(self, clip: np.ndarray, state: np.ndarray) -> Tuple[float, np.ndarray]:
+        try:
+            return self.batch_worker.submit((clip, state))
+        except Exception as e:
+            logger.warning(f"Batched VAD inference failed, clip treated as silence: {e}")
+            return 0.0, state
+
+    def get_metrics(self) -> dict:
+        return self.batch_worker.get_metrics()
+
+    def _run_batch(self, batch: List[Tuple[np.ndarray, np.ndarray]]) -> List[Tuple[float, np.ndarray]]:
+        clips = np.stack([clip for clip, _ in batch], axis=0)
+        states = np.concatenate([state for _, state in batch], axis=1)
+        probs, out_states = self.model.run(None, {
+            "input": clips,
+            "sr": self.sample_rate,
+            "state": states,
+        })
+        return [(float(probs[i][0]), np.ascontiguousarray(out_states[:, i:i + 1, :])) for i in range(len(batch))]
@@ -1,8 +1,9 @@
 import enum
 import math
 import os
+import time
 from abc import ABC
-from typing import cast, Dict, Optional, Tuple
+from typing import cast, Dict, List, Optional, Tuple
 
 import numpy as np
 from loguru import logger
@@ -16,6 +17,12 @@ from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_engine_config_data import ChatEngineConfigModel, HandlerBaseConfigModel
 from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
 from engine_utils.general_slicer import SliceContext, slice_data
+from engine_utils.metrics_registry import MetricsRegistry
+from handlers.vad.silerovad.vad_batch_engine import SileroVADBatchEngine
+
+VAD_INFERENCE_SECONDS = MetricsRegistry().histogram(
+    "chat_inference_seconds", "Model inference time of one call, batched calls included.",
+    ("model",)).labels("silero_vad")
 
 
 class SileroVADConfigModel(HandlerBaseConfigModel, BaseModel):
@@ -24,6 +31,11 @@ class SileroVADConfigModel(HandlerBaseConfigModel, BaseModel):
     end_delay: int = Field(default=5000)
     buffer_look_back: int = Field(default=1024)
     speech_padding: int = Field(default=512)
+    # Samples of silence within speech marked as a pause, downstream may finish the audio before it. 0 disables
+    pause_delay: int = Field(default=2560)
+    # Run clips of all sessions through one batched model call
+    batch_inference: bool = Field(default=False)
+    max_batch_size: int = Field(default=64)
 
 
 class SpeakingStatus(enum.Enum):
@@ -32,6 +44,41 @@ class SpeakingStatus(enum.Enum):
     END = enum.auto()
 
 
+class AudioHistoryBuffer:
+    def __init__(self, clip_size: int, clip_capacity: int, dtype=np.float32):
+        self.clip_size = clip_size
+        self.clip_capacity = max(1, clip_capacity)
+        self.samples = np.zeros(self.clip_capacity * clip_size, dtype=dtype)
+        self.timestamps: List[Optional[int]] = [None] * self.clip_capacity
+        self.write_slot = 0
+        self.clip_num = 0
+
+    def clear(self):
+        self.write_slot = 0
+        self.clip_num = 0
+
+    def append(self, clip: np.ndarray, timestamp: Optional[int] = None):
+        offset = self.write_slot * self.clip_size
+        self.samples[offset:offset + self.clip_size] = clip
+        self.timestamps[self.write_slot] = timestamp
+        self.write_slot = (self.write_slot + 1) % self.clip_capacity
+        self.clip_num = min(self.clip_num + 1, self.clip_capacity)
+
+    def fetch_latest(self, clip_num: int, pre_padding: int = 0) -> Tuple[np.ndarray, Optional[int]]:
+        clip_num = min(clip_num, self.clip_num)
+        output = np.zeros(pre_padding + clip_num * self.clip_size, dtype=self.samples.dtype)
+        if clip_num == 0:
+            return output, None
+        start_slot = (self.write_slot - clip_num) % self.clip_capacity
+        head_clip_num = min(clip_num, self.clip_capacity - start_slot)
+        head_size = head_clip_num * self.clip_size
+        start_offset = start_slot * self.clip_size
+        output[pre_padding:pre_padding + head_size] = self.samples[start_offset:start_offset + head_size]
+        if clip_num > head_clip_num:
+            output[pre_padding + head_size:] = self.samples[:(clip_num - head_clip_num) * self.clip_size]
+        return output, self.timestamps[start_slot]
+
+
 class HumanAudioVADContext(HandlerContext):
     def __init__(self, session_id: str):
         super().__init__(session_id)
@@ -40,7 +87,7 @@ class HumanAudioVADContext(HandlerContext):
 
         self.clip_size = 512
 
-        self.audio_history = []
+        self.audio_history: Optional[AudioHistoryBuffer] = None
         self.history_length_limit = 0
 
         self.speech_length: int = 0
@@ -61,19 +108,11 @@ class HumanAudioVADContext(HandlerContext):
 
     def _update_status_on_pre_start(self, clip: np.ndarray, _timestamp: Optional[int] = None):
         if self.speech_length >= self.config.start_delay:
-            head_sample_id = None
             self.speaking_status = SpeakingStatus.START
             sample_num_to_fetch = self.config.buffer_look_back + self.config.start_delay
             slice_num_to_fetch = math.ceil(sample_num_to_fetch / self.clip_size)
-            audio_clips = []
-            for history_entry in self.audio_history[-slice_num_to_fetch:]:
-                history_clip, history_timestamp = history_entry
-                if head_sample_id is None:
-                    head_sample_id = history_timestamp
-                audio_clips.append(history_clip)
-            output_audio = np.concatenate(audio_clips, axis=0)
-            output_audio = np.concatenate(
-                [np.zeros(self.config.speech_padding, dtype=clip.dtype), output_audio], axis=0)
+            output_audio, head_sample_id = self.audio_history.fetch_latest(slice_num_to_fetch,
+                                                                           self.config.speech_padding)
             self.speech_id += 1
             logger.info("Start of human speech")
             extra_args =  {
@@ -105,7 +144,12 @@ class HumanAudioVADContext(HandlerContext):
                 logger.info(f"VAD start to start got timestamp {timestamp}")
             return output_audio,  extra_args
         else:
-            return clip, {"head_sample_id": timestamp}
+            extra_args = {"head_sample_id": timestamp}
+            pause_delay = self.config.pause_delay
+            if 0 < pause_delay <= self.silence_length < pause_delay + self.clip_size:
+                extra_args["human_speech_pause"] = True
+            # clip is a view of slicer ring buffer, copy it as it is handed to downstream handlers
+            return clip.copy(), extra_args
 
     def _update_status_on_end(self, _clip: np.ndarray, _timestamp: Optional[int] = None):
         if self.speech_length > 0:
@@ -114,9 +158,7 @@ class HumanAudioVADContext(HandlerContext):
         return None, {}
 
     def _append_to_history(self, clip: np.ndarray, timestamp: Optional[int] = None):
-        self.audio_history.append((clip, timestamp))
-        while 0 < self.history_length_limit < len(self.audio_history):
-            self.audio_history.pop(0)
+        self.audio_history.append(clip, timestamp)
 
     def update_status(self, speech_prob: float, clip: np.ndarray,
                       timestamp: Optional[int]=None) -> Tuple[Optional[np.ndarray], Dict]:
@@ -139,6 +181,7 @@ class HandlerAudioVAD(HandlerBase, ABC):
     def __init__(self):
         super().__init__()
         self.model = None
+        self.batch_engine: Optional[SileroVADBatchEngine] = None
 
     def get_handler_info(self):
         return HandlerBaseInfo(
@@ -147,6 +190,8 @@ class HandlerAudioVAD(HandlerBase, ABC):
 
     def load(self, engine_config: ChatEngineConfigModel, handler_config = None):
         import onnxruntime
+        if not isinstance(handler_config, SileroVADConfigModel):
+            handler_config = SileroVADConfigModel()
         model_name = "silero_vad.onnx"
         model_path = os.path.join(self.handler_root, "silero_vad",
                                   "src", "silero_vad", "data",
@@ -158,6 +203,8 @@ class HandlerAudioVAD(HandlerBase, ABC):
         self.model = onnxruntime.InferenceSession(model_path,
                                                   providers=["CPUExecutionProvider"],
                                                   sess_options=options)
+        if handler_config.batch_inference:
+            self.batch_engine = SileroVADBatchEngine(self.model, max_batch_size=handler_config.max_batch_size)
 
     def create_context(self, session_context: SessionContext, handler_config = None) -> HandlerContext:
         context = HumanAudioVADContext(session_context.session_info.session_id)
@@ -165,12 +212,13 @@ class HandlerAudioVAD(HandlerBase, ABC):
         if isinstance(handler_config, SileroVADConfigModel):
             context.config = handler_config
         context.model_state = np.zeros((2, 1, 128), dtype=np.float32)
-        context.slice_context = SliceContext.create_numpy_slice_context(
+        context.slice_context = SliceContext.create_numpy_ring_slice_context(
             slice_size=context.clip_size,
             slice_axis=0,
         )
         context.history_length_limit = math.ceil((context.config.start_delay + context.config.buffer_look_back)
                                                  / context.clip_size)
+        context.audio_history = AudioHistoryBuffer(context.clip_size, context.history_length_limit)
         return context
 
     def start_context(self, session_context, handler_context):
@@ -201,6 +249,12 @@ class HandlerAudioVAD(HandlerBase, ABC):
         if clip.ndim != 1:
             logger.warning("Input audio should be 1-dim array")
             return 0
+        t_start = time.monotonic()
+        if self.batch_engine is not None and sr == 16000:
+            prob, state = self.batch_engine.infer(clip, context.model_state)
+            context.model_state = state
+            VAD_INFERENCE_SECONDS.observe(time.monotonic() - t_start)
+            return prob
         clip = np.expand_dims(clip, axis=0)
         inputs = {
             "input": clip,
@@ -209,6 +263,7 @@ class HandlerAudioVAD(HandlerBase, ABC):
         }
         prob, state = self.model.run(None, inputs)
         context.model_state = state
+        VAD_INFERENCE_SECONDS.observe(time.monotonic() - t_start)
         return prob[0][0]
 
     def handle(self, context: HandlerContext, inputs: ChatData,
@@ -236,8 +291,11 @@ class HandlerAudioVAD(HandlerBase, ABC):
 
         context.slice_context.update_start_id(timestamp[0], force_update=False)
 
+        # gathered first, a reset on speech end flushes the slicer while later clips of this chunk are pending
+        clips = []
         for clip in slice_data(context.slice_context, audio):
-            head_sample_id = context.slice_context.get_last_slice_start_index()
+            clips.append((clip, context.slice_context.get_last_slice_start_index()))
+        for clip, head_sample_id in clips:
             speech_prob = self._inference(context, clip)
             audio_clip, extra_args = context.update_status(speech_prob, clip, timestamp=head_sample_id)
             # FIXME this is a hack to disable VAD after human speech end,
@@ -249,8 +307,7 @@ class HandlerAudioVAD(HandlerBase, ABC):
                 context.shared_states.enable_vad = False
                 context.reset()
             if audio_clip is not None:
-                output = DataBundle(output_definition)
-                output.set_main_data(np.expand_dims(audio_clip, axis=0))
+                output = DataBundle.create_with_main_data(output_definition, np.expand_dims(audio_clip, axis=0))
                 for flag_name, flag_value in extra_args.items():
                     output.add_meta(flag_name, flag_value)
                 output.add_meta("speech_id", speech_id)
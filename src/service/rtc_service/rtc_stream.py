@@ -15,12 +15,17 @@ from chat_engine.data_models.chat_data.chat_data_model import ChatData
 from chat_engine.data_models.chat_data_type import ChatDataType
 from chat_engine.data_models.chat_signal import ChatSignal
 from chat_engine.data_models.chat_signal_type import ChatSignalType, ChatSignalSourceType
-from engine_utils.interval_counter import IntervalCounter
+from engine_utils.metrics_registry import MetricsRegistry
 from aiortc.codecs import vpx
 vpx.DEFAULT_BITRATE = 5000000
 vpx.MIN_BITRATE = 1000000
 vpx.MAX_BITRATE = 10000000
 
+EMIT_AUDIO_SECONDS = MetricsRegistry().counter(
+    "rtc_emit_audio_seconds_total", "Seconds of audio emitted to rtc clients.")
+EMIT_VIDEO_FRAMES = MetricsRegistry().counter(
+    "rtc_emit_video_frames_total", "Video frames emitted to rtc clients.")
+
 class RtcStream(AsyncAudioVideoStreamHandler):
     def __init__(self,
                  session_id: Optional[str],
@@ -52,8 +57,6 @@ class RtcStream(AsyncAudioVideoStreamHandler):
         self.quit = asyncio.Event()
         self.last_frame_time = 0
 
-        self.emit_counter = IntervalCounter("emit counter")
-
         self.start_time = None
         self.timestamp_base = self.input_sample_rate
 
@@ -109,7 +112,7 @@ class RtcStream(AsyncAudioVideoStreamHandler):
                 if audio_array is None:
                     continue
                 sample_num = audio_array.shape[-1]
-                self.emit_counter.add_property("emit_audio", sample_num / self.output_sample_rate)
+                EMIT_AUDIO_SECONDS.inc(sample_num / self.output_sample_rate)
                 return self.output_sample_rate, audio_array
         except Exception as e:
             logger.opt(exception=e).error(f"Error in emit: ")
@@ -119,7 +122,6 @@ class RtcStream(AsyncAudioVideoStreamHandler):
         try:
             if not self.first_audio_emitted:
                 await asyncio.sleep(0.1)
-            self.emit_counter.add_property("emit_video")
             while not self.quit.is_set():
                 video_frame_data: ChatData = await self.client_session_delegate.get_data(EngineChannelType.VIDEO)
                 if video_frame_data is None or video_frame_data.data is None:
@@ -127,6 +129,7 @@ class RtcStream(AsyncAudioVideoStreamHandler):
                 frame_data = video_frame_data.data.get_main_data().squeeze()
                 if frame_data is None:
                     continue
+                EMIT_VIDEO_FRAMES.inc()
                 return frame_data
         except Exception as e:
             logger.opt(exception=e).error(f"Error in video_emit: ")
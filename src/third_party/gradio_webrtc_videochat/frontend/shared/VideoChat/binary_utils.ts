@@ -2,6 +2,34 @@ import base64js from "base64-js";
 import { Buffer } from "buffer";
 import PythonStruct from "python-struct";
 
+// 协议版本1: JBIN + json描述; 版本2: 欢迎消息之后使用紧凑的二进制描述(JBCF)
+export const MOTION_DATA_PROTOCOL_VERSION = 2;
+export const COMPACT_FOURCC = "JBCF";
+const COMPACT_FRAME_HEADER_SIZE = 20;
+const COMPACT_RECORD_SIZE = 24;
+const COMPACT_MAX_DIMS = 4;
+const COMPACT_FLAG_START_OF_BATCH = 1;
+const COMPACT_FLAG_END_OF_BATCH = 2;
+const COMPACT_DATA_TYPES = [
+  "uint8",
+  "int8",
+  "int16",
+  "int32",
+  "float16",
+  "float32",
+  "float64",
+];
+
+export interface ICompactLayout {
+  // 欢迎消息中的record顺序，紧凑帧通过序号引用
+  recordNames: string[];
+  records: Record<string, object>;
+}
+
+export const readFourcc = async function (blob: Blob) {
+  return new TextDecoder().decode(await blob.slice(0, 4).arrayBuffer());
+};
+
 export const unpack = async function (blob: Blob, str = "<II") {
   const unpackBuffer = await blob.slice(4, 12).arrayBuffer();
   const [jsonSize, binSize] = PythonStruct.unpack(
@@ -14,6 +42,73 @@ export const unpack = async function (blob: Blob, str = "<II") {
     parsedData,
     jsonSize,
     binSize,
+    binOffset: 12 + jsonSize,
+  };
+};
+
+export const getCompactLayout = function (parsedData: {
+  metadata?: Record<string, string>;
+  data_records?: Record<string, object>;
+}): ICompactLayout | undefined {
+  const { metadata, data_records = {} } = parsedData;
+  if (!metadata || metadata.descriptor_format !== "compact") {
+    return undefined;
+  }
+  return {
+    recordNames: (metadata.record_names || "").split(","),
+    records: data_records,
+  };
+};
+
+export const unpackCompact = async function (
+  blob: Blob,
+  layout: ICompactLayout,
+) {
+  const header = new DataView(
+    await blob.slice(0, COMPACT_FRAME_HEADER_SIZE).arrayBuffer(),
+  );
+  const flags = header.getUint8(5);
+  const recordNum = header.getUint16(6, true);
+  const batchId = header.getUint32(8, true);
+  const extensionSize = header.getUint32(12, true);
+  const binSize = header.getUint32(16, true);
+  const recordsEnd =
+    COMPACT_FRAME_HEADER_SIZE + recordNum * COMPACT_RECORD_SIZE;
+  const records = new DataView(
+    await blob.slice(COMPACT_FRAME_HEADER_SIZE, recordsEnd).arrayBuffer(),
+  );
+  const data_records: Record<string, object> = {};
+  for (let i = 0; i < recordNum; i++) {
+    const base = i * COMPACT_RECORD_SIZE;
+    const name = layout.recordNames[records.getUint8(base)];
+    const dimNum = Math.min(records.getUint8(base + 2), COMPACT_MAX_DIMS);
+    const shape: number[] = [];
+    for (let dim = 0; dim < dimNum; dim++) {
+      shape.push(records.getUint32(base + 8 + dim * 4, true));
+    }
+    data_records[name] = {
+      ...layout.records[name],
+      data_id: i,
+      data_type: COMPACT_DATA_TYPES[records.getUint8(base + 1)],
+      data_offset: records.getUint32(base + 4, true),
+      shape,
+    };
+  }
+  const extension = extensionSize
+    ? JSON.parse(await blob.slice(recordsEnd, recordsEnd + extensionSize).text())
+    : {};
+  const parsedData = {
+    events: [],
+    ...extension,
+    batch_id: batchId,
+    data_records,
+    start_of_batch: (flags & COMPACT_FLAG_START_OF_BATCH) !== 0,
+    end_of_batch: (flags & COMPACT_FLAG_END_OF_BATCH) !== 0,
+  };
+  return {
+    parsedData,
+    binSize,
+    binOffset: recordsEnd + extensionSize,
   };
 };
 export const mergeBlob = (strArray: string[], target: Uint8Array) => {
@@ -7,6 +7,7 @@ import { TYVoiceChatState } from "./interface/voiceChat";
 // import * as GaussianSplats3D from "./gaussian-splats-3d.module.js";
 import * as GaussianSplats3D from "gaussian-splat-renderer-for-lam";
 import { WsEventTypes } from "./interface/eventType";
+import { MOTION_DATA_PROTOCOL_VERSION } from "./binary_utils";
 
 interface GaussianOptions {
   container: HTMLDivElement
@@ -64,6 +65,23 @@ export class GaussianAvatar extends EventEmitter {
     }
     this._processor = new Processor(this);
     this._bindEventTypes();
+    this._sendClientHello();
+  }
+  private _sendClientHello() {
+    // 声明支持的协议版本，服务端据此切换到紧凑的二进制描述，旧客户端不发送则保持JBIN + json
+    const send = () => {
+      this._ws.send(
+        JSON.stringify({
+          header: { name: EventTypes.ClientHello },
+          payload: { protocol_version: MOTION_DATA_PROTOCOL_VERSION },
+        }),
+      );
+    };
+    if (this._ws.engine?.readyState === WebSocket.OPEN) {
+      send();
+    } else {
+      this._ws.once(WsEventTypes.WS_OPEN, send);
+    }
   }
   public start() {
     this.getData();
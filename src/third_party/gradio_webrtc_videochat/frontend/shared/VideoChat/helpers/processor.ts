@@ -1,7 +1,15 @@
 import EventEmitter from "eventemitter3";
 import PQueue from "p-queue";
 
-import { mergeBlob, unpack } from "../binary_utils";
+import {
+  COMPACT_FOURCC,
+  getCompactLayout,
+  type ICompactLayout,
+  mergeBlob,
+  readFourcc,
+  unpack,
+  unpackCompact,
+} from "../binary_utils";
 import {
   EventTypes,
   PlayerEventTypes,
@@ -30,6 +38,7 @@ interface IParsedData {
   data_records: Record<string, IDataRecords>;
   end_of_batch: boolean;
   events: IEvent[];
+  metadata?: Record<string, string>;
 }
 interface IAvatarMotionData {
   // 数据大小，首包存在该值
@@ -92,6 +101,7 @@ export class Processor {
   private _maxBatchId?: number;
   private _arkitFaceShape?: number;
   private _tts2FaceShape?: number;
+  private _compactLayout?: ICompactLayout;
   constructor(ee: EventEmitter) {
     this.ee = ee;
   }
@@ -317,10 +327,10 @@ export class Processor {
           //   lastMotionGroup.motion_data_slices,
           //   lastMotionGroup.merged_motion_data,
           // );
-          const { parsedData, jsonSize, binSize } = await unpack(blob);
-          lastMotionGroup.jsonSize = jsonSize;
+          const { parsedData, binSize, binOffset } = await this._unpack(blob);
+          lastMotionGroup.jsonSize = binOffset - 12;
           lastMotionGroup.binSize = binSize;
-          const bin = blob.slice(12 + lastMotionGroup.jsonSize!);
+          const bin = blob.slice(binOffset);
           if (bin.size !== lastMotionGroup.binSize) {
             this.ee.emit(ProcessorEventTypes.Chat_BinsizeError);
           }
@@ -359,6 +369,22 @@ export class Processor {
       this.ee.emit(EventTypes.ErrorReceived, (err as Error).message);
     }
   }
+  private async _unpack(blob: Blob) {
+    if ((await readFourcc(blob)) === COMPACT_FOURCC) {
+      if (!this._compactLayout) {
+        throw new Error("compact motion data received before welcome message");
+      }
+      const result = await unpackCompact(blob, this._compactLayout);
+      return { ...result, parsedData: result.parsedData as IParsedData };
+    }
+    const result = await unpack(blob);
+    // 欢迎消息声明紧凑格式时，记录后续帧引用的record顺序
+    const layout = getCompactLayout(result.parsedData);
+    if (layout) {
+      this._compactLayout = layout;
+    }
+    return { ...result, parsedData: result.parsedData as IParsedData };
+  }
   private async _handleAudioConfig(
     parsedData: IParsedData,
     lastMotionGroup: IAvatarMotionGroup,
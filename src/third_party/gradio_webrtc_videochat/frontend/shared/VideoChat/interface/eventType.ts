@@ -1,4 +1,5 @@
 export enum EventTypes {
+    'ClientHello' = 'ClientHello',
     'ErrorReceived' = 'ErrorReceived',
     'MessageReceived' = 'MessageReceived',
     'StartSpeech' = 'StartSpeech',
@@ -0,0 +1,189 @@
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+import pytest
+
+from chat_engine.common.handler_base import HandlerBase, HandlerBaseInfo, HandlerDataInfo, HandlerDetail
+from chat_engine.contexts.handler_context import HandlerContext
+from chat_engine.contexts.session_context import SessionContext
+from chat_engine.core.chat_session import ChatSession
+from chat_engine.core.session_scheduler import SessionScheduler
+from chat_engine.data_models.chat_data.chat_data_model import ChatData
+from chat_engine.data_models.chat_data_type import ChatDataType
+from chat_engine.data_models.chat_engine_config_data import ChatEngineConfigModel, HandlerBaseConfigModel, \
+    SchedulerConfigModel
+from chat_engine.data_models.chat_signal import ChatSignal
+from chat_engine.data_models.chat_signal_type import ChatSignalType
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
+from chat_engine.data_models.session_info_data import SessionInfoData
+from handlers.avatar.lam.avatar_handler_lam_audio2expression import HandlerAvatarLAM
+
+TEXT_DEFINITION = DataBundleDefinition()
+TEXT_DEFINITION.add_entry(DataBundleEntry.create_text_entry("human_text"))
+AUDIO_DEFINITION = DataBundleDefinition()
+AUDIO_DEFINITION.add_entry(DataBundleEntry.create_audio_entry("avatar_audio", 1, 24000))
+
+
+def text_input(speech_id: str) -> ChatData:
+    bundle = DataBundle.create_with_main_data(TEXT_DEFINITION, speech_id)
+    bundle.add_meta("speech_id", speech_id)
+    return ChatData(type=ChatDataType.HUMAN_TEXT, data=bundle)
+
+
+def interrupt(speech_id: Optional[str] = None) -> ChatSignal:
+    return ChatSignal(type=ChatSignalType.INTERRUPT, speech_id=speech_id)
+
+
+class RecordingHandler(HandlerBase):
+    """Records handled speeches and signals, blocks on the first input until released when a gate is set."""
+
+    def __init__(self, gate: Optional[threading.Event] = None):
+        super().__init__()
+        self.gate = gate
+        self.started = threading.Event()
+        self.handled = []
+        self.signals = []
+
+    def get_handler_info(self) -> HandlerBaseInfo:
+        return HandlerBaseInfo()
+
+    def load(self, engine_config, handler_config=None):
+        pass
+
+    def create_context(self, session_context, handler_config=None) -> HandlerContext:
+        return HandlerContext(session_context.session_info.session_id)
+
+    def start_context(self, session_context, handler_context):
+        pass
+
+    def get_handler_detail(self, session_context, context) -> HandlerDetail:
+        return HandlerDetail(inputs={ChatDataType.HUMAN_TEXT: HandlerDataInfo(type=ChatDataType.HUMAN_TEXT)})
+
+    def handle(self, context, inputs: ChatData, output_definitions: Dict[ChatDataType, HandlerDataInfo]):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(2.0)
+        self.handled.append(inputs.data.get_meta("speech_id"))
+
+    def on_signal(self, context, signal: ChatSignal):
+        self.signals.append(signal.speech_id)
+
+    def destroy_context(self, context):
+        pass
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = SessionScheduler(SchedulerConfigModel(cpu_worker_num=1, io_worker_num=1))
+    yield scheduler
+    scheduler.shutdown()
+
+
+def create_session(scheduler, **handlers) -> ChatSession:
+    session_context = SessionContext(SessionInfoData(session_id="session_1"), {}, {})
+    session = ChatSession(session_context, ChatEngineConfigModel(), scheduler)
+    for name, handler in handlers.items():
+        session.prepare_handler(handler, HandlerBaseInfo(name=name), HandlerBaseConfigModel())
+    return session
+
+
+def queued_speech_ids(session: ChatSession, name: str):
+    return [x.data.get_meta("speech_id") for x in session.handlers[name].env.input_queue.queue]
+
+
+def test_interrupt_purges_queued_inputs_of_the_speech_only(scheduler):
+    llm, tts = RecordingHandler(), RecordingHandler()
+    session = create_session(scheduler, llm=llm, tts=tts)
+    for name in ("llm", "tts"):
+        for speech_id in ("speech_1", "speech_2", "speech_1"):
+            session.handlers[name].env.input_queue.put(text_input(speech_id))
+    session.session_context.shared_states.enable_vad = False
+
+    session.interrupt(interrupt("speech_1"))
+
+    assert queued_speech_ids(session, "llm") == ["speech_2"]
+    assert queued_speech_ids(session, "tts") == ["speech_2"]
+    assert llm.signals == ["speech_1"] and tts.signals == ["speech_1"]
+    assert session.session_context.shared_states.enable_vad
+
+
+def test_interrupt_without_speech_id_cancels_the_avatar_speech_once(scheduler):
+    llm = RecordingHandler()
+    session = create_session(scheduler, llm=llm)
+    session.interrupt(interrupt())
+    assert llm.signals == []
+
+    session.session_context.avatar_speech_id = "speech_3"
+    session.emit_signal(interrupt())
+    session.emit_signal(interrupt("speech_3"))
+    assert llm.signals == ["speech_3"]
+    assert list(session.session_context.cancelled_speech_ids) == ["speech_3"]
+
+
+def test_running_session_drops_queued_and_late_inputs_of_the_speech(scheduler):
+    gate = threading.Event()
+    llm = RecordingHandler(gate)
+    session = create_session(scheduler, llm=llm)
+    session.start()
+    try:
+        input_queue = session.handlers["llm"].env.input_queue
+        input_queue.put(text_input("speech_0"))
+        assert llm.started.wait(2.0)
+        for speech_id in ("speech_1", "speech_2"):
+            input_queue.put(text_input(speech_id))
+        session.interrupt(interrupt("speech_1"))
+        # an input of the speech arriving after the interrupt is dropped before handle
+        input_queue.put(text_input("speech_1"))
+        input_queue.put(text_input("speech_3"))
+        gate.set()
+        assert session.handlers["llm"].work_item.idle.wait(2.0)
+    finally:
+        session.stop()
+    assert llm.handled == ["speech_0", "speech_2", "speech_3"]
+
+
+class StubLAMInfer:
+    def __init__(self):
+        self.contexts = []
+
+    def infer_streaming_audio(self, audio, ssr, context=None, predictor=None):
+        self.contexts.append(context)
+        frame_num = max(1, round(audio.shape[-1] / ssr * 30))
+        return {"expression": np.zeros((frame_num, 52), dtype=np.float32)}, {"chunk": len(self.contexts)}
+
+
+class CollectingSubmitter:
+    def __init__(self):
+        self.outputs = []
+
+    def submit(self, data):
+        self.outputs.append(data)
+
+
+def test_interrupt_resets_lam_inference_state(scheduler):
+    lam = HandlerAvatarLAM()
+    lam.infer = StubLAMInfer()
+    session = create_session(scheduler, lam=lam)
+    env = session.handlers["lam"].env
+    env.context.data_submitter = CollectingSubmitter()
+
+    def _feed(speech_id: str, seconds: float):
+        bundle = DataBundle.create_with_main_data(AUDIO_DEFINITION,
+                                                  np.zeros((1, round(24000 * seconds)), dtype=np.float32))
+        bundle.add_meta("speech_id", speech_id)
+        chat_data = ChatData(type=ChatDataType.AVATAR_AUDIO, data=bundle)
+        ChatSession.process_handler_input(session.session_context, env, chat_data, routes={})
+
+    _feed("speech_1", 1.5)
+    assert lam.infer.contexts == [None]
+    session.interrupt(interrupt("speech_1"))
+    # inputs of the interrupted speech neither run inference nor emit motion data
+    _feed("speech_1", 1.0)
+    assert lam.infer.contexts == [None]
+    _feed("speech_2", 1.0)
+    # the next speech starts from fresh inference state, the half second left of speech_1 is dropped
+    assert lam.infer.contexts == [None, None]
+    outputs = env.context.data_submitter.outputs
+    assert [x.get_meta("speech_id") for x in outputs] == ["speech_1", "speech_2"]
+    assert outputs[1].start_of_stream
@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry, \
+    EntryShapeValidator, VariableSize
+
+
+def create_definition() -> DataBundleDefinition:
+    definition = DataBundleDefinition()
+    definition.add_entry(DataBundleEntry.create_audio_entry("avatar_audio", 1, 24000))
+    definition.add_entry(DataBundleEntry.create_framed_entry("arkit_face", [VariableSize(), 52], 0, 30))
+    definition.add_entry(DataBundleEntry.create_framed_entry(
+        "landmarks", [VariableSize(min_size=2, max_size=4), VariableSize(), 3], 1, 30))
+    definition.add_entry(DataBundleEntry.create_text_entry("avatar_text"))
+    return definition
+
+
+def old_shape_accepted(entry: DataBundleEntry, shape) -> bool:
+    # the check DataBundle ran on every set before shape validators were precomputed
+    try:
+        timed_axis_size = entry.get_time_axis_size(shape)
+        if timed_axis_size is None or timed_axis_size <= 0:
+            return False
+        allowed_shape = entry.calculate_shape(timed_axis_size=timed_axis_size, reference_shape=shape)
+    except RuntimeError:
+        return False
+    return np.array_equal(shape, allowed_shape)
+
+
+def validator_accepts(entry: DataBundleEntry, shape) -> bool:
+    try:
+        EntryShapeValidator(entry).check(shape)
+    except RuntimeError:
+        return False
+    return True
+
+
+def test_shape_validators_accept_what_calculate_shape_accepted():
+    definition = create_definition()
+    shapes = [(1, 480), (2, 480), (1, 0), (480,), (1, 1, 480), (3, 52), (3, 51), (0, 52), (52,),
+              (1, 5, 3), (2, 5, 3), (4, 5, 3), (5, 5, 3), (2, 0, 3), (2, 5, 2), (2, 5), (0,), (4,)]
+    for entry in definition.entries.values():
+        for shape in shapes:
+            assert validator_accepts(entry, shape) == old_shape_accepted(entry, shape), (entry.name, shape)
+
+
+@pytest.mark.parametrize("name, data", [
+    ("avatar_audio", np.zeros((2, 480), dtype=np.float32)),
+    ("avatar_audio", np.zeros((1, 0), dtype=np.float32)),
+    ("arkit_face", np.zeros((3, 51), dtype=np.float32)),
+    ("landmarks", np.zeros((5, 4, 3), dtype=np.float32)),
+    ("avatar_text", np.zeros(4, dtype=np.float32)),
+    ("avatar_audio", 0.5),
+])
+def test_set_data_rejects_invalid_data(name, data):
+    bundle = DataBundle(create_definition())
+    with pytest.raises(RuntimeError):
+        bundle.set_data(name, data)
+    assert bundle.get_data(name) is None
+
+
+def test_unknown_entries():
+    bundle = DataBundle(create_definition())
+    with pytest.raises(RuntimeError):
+        bundle.set_data("human_text", "hello")
+    assert bundle.get_data("human_text") is None
+    assert not bundle.get_data_store("human_text").valid
+
+
+def test_set_and_get_data():
+    bundle = DataBundle(create_definition())
+    audio = np.zeros((1, 480), dtype=np.float32)
+    face = np.ones((3, 52), dtype=np.float32)
+    bundle.set_data("avatar_audio", audio)
+    bundle.set_data("arkit_face", face)
+    bundle.set_data("avatar_text", "hello")
+
+    assert bundle.get_data("avatar_audio") is audio
+    assert bundle.get_data("arkit_face") is face
+    assert bundle.get_data("avatar_text") == "hello"
+    assert bundle.get_data("landmarks") is None
+    assert not bundle.get_data_store("landmarks").valid
+
+    bundle.set_data("avatar_text", "world")
+    assert bundle.get_data("avatar_text") == "world"
+
+
+def test_main_data_follows_the_main_entry():
+    definition = create_definition()
+    bundle = DataBundle(definition)
+    assert bundle.get_main_definition_entry().name == "avatar_audio"
+    assert bundle.get_main_data() is None
+    audio = np.zeros((1, 480), dtype=np.float32)
+    bundle.set_main_data(audio)
+    assert bundle.get_main_data() is audio
+    assert bundle.get_data("avatar_audio") is audio
+
+    definition.set_main_entry("avatar_text")
+    bundle = DataBundle(definition)
+    bundle.set_main_data("hello")
+    assert bundle.get_main_data() == "hello"
+    assert bundle.get_data("avatar_text") == "hello"
+    with pytest.raises(RuntimeError):
+        bundle.set_main_data(audio)
+
+    with pytest.raises(RuntimeError):
+        DataBundle(DataBundleDefinition()).set_main_data("hello")
+    assert DataBundle(DataBundleDefinition()).get_main_data() is None
+
+
+def test_metadata_and_stream_flags():
+    bundle = DataBundle(create_definition())
+    assert bundle.get_meta("speech_id") is None
+    assert bundle.get_meta("speech_id", "default") == "default"
+    bundle.add_meta("speech_id", "speech-1")
+    bundle.add_meta("avatar_speech_end", True)
+    assert bundle.get_meta("speech_id") == "speech-1"
+    assert bundle.get_meta("avatar_speech_end") is True
+    assert not bundle.start_of_stream and not bundle.end_of_stream
+    assert "speech_id: speech-1" in str(bundle)
+
+
+@pytest.mark.parametrize("data", [np.full((1, 480), 0.5, dtype=np.float32), "hello"])
+def test_create_with_main_data_matches_set_main_data(data):
+    definition = create_definition()
+    if isinstance(data, str):
+        definition.set_main_entry("avatar_text")
+    created = DataBundle.create_with_main_data(definition, data)
+    regular = DataBundle(definition)
+    regular.set_main_data(data)
+
+    assert created.definition is regular.definition
+    assert [store is None for store in created.data] == [store is None for store in regular.data]
+    assert created.get_main_data() is regular.get_main_data()
+    assert created.metadata == regular.metadata == {}
+    assert str(created) == str(regular)
+
+
+def test_create_with_main_data_rejects_what_set_main_data_rejects():
+    definition = create_definition()
+    with pytest.raises(RuntimeError):
+        DataBundle.create_with_main_data(definition, np.zeros((2, 480), dtype=np.float32))
+    with pytest.raises(RuntimeError):
+        DataBundle.create_with_main_data(DataBundleDefinition(), "hello")
@@ -0,0 +1,51 @@
+import asyncio
+import queue
+import threading
+import time
+
+from chat_engine.core.chat_session import InputWakeup
+
+
+def test_asyncio_queue_put_wakes_waiter():
+    data_queue = asyncio.Queue()
+    wakeup = InputWakeup()
+    wakeup.wrap(data_queue)
+    woken = []
+
+    def _wait():
+        woken.append(wakeup.event.wait(5.0))
+
+    waiter = threading.Thread(target=_wait)
+    waiter.start()
+    time.sleep(0.05)
+    data_queue.put_nowait(1)
+    waiter.join(1.0)
+    assert woken == [True]
+    assert data_queue.get_nowait() == 1
+
+
+def test_asyncio_queue_coroutine_put_wakes():
+    data_queue = asyncio.Queue()
+    wakeup = InputWakeup()
+    wakeup.wrap(data_queue)
+    asyncio.run(data_queue.put(1))
+    assert wakeup.event.is_set()
+
+
+def test_thread_queue_put_wakes():
+    data_queue = queue.Queue()
+    wakeup = InputWakeup()
+    wakeup.wrap(data_queue)
+    data_queue.put_nowait(1)
+    assert wakeup.event.is_set()
+    assert data_queue.get_nowait() == 1
+
+
+def test_unwrap_restores_put():
+    data_queue = asyncio.Queue()
+    wakeup = InputWakeup()
+    wakeup.wrap(data_queue)
+    wakeup.unwrap()
+    data_queue.put_nowait(1)
+    assert not wakeup.event.is_set()
+    assert "put_nowait" not in data_queue.__dict__
@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry, \
+    VariableSize
+from chat_engine.data_models.runtime_data.motion_data import JBIN_HEADER, MotionDataSerializer
+from chat_engine.data_models.runtime_data.motion_data_compact import COMPACT_FOURCC, MotionDataDescriptorFormat, \
+    get_descriptor_format, parse_record_names, unpack_compact_frame
+
+DEFINITION = DataBundleDefinition()
+DEFINITION.add_entry(DataBundleEntry.create_framed_entry("arkit_face", [VariableSize(), 52], 0, 30))
+DEFINITION.add_entry(DataBundleEntry.create_audio_entry("avatar_audio", 1, 16000))
+
+
+def create_serializer(descriptor_format: MotionDataDescriptorFormat) -> MotionDataSerializer:
+    serializer = MotionDataSerializer()
+    serializer.register_audio_data("avatar_audio")
+    serializer.register_data("arkit_face", "arkit_face", "float32")
+    serializer.set_descriptor_format(descriptor_format)
+    return serializer
+
+
+def motion_bundle(speech_id: str) -> DataBundle:
+    bundle = DataBundle(DEFINITION)
+    bundle.set_data("arkit_face", np.random.default_rng(0).random((5, 52), dtype=np.float32))
+    bundle.set_data("avatar_audio", np.linspace(-1.0, 1.0, 2666, dtype=np.float32)[None, :])
+    bundle.add_meta("speech_id", speech_id)
+    bundle.start_of_stream = True
+    return bundle
+
+
+def unpack_jbin(message: bytes):
+    fourcc, desc_size, binary_size = JBIN_HEADER.unpack_from(message, 0)
+    assert fourcc == b"JBIN"
+    description = json.loads(bytes(message[JBIN_HEADER.size:JBIN_HEADER.size + desc_size]))
+    description.update(binary_offset=JBIN_HEADER.size + desc_size, binary_size=binary_size)
+    return description
+
+
+def read_records(message: bytes, description):
+    binary = bytes(message[description["binary_offset"]:description["binary_offset"] + description["binary_size"]])
+    return {name: np.frombuffer(binary, dtype=record["data_type"], count=int(np.prod(record["shape"])),
+                                offset=record["data_offset"]).reshape(record["shape"])
+            for name, record in description["data_records"].items()}
+
+
+def test_compact_frames_decode_like_json_frames():
+    assert get_descriptor_format(1) == MotionDataDescriptorFormat.JSON
+    assert get_descriptor_format(2) == MotionDataDescriptorFormat.COMPACT
+    bundle = motion_bundle("speech_1")
+
+    json_serializer = create_serializer(MotionDataDescriptorFormat.JSON)
+    json_serializer.serialize(DEFINITION)
+    json_message = json_serializer.serialize(bundle)
+    json_description = unpack_jbin(json_message)
+
+    compact_serializer = create_serializer(MotionDataDescriptorFormat.COMPACT)
+    welcome = unpack_jbin(compact_serializer.serialize(DEFINITION))
+    assert welcome["metadata"]["descriptor_format"] == "compact"
+    record_names = parse_record_names(welcome["metadata"])
+    assert sorted(record_names) == ["arkit_face", "audio"]
+    compact_message = compact_serializer.serialize(bundle)
+    assert bytes(compact_message[:4]) == COMPACT_FOURCC
+    assert len(compact_message) < len(json_message)
+    compact_description = unpack_compact_frame(bytes(compact_message), record_names)
+
+    for key in ("batch_id", "batch_name", "start_of_batch", "end_of_batch", "metadata"):
+        assert compact_description[key] == json_description[key], key
+    # sample rates and channels of a record come with the welcome, frames carry layout only
+    for name, record in compact_description["data_records"].items():
+        assert record == {key: json_description["data_records"][name][key]
+                          for key in ("data_type", "data_offset", "shape")}
+    json_records = read_records(json_message, json_description)
+    compact_records = read_records(compact_message, compact_description)
+    assert np.array_equal(compact_records["arkit_face"], bundle.get_data("arkit_face"))
+    for name in record_names:
+        assert np.array_equal(compact_records[name], json_records[name])
+
+
+def test_compact_frames_leave_out_batch_fields_after_the_first():
+    serializer = create_serializer(MotionDataDescriptorFormat.COMPACT)
+    record_names = parse_record_names(unpack_jbin(serializer.serialize(DEFINITION))["metadata"])
+    serializer.serialize(motion_bundle("speech_1"))
+    bundle = motion_bundle("speech_1")
+    bundle.start_of_stream = False
+    bundle.end_of_stream = True
+    description = unpack_compact_frame(bytes(serializer.serialize(bundle)), record_names)
+    assert "metadata" not in description and "batch_name" not in description
+    assert description["end_of_batch"] and not description["start_of_batch"]
@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry, \
+    VariableSize
+from chat_engine.data_models.runtime_data.motion_data import JBIN_HEADER, MotionDataSerializer
+from chat_engine.data_models.runtime_data.motion_data_descriptors import MotionDataDescription
+
+DEFINITION = DataBundleDefinition()
+DEFINITION.add_entry(DataBundleEntry.create_framed_entry("arkit_face", [VariableSize(), 52], 0, 30))
+DEFINITION.add_entry(DataBundleEntry.create_audio_entry("avatar_audio", 1, 16000))
+
+
+class DescriptionRecordingSerializer(MotionDataSerializer):
+    """Keeps the uncached model_dump_json of every description it writes."""
+
+    def __init__(self):
+        super().__init__()
+        self.dumped_descriptions = []
+
+    def _dump_description(self, description: MotionDataDescription) -> bytes:
+        desc_bytes = super()._dump_description(description)
+        self.dumped_descriptions.append(description.model_dump_json().encode("utf-8"))
+        return desc_bytes
+
+
+def create_serializer() -> DescriptionRecordingSerializer:
+    serializer = DescriptionRecordingSerializer()
+    serializer.register_data("arkit_face", "arkit_face", "float32")
+    serializer.register_audio_data("avatar_audio")
+    return serializer
+
+
+def motion_bundle(seed: int, frame_num: int, start: bool = False, end: bool = False) -> DataBundle:
+    rng = np.random.default_rng(seed)
+    bundle = DataBundle(DEFINITION)
+    bundle.set_data("arkit_face", rng.random((frame_num, 52), dtype=np.float32))
+    bundle.set_data("avatar_audio", rng.uniform(-1.0, 1.0, (1, frame_num * 16000 // 30)).astype(np.float32))
+    bundle.add_meta("speech_id", "speech_1")
+    bundle.add_meta("chunk", str(seed))
+    bundle.start_of_stream = start
+    bundle.end_of_stream = end
+    return bundle
+
+
+def split_jbin(message: bytearray):
+    fourcc, desc_size, binary_size = JBIN_HEADER.unpack_from(message, 0)
+    assert fourcc == b"JBIN"
+    desc_end = JBIN_HEADER.size + desc_size
+    assert len(message) == desc_end + binary_size
+    return bytes(message[JBIN_HEADER.size:desc_end]), bytes(message[desc_end:])
+
+
+def test_jbin_messages_match_description_and_source_arrays():
+    serializer = create_serializer()
+    serializer.serialize(DEFINITION)
+    # the second chunk reuses the cached records json, the third changes shape, the last changes it back
+    bundles = [motion_bundle(1, 5, start=True), motion_bundle(2, 5), motion_bundle(3, 7), motion_bundle(4, 5, end=True)]
+    cached_records = []
+    for bundle in bundles:
+        desc_bytes, binary = split_jbin(serializer.serialize(bundle))
+        cached_records.append(serializer.records_json)
+        assert desc_bytes == serializer.dumped_descriptions[-1]
+        description = json.loads(desc_bytes)
+        assert description["metadata"] == {"speech_id": "speech_1", "chunk": bundle.get_meta("chunk")}
+        assert description["start_of_batch"] == bundle.start_of_stream
+        assert description["end_of_batch"] == bundle.end_of_stream
+
+        face = bundle.get_data("arkit_face")
+        audio = bundle.get_data("avatar_audio")
+        expected = {
+            "arkit_face": ("float32", face.shape, face.tobytes()),
+            "audio": ("int16", audio.shape, (audio * 32767).astype(np.int16).tobytes()),
+        }
+        records = description["data_records"]
+        assert list(records) == list(expected)
+        offset = 0
+        for name, (data_type, shape, data) in expected.items():
+            assert records[name]["data_type"] == data_type
+            assert records[name]["shape"] == list(shape)
+            assert records[name]["data_offset"] == offset
+            assert binary[offset:offset + len(data)] == data, name
+            offset += len(data)
+        assert offset == len(binary)
+    assert cached_records[1] is cached_records[0]
+    assert cached_records[2] != cached_records[1] and cached_records[3] == cached_records[0]
@@ -0,0 +1,64 @@
+from chat_engine.common.engine_channel_type import EngineChannelType
+from chat_engine.common.handler_base import ChatDataConsumeMode, HandlerDataInfo
+from chat_engine.core.routing_plan import HandlerDeclaration, RoutingPlan, RoutingPlanCache
+from chat_engine.data_models.chat_data_type import ChatDataType
+
+
+def declare(name, input_types, output_types, is_client=False, priority=0,
+            consume_mode=ChatDataConsumeMode.DEFAULT):
+    inputs = {x: HandlerDataInfo(type=x, input_priority=priority, input_consume_mode=consume_mode)
+              for x in input_types}
+    return HandlerDeclaration(name=name, inputs=inputs, output_types=tuple(output_types), is_client=is_client)
+
+
+def voice_pipeline():
+    return [
+        declare("client", [ChatDataType.AVATAR_AUDIO], [], is_client=True),
+        declare("vad", [ChatDataType.MIC_AUDIO], [ChatDataType.HUMAN_AUDIO]),
+        declare("asr", [ChatDataType.HUMAN_AUDIO], [ChatDataType.HUMAN_TEXT]),
+        declare("llm", [ChatDataType.HUMAN_TEXT], [ChatDataType.AVATAR_TEXT]),
+        declare("tts", [ChatDataType.AVATAR_TEXT], [ChatDataType.AVATAR_AUDIO]),
+    ]
+
+
+def test_plan_routes_the_pipeline():
+    outputs = {("tts", ChatDataType.AVATAR_AUDIO): EngineChannelType.AUDIO}
+    plan = RoutingPlan(voice_pipeline(), outputs, (ChatDataType.MIC_AUDIO,))
+
+    assert plan.get_route("", ChatDataType.MIC_AUDIO).consumers == ("vad",)
+    assert plan.get_route("asr", ChatDataType.HUMAN_TEXT).consumers == ("llm",)
+    route = plan.get_route("tts", ChatDataType.AVATAR_AUDIO)
+    assert route.consumers == ("client",) and route.output_channel == EngineChannelType.AUDIO
+    assert plan.unconsumed_outputs == []
+    assert plan.cycles == []
+    assert [x["source"] for x in plan.to_dict()["routes"]] == ["input", "vad", "asr", "llm", "tts"]
+
+
+def test_once_consumer_ends_delivery_and_sources_skip_themselves():
+    declarations = [
+        declare("echo", [ChatDataType.HUMAN_TEXT], [ChatDataType.HUMAN_TEXT], priority=1),
+        declare("filter", [ChatDataType.HUMAN_TEXT], [], priority=0, consume_mode=ChatDataConsumeMode.ONCE),
+        declare("llm", [ChatDataType.HUMAN_TEXT], [], priority=2),
+    ]
+    plan = RoutingPlan(declarations, {}, (ChatDataType.HUMAN_TEXT,))
+    assert plan.get_route("", ChatDataType.HUMAN_TEXT).consumers == ("filter",)
+    assert plan.get_route("echo", ChatDataType.HUMAN_TEXT).consumers == ("filter",)
+
+
+def test_plan_reports_cycles_and_unconsumed_outputs():
+    declarations = [
+        declare("a", [ChatDataType.HUMAN_TEXT], [ChatDataType.AVATAR_TEXT]),
+        declare("b", [ChatDataType.AVATAR_TEXT], [ChatDataType.HUMAN_TEXT, ChatDataType.AVATAR_VIDEO]),
+    ]
+    plan = RoutingPlan(declarations, {}, ())
+    assert plan.cycles == [["a", "b"]]
+    assert plan.unconsumed_outputs == [("b", ChatDataType.AVATAR_VIDEO)]
+
+
+def test_cache_shares_plans_of_equal_declarations():
+    cache = RoutingPlanCache()
+    plan = cache.get_plan(voice_pipeline(), {}, (ChatDataType.MIC_AUDIO,))
+    assert cache.get_plan(voice_pipeline(), {}, (ChatDataType.MIC_AUDIO,)) is plan
+    other = cache.get_plan(voice_pipeline()[1:], {}, (ChatDataType.MIC_AUDIO,))
+    assert other is not plan
+    assert len(cache.get_plans()) == 2
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from chat_engine.common.handler_base import HandlerBaseInfo
+from chat_engine.contexts.session_context import SharedStates
+from chat_engine.core.session_scheduler import SessionScheduler, HandlerInputQueue
+from chat_engine.data_models.chat_engine_config_data import SchedulerConfigModel
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = SessionScheduler(SchedulerConfigModel(cpu_worker_num=2, io_worker_num=2, max_items_per_run=2))
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_inputs_are_processed_in_order(scheduler):
+    handled = []
+    done = threading.Event()
+
+    def _process(item):
+        handled.append(item)
+        if item == 9:
+            done.set()
+
+    input_queue = HandlerInputQueue()
+    work_item = scheduler.create_work_item(HandlerBaseInfo(name="ordered"), input_queue, _process,
+                                           SharedStates(active=True))
+    for i in range(10):
+        input_queue.put(i)
+    assert done.wait(2.0)
+    work_item.close(1.0)
+    assert handled == list(range(10))
+
+
+def test_purge_removes_matching_inputs(scheduler):
+    input_queue = HandlerInputQueue()
+    # inactive states keep the work item from draining the queue
+    work_item = scheduler.create_work_item(HandlerBaseInfo(name="purged"), input_queue, lambda x: None,
+                                           SharedStates(active=False))
+    for i in range(6):
+        input_queue.put(i)
+    assert work_item.purge(lambda x: x % 2 == 0) == 3
+    assert list(input_queue.queue) == [1, 3, 5]
+    assert input_queue.unfinished_tasks == 3
+    work_item.close(1.0)
+
+
+def test_shutdown_stops_worker_pools():
+    scheduler = SessionScheduler(SchedulerConfigModel(cpu_worker_num=1, io_worker_num=1))
+    scheduler.shutdown()
+    for executor in scheduler.executors.values():
+        with pytest.raises(RuntimeError):
+            executor.submit(lambda: None)
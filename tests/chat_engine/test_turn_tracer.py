@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from chat_engine.core.turn_tracer import JsonLinesTraceExporter, TurnTracer, create_trace_exporters
+from chat_engine.data_models.chat_data.chat_data_trace import TurnMilestone
+from chat_engine.data_models.chat_engine_config_data import TracingConfigModel
+
+
+def test_open_turns_are_exported_before_the_exporter_closes(tmp_path):
+    jsonl_path = tmp_path / "traces" / "turns.jsonl"
+    config = TracingConfigModel(enabled=True, jsonl_path=str(jsonl_path))
+    exporters = create_trace_exporters(config)
+    assert len(exporters) == 1 and isinstance(exporters[0], JsonLinesTraceExporter)
+
+    tracer = TurnTracer("session_1", config, exporters)
+    tracer.mark("speech_1", TurnMilestone.HUMAN_SPEECH_END, 10.0)
+    tracer.mark("speech_1", TurnMilestone.HUMAN_TEXT, 10.5)
+    # a new turn finishes the earlier one
+    tracer.mark("speech_2", TurnMilestone.HUMAN_SPEECH_END, 20.0)
+    tracer.close()
+    for exporter in exporters:
+        exporter.close()
+
+    assert exporters[0].file.closed
+    turns = [json.loads(line) for line in jsonl_path.read_text(encoding="utf-8").splitlines()]
+    assert [turn["speech_id"] for turn in turns] == ["speech_1", "speech_2"]
+    milestones = turns[0]["milestones"]
+    assert milestones["human_text"] - milestones["human_speech_end"] == pytest.approx(0.5)
+
+
+def test_unsampled_turns_are_not_traced():
+    tracer = TurnTracer("session_1", TracingConfigModel(enabled=True, sample_rate=0.0))
+    tracer.mark("speech_1", TurnMilestone.HUMAN_SPEECH_END)
+    assert tracer.get_turn("speech_1") is None
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from engine_utils.audio_resampler import StreamingResampler, design_resample_filter, framewise_rms
+
+
+def reference_resample(audio: np.ndarray, input_rate: int, output_rate: int) -> np.ndarray:
+    # zero stuff, low-pass with the same taps and decimate, the textbook form of what the polyphase filters compute:
+    # output m sums input n weighted by the tap at m * down - n * up
+    resampler = StreamingResampler(input_rate, output_rate)
+    taps = design_resample_filter(resampler.up, resampler.down).astype(np.float64)
+    output_num = (audio.shape[0] * resampler.up + resampler.down - 1) // resampler.down
+    tap_index = np.arange(output_num)[:, None] * resampler.down - np.arange(audio.shape[0])[None, :] * resampler.up
+    valid = (tap_index >= 0) & (tap_index < taps.shape[0])
+    return np.where(valid, taps[np.clip(tap_index, 0, taps.shape[0] - 1)], 0) @ audio
+
+
+def resample_in_chunks(resampler: StreamingResampler, audio: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    cuts = np.sort(rng.choice(np.arange(1, audio.shape[0]), size=12, replace=False))
+    # include empty and single sample chunks, which produce no or partial output periods
+    chunks = np.split(audio, np.concatenate([cuts[:6], cuts[5:6], cuts[6:], [cuts[-1] + 1]]))
+    return np.concatenate([resampler.process(chunk) for chunk in chunks])
+
+
+@pytest.mark.parametrize("input_rate, output_rate", [(24000, 16000), (16000, 24000), (44100, 16000), (22050, 48000)])
+def test_chunked_resampling_matches_one_call(input_rate, output_rate):
+    rng = np.random.default_rng(input_rate + output_rate)
+    audio = rng.uniform(-1, 1, input_rate // 20).astype(np.float32)
+
+    whole = StreamingResampler(input_rate, output_rate).process(audio)
+    chunked = resample_in_chunks(StreamingResampler(input_rate, output_rate), audio, rng)
+
+    assert chunked.shape == whole.shape
+    np.testing.assert_allclose(chunked, whole, atol=1e-5)
+    np.testing.assert_allclose(whole, reference_resample(audio, input_rate, output_rate), atol=1e-4)
+
+
+def test_reset_starts_a_new_stream():
+    rng = np.random.default_rng(0)
+    first, second = rng.uniform(-1, 1, (2, 4800)).astype(np.float32)
+    resampler = StreamingResampler(24000, 16000)
+    resampler.process(first)
+    resampler.reset()
+    np.testing.assert_allclose(resampler.process(second), StreamingResampler(24000, 16000).process(second),
+                               atol=1e-6)
+
+
+def test_equal_rates_pass_through():
+    audio = np.linspace(-1, 1, 100, dtype=np.float32)
+    np.testing.assert_array_equal(StreamingResampler(16000, 16000).process(audio), audio)
+
+
+def reference_rms(audio: np.ndarray, frame_length: int, hop_length: int) -> np.ndarray:
+    padded = np.pad(audio.astype(np.float64), frame_length // 2)
+    starts = range(0, padded.shape[0] - frame_length + 1, hop_length)
+    return np.array([np.sqrt(np.mean(padded[start:start + frame_length] ** 2)) for start in starts])
+
+
+@pytest.mark.parametrize("sample_count, frame_length, hop_length",
+                         [(16000, 533, 533), (4001, 800, 200), (100, 533, 533)])
+def test_framewise_rms_matches_reference(sample_count, frame_length, hop_length):
+    audio = np.random.default_rng(sample_count).uniform(-1, 1, sample_count).astype(np.float32)
+    expected = reference_rms(audio, frame_length, hop_length)
+    volume = framewise_rms(audio, frame_length, hop_length)
+    assert volume.shape == expected.shape
+    np.testing.assert_allclose(volume, expected, rtol=1e-5, atol=1e-6)
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from engine_utils.batch_worker import BatchWorker
+
+
+def test_lone_request_is_not_held_back():
+    worker = BatchWorker("lone_batch", lambda payloads: [x * 2 for x in payloads], max_batch_size=8)
+    start = time.monotonic()
+    assert worker.submit(21) == 42
+    # nothing else is pending, so the request runs as soon as the worker picks it up
+    assert time.monotonic() - start < 0.05
+    assert worker.get_metrics()["batch_size_histogram"] == {1: 1}
+
+
+def test_requests_arriving_during_a_batch_form_the_next_batch():
+    release = threading.Event()
+    batches = []
+
+    def _run(payloads):
+        batches.append(list(payloads))
+        if len(batches) == 1:
+            release.wait(2.0)
+        return payloads
+
+    worker = BatchWorker("queued_batch", _run, max_batch_size=8)
+    first = threading.Thread(target=worker.submit, args=(0,))
+    first.start()
+    while len(batches) == 0:
+        time.sleep(0.001)
+    others = [threading.Thread(target=worker.submit, args=(i,)) for i in range(1, 5)]
+    for thread in others:
+        thread.start()
+    while worker.get_queue_depth() < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in [first] + others:
+        thread.join(2.0)
+    assert batches[0] == [0]
+    assert sorted(batches[1]) == [1, 2, 3, 4]
+
+
+def test_max_batch_size_and_group_key():
+    release = threading.Event()
+    batches = []
+
+    def _run(payloads):
+        batches.append(list(payloads))
+        if len(batches) == 1:
+            release.wait(2.0)
+        return payloads
+
+    worker = BatchWorker("grouped_batch", _run, max_batch_size=2, group_key=len)
+    blocker = threading.Thread(target=worker.submit, args=("x",))
+    blocker.start()
+    while len(batches) == 0:
+        time.sleep(0.001)
+    threads = []
+    for payload in ["aa", "bbb", "cc", "dd"]:
+        threads.append(threading.Thread(target=worker.submit, args=(payload,)))
+        threads[-1].start()
+        while worker.get_queue_depth() < len(threads):
+            time.sleep(0.001)
+    release.set()
+    for thread in [blocker] + threads:
+        thread.join(2.0)
+    assert batches[1:] == [["aa", "cc"], ["bbb"], ["dd"]]
+
+
+def test_errors_are_raised_to_every_caller():
+    def _run(payloads):
+        raise ValueError("model failed")
+
+    worker = BatchWorker("failing_batch", _run)
+    with pytest.raises(ValueError):
+        worker.submit(1)
+    # the worker keeps serving after a failed batch
+    worker.run_batch = lambda payloads: payloads
+    assert worker.submit(2) == 2
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from engine_utils.general_slicer import NumpyRingBuffer, SliceContext, slice_data
+
+
+def test_ring_take_is_a_view_until_it_wraps():
+    ring_buffer = NumpyRingBuffer(axis=0, capacity=8)
+    ring_buffer.append(np.arange(6))
+    head = ring_buffer.take(5)
+    assert np.array_equal(head, np.arange(5))
+    assert np.shares_memory(head, ring_buffer.buffer)
+
+    # 6 more samples fill the tail of the buffer and wrap to its start
+    ring_buffer.append(np.arange(6, 12))
+    assert ring_buffer.capacity == 8
+    wrapped = ring_buffer.take(5)
+    assert np.array_equal(wrapped, np.arange(5, 10))
+    assert not np.shares_memory(wrapped, ring_buffer.buffer)
+    assert ring_buffer.size == 2 and ring_buffer.read_pos == 2
+
+    # growing keeps the pending samples in order
+    ring_buffer.append(np.arange(12, 30))
+    assert ring_buffer.capacity == 20
+    assert np.array_equal(ring_buffer.flush(), np.arange(10, 30))
+    assert ring_buffer.flush() is None
+
+
+def test_ring_buffer_moves_the_slice_axis():
+    ring_buffer = NumpyRingBuffer(axis=1, capacity=4)
+    audio = np.arange(12, dtype=np.float32).reshape(2, 6)
+    ring_buffer.append(audio[:, :3])
+    ring_buffer.append(audio[:, 3:])
+    assert np.array_equal(ring_buffer.take(4), audio[:, :4])
+    assert np.array_equal(ring_buffer.flush(), audio[:, 4:])
+    with pytest.raises(RuntimeError):
+        ring_buffer.append(np.zeros((3, 2), dtype=np.float32))
+
+
+@pytest.mark.parametrize("slice_size, shape, slice_axis, capacity", [
+    (512, (1, -1), 1, None),
+    (5, (-1, 52), 0, 8),
+    (7, (-1, 3, 2), 0, 1),
+])
+def test_ring_slicing_matches_concatenating_slicer(slice_size, shape, slice_axis, capacity):
+    rng = np.random.default_rng(slice_size)
+    ring_context = SliceContext.create_numpy_ring_slice_context(slice_size, slice_axis, capacity)
+    concat_context = SliceContext.create_numpy_slice_context(slice_size, slice_axis)
+    sample_offset = 0
+    for _ in range(3):
+        for _ in range(40):
+            chunk_size = int(rng.integers(0, slice_size * 3))
+            chunk_shape = [chunk_size if size < 0 else size for size in shape]
+            chunk = sample_offset + np.arange(np.prod(chunk_shape), dtype=np.float32).reshape(chunk_shape)
+            sample_offset += chunk.size
+            # ring slices are views, only valid until the next slice_data call
+            ring_slices = [x.copy() for x in slice_data(ring_context, chunk)]
+            concat_slices = list(slice_data(concat_context, chunk))
+            assert len(ring_slices) == len(concat_slices)
+            for ring_slice, concat_slice in zip(ring_slices, concat_slices):
+                assert ring_slice.shape[slice_axis] == slice_size
+                assert np.array_equal(ring_slice, concat_slice)
+            assert ring_context.sliced_sample_num == concat_context.sliced_sample_num
+            assert ring_context.get_next_slice_start_index() == concat_context.get_next_slice_start_index()
+            assert ring_context.get_last_slice_start_index() == concat_context.get_last_slice_start_index()
+        ring_remainder = ring_context.flush()
+        concat_remainder = concat_context.flush()
+        if concat_remainder is None:
+            assert ring_remainder is None
+        else:
+            assert np.array_equal(ring_remainder, concat_remainder)
@@ -0,0 +1,37 @@
+import pytest
+
+from engine_utils.metrics_registry import MetricsRegistry
+
+
+def test_render_counters_gauges_and_histograms():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_render_requests_total", "Requests handled.", ["handler"])
+    counter.labels("asr").inc()
+    counter.labels("asr").inc(2)
+    counter.labels("say \"hi\"\n").inc()
+    registry.gauge("test_render_sessions", "Active sessions.").set(3)
+    histogram = registry.histogram("test_render_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# HELP test_render_requests_total Requests handled." in lines
+    assert "# TYPE test_render_requests_total counter" in lines
+    assert 'test_render_requests_total{handler="asr"} 3' in lines
+    assert 'test_render_requests_total{handler="say \\"hi\\"\\n"} 1' in lines
+    assert "test_render_sessions 3" in lines
+    assert 'test_render_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_render_latency_seconds_bucket{le="1"} 2' in lines
+    assert 'test_render_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_render_latency_seconds_sum 5.55" in lines
+    assert "test_render_latency_seconds_count 3" in lines
+
+
+def test_declaring_again_returns_the_same_family():
+    registry = MetricsRegistry()
+    family = registry.counter("test_redeclared_total", "Redeclared.", ["result"])
+    assert registry.counter("test_redeclared_total", "Redeclared.", ["result"]) is family
+    with pytest.raises(ValueError):
+        registry.gauge("test_redeclared_total", "Redeclared.", ["result"])
+    with pytest.raises(ValueError):
+        family.labels("hit", "extra")
@@ -0,0 +1,62 @@
+import random
+import string
+import threading
+
+import numpy as np
+
+from handlers.asr.sensevoice.asr_batch_service import SenseVoiceBatchService
+
+
+class FunasrShapedModel:
+    """Mimics AutoModel.generate of funasr 1.x on list inputs: one result per input in input order, every result
+    carrying the same key object, the key list itself when one is passed."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def generate(self, input, key=None, **_kwargs):
+        self.batch_sizes.append(len(input))
+        if key is None:
+            key = "rand_key_" + "".join(random.choice(string.ascii_letters) for _ in range(13))
+        return [{"key": key, "text": f"<|en|>{int(audio[0])}"} for audio in input]
+
+
+def test_results_are_mapped_by_position():
+    service = SenseVoiceBatchService(FunasrShapedModel())
+    results = service._run_batch([(f"speech-{i}", np.full(1600, i, dtype=np.float32)) for i in range(4)])
+    assert [x["text"] for x in results] == [f"<|en|>{i}" for i in range(4)]
+
+
+def test_short_result_list_leaves_missing_utterances_empty():
+    class DroppingModel(FunasrShapedModel):
+        def generate(self, input, key=None, **kwargs):
+            return super().generate(input, key, **kwargs)[:1]
+
+    service = SenseVoiceBatchService(DroppingModel())
+    results = service._run_batch([("a", np.zeros(1600)), ("b", np.ones(1600))])
+    assert results[0]["text"] == "<|en|>0"
+    assert results[1] is None
+
+
+def test_concurrent_sessions_get_their_own_text():
+    service = SenseVoiceBatchService(FunasrShapedModel())
+    texts = {}
+
+    def _session(index):
+        texts[index] = service.generate(f"speech-{index}", np.full(1600, index, dtype=np.float32))["text"]
+
+    threads = [threading.Thread(target=_session, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2.0)
+    assert texts == {i: f"<|en|>{i}" for i in range(6)}
+
+
+def test_failed_batch_returns_no_result():
+    class FailingModel:
+        def generate(self, **_kwargs):
+            raise RuntimeError("decode failed")
+
+    service = SenseVoiceBatchService(FailingModel())
+    assert service.generate("speech", np.zeros(1600)) is None
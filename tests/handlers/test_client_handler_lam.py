@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("gradio")
+pytest.importorskip("fastrtc")
+
+from chat_engine.common.engine_channel_type import EngineChannelType  # noqa: E402
+from chat_engine.data_models.chat_data.chat_data_model import ChatData  # noqa: E402
+from chat_engine.data_models.chat_data_type import ChatDataType  # noqa: E402
+from chat_engine.data_models.chat_signal import ChatSignal  # noqa: E402
+from chat_engine.data_models.chat_signal_type import ChatSignalType  # noqa: E402
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, \
+    DataBundleEntry, VariableSize  # noqa: E402
+from handlers.client.h5_rendering_client.client_handler_lam import ClientHandlerLam, ClientLamContext, \
+    LamClientSessionDelegate  # noqa: E402
+from handlers.client.h5_rendering_client.motion_data_send_queue import get_speech_id  # noqa: E402
+
+MOTION_DEFINITION = DataBundleDefinition()
+MOTION_DEFINITION.add_entry(DataBundleEntry.create_framed_entry("arkit_face", [VariableSize(), 52], 0, 30))
+AUDIO_DEFINITION = DataBundleDefinition()
+AUDIO_DEFINITION.add_entry(DataBundleEntry.create_audio_entry("avatar_audio", 1, 24000))
+
+
+def chat_data(data_type: ChatDataType, speech_id: str) -> ChatData:
+    if data_type == ChatDataType.AVATAR_MOTION_DATA:
+        bundle = DataBundle.create_with_main_data(MOTION_DEFINITION, np.zeros((30, 52), dtype=np.float32))
+    else:
+        bundle = DataBundle.create_with_main_data(AUDIO_DEFINITION, np.zeros((1, 2400), dtype=np.float32))
+    bundle.add_meta("speech_id", speech_id)
+    return ChatData(type=data_type, data=bundle)
+
+
+def create_context():
+    handler = ClientHandlerLam()
+    context = ClientLamContext("session_1")
+    context.client_session_delegate = LamClientSessionDelegate()
+    return handler, context, context.client_session_delegate
+
+
+def queue_speeches(handler, context):
+    for speech_id in ["speech_1", "speech_2", "speech_1"]:
+        handler.handle(context, chat_data(ChatDataType.AVATAR_MOTION_DATA, speech_id), {})
+        handler.handle(context, chat_data(ChatDataType.AVATAR_AUDIO, speech_id), {})
+
+
+def audio_speech_ids(delegate):
+    audio_queue = delegate.output_queues[EngineChannelType.AUDIO]
+    return [x.data.get_meta("speech_id") for x in list(audio_queue._queue)]
+
+
+def test_interrupt_keeps_data_of_a_newer_speech():
+    handler, context, delegate = create_context()
+    queue_speeches(handler, context)
+    handler.on_signal(context, ChatSignal(type=ChatSignalType.INTERRUPT, speech_id="speech_1"))
+
+    motion_queue = delegate.motion_data_queue
+    assert [get_speech_id(item[0]) for item in motion_queue._items] == ["speech_2"]
+    assert audio_speech_ids(delegate) == ["speech_2"]
+    assert delegate._is_cancelled("speech_1") and not delegate._is_cancelled("speech_2")
+
+
+def test_interrupt_from_another_thread_purges_on_the_output_loop():
+    handler, context, delegate = create_context()
+    queue_speeches(handler, context)
+
+    async def _interrupt():
+        # the first read binds the loop of the output queues
+        assert (await delegate.get_data(EngineChannelType.VIDEO, timeout=0.01)) is None
+        signal = ChatSignal(type=ChatSignalType.INTERRUPT, speech_id="speech_1")
+        thread = threading.Thread(target=handler.on_signal, args=(context, signal))
+        thread.start()
+        thread.join()
+        # the purge is scheduled on this loop
+        assert audio_speech_ids(delegate) == ["speech_1", "speech_2", "speech_1"]
+        await asyncio.sleep(0)
+        return audio_speech_ids(delegate)
+
+    assert asyncio.run(_interrupt()) == ["speech_2"]
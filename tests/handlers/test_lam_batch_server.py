@@ -0,0 +1,49 @@
+import threading
+
+import numpy as np
+import pytest
+
+from handlers.avatar.lam.lam_batch_server import LAMBatchInferenceServer
+
+
+class StubInfer:
+    """Expression of a window is its first sample repeated per frame, batches must hold windows of one length."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict_expression_batch(self, input_audios):
+        assert len(set(x.shape[0] for x in input_audios)) == 1
+        self.batches.append(len(input_audios))
+        return [np.full((x.shape[0] // 100, 52), x[0], dtype=np.float32) for x in input_audios]
+
+
+def test_windows_of_different_length_get_their_own_expression():
+    infer = StubInfer()
+    server = LAMBatchInferenceServer(infer, max_batch_size=4)
+    results = {}
+
+    def _session(index):
+        window = np.full(1600 if index % 2 == 0 else 3200, index, dtype=np.float32)
+        results[index] = server.predict(window)
+
+    threads = [threading.Thread(target=_session, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2.0)
+    for index, expression in results.items():
+        assert expression.shape == ((16 if index % 2 == 0 else 32), 52)
+        assert np.all(expression == index)
+    assert sum(infer.batches) == 8
+    assert server.get_metrics()["request_count"] == 8
+
+
+def test_errors_reach_the_caller():
+    class FailingInfer:
+        def predict_expression_batch(self, input_audios):
+            raise RuntimeError("inference failed")
+
+    server = LAMBatchInferenceServer(FailingInfer())
+    with pytest.raises(RuntimeError, match="inference failed"):
+        server.predict(np.zeros(1600, dtype=np.float32))
@@ -0,0 +1,78 @@
+import queue
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("PIL")
+
+from chat_engine.common.handler_base import HandlerBaseInfo  # noqa: E402
+from chat_engine.contexts.session_context import SessionContext  # noqa: E402
+from chat_engine.core.chat_session import ChatSession, DataRoute, DataSink  # noqa: E402
+from chat_engine.core.session_scheduler import SessionScheduler  # noqa: E402
+from chat_engine.data_models.chat_data.chat_data_model import ChatData  # noqa: E402
+from chat_engine.data_models.chat_data_type import ChatDataType  # noqa: E402
+from chat_engine.data_models.chat_engine_config_data import ChatEngineConfigModel, SchedulerConfigModel  # noqa: E402
+from chat_engine.data_models.chat_signal import ChatSignal  # noqa: E402
+from chat_engine.data_models.chat_signal_type import ChatSignalType  # noqa: E402
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, \
+    DataBundleEntry  # noqa: E402
+from chat_engine.data_models.session_info_data import SessionInfoData  # noqa: E402
+from handlers.llm.openai_compatible.llm_handler_openai_compatible import HandlerLLM, LLMConfig  # noqa: E402
+
+
+class StubStream:
+    """Streams text deltas, calls on_delta after each one, fails to read on once closed like an http stream."""
+
+    def __init__(self, deltas, on_delta):
+        self.deltas = deltas
+        self.on_delta = on_delta
+        self.closed = False
+
+    def __iter__(self):
+        for index, delta in enumerate(self.deltas):
+            if self.closed:
+                raise RuntimeError("stream closed")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+            self.on_delta(index)
+
+    def close(self):
+        self.closed = True
+
+
+def test_interrupt_closes_the_stream_and_keeps_the_partial_reply():
+    scheduler = SessionScheduler(SchedulerConfigModel(cpu_worker_num=1, io_worker_num=1))
+    session_context = SessionContext(SessionInfoData(session_id="session_1"), {}, {})
+    session = ChatSession(session_context, ChatEngineConfigModel(), scheduler)
+    handler = HandlerLLM()
+    env = session.prepare_handler(handler, HandlerBaseInfo(name="llm"), LLMConfig(api_key="test"))
+
+    def _on_delta(index):
+        # the user barges in after the first delta, the interrupt applies to the speech being answered
+        if index == 0:
+            session.interrupt(ChatSignal(type=ChatSignalType.INTERRUPT))
+
+    stream = StubStream(["Hello", " there", " friend"], _on_delta)
+    env.context.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: stream)))
+    output_queue = queue.Queue()
+    routes = {("llm", ChatDataType.AVATAR_TEXT): DataRoute(output=DataSink(sink_queue=output_queue))}
+
+    definition = DataBundleDefinition()
+    definition.add_entry(DataBundleEntry.create_text_entry("human_text"))
+    bundle = DataBundle.create_with_main_data(definition, "Hi")
+    bundle.add_meta("speech_id", "speech_1")
+    bundle.add_meta("human_text_end", True)
+    try:
+        ChatSession.process_handler_input(session_context, env, ChatData(type=ChatDataType.HUMAN_TEXT, data=bundle),
+                                          routes)
+    finally:
+        scheduler.shutdown()
+
+    assert stream.closed
+    assert list(session_context.cancelled_speech_ids) == ["speech_1"]
+    outputs = [output_queue.get_nowait().data for _ in range(output_queue.qsize())]
+    assert [x.get_main_data() for x in outputs] == ["Hello"]
+    assert not any(x.get_meta("avatar_text_end") for x in outputs)
+    history = env.context.history.message_history
+    assert [(x.role, x.content) for x in history] == [("human", "Hi"), ("avatar", "Hello")]
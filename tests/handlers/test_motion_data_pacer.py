@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry, \
+    VariableSize
+from handlers.client.h5_rendering_client.motion_data_pacer import MotionDataPacer
+
+DEFINITION = DataBundleDefinition()
+DEFINITION.add_entry(DataBundleEntry.create_framed_entry("arkit_face", [VariableSize(), 52], 0, 30))
+DEFINITION.add_entry(DataBundleEntry.create_audio_entry("avatar_audio", 1, 16000))
+
+
+def motion_bundle(frame_num: int) -> DataBundle:
+    bundle = DataBundle(DEFINITION)
+    bundle.set_data("arkit_face", np.arange(frame_num, dtype=np.float32)[:, None].repeat(52, axis=1))
+    bundle.set_data("avatar_audio", np.arange(frame_num * 16000 // 30, dtype=np.float32)[None, :])
+    bundle.add_meta("avatar_speech_end", True)
+    bundle.start_of_stream = True
+    bundle.end_of_stream = True
+    return bundle
+
+
+def test_split_cuts_audio_at_frame_bounds():
+    bundle = motion_bundle(30)
+    chunks = MotionDataPacer(chunk_ms=160).split(bundle)
+
+    assert [chunk.bundle.get_data("arkit_face").shape[0] for chunk in chunks] == [5] * 6
+    assert np.array_equal(np.concatenate([chunk.bundle.get_data("arkit_face") for chunk in chunks]),
+                          bundle.get_data("arkit_face"))
+    assert np.array_equal(np.concatenate([chunk.bundle.get_data("avatar_audio") for chunk in chunks], axis=1),
+                          bundle.get_data("avatar_audio"))
+    assert sum(chunk.duration for chunk in chunks) == pytest.approx(1.0)
+    assert [chunk.bundle.start_of_stream for chunk in chunks] == [True] + [False] * 5
+    assert [chunk.bundle.end_of_stream for chunk in chunks] == [False] * 5 + [True]
+    assert [chunk.bundle.get_meta("avatar_speech_end") for chunk in chunks] == [False] * 5 + [True]
+
+
+def test_split_keeps_short_bundles_whole():
+    bundle = motion_bundle(4)
+    chunks = MotionDataPacer(chunk_ms=160).split(bundle)
+    assert len(chunks) == 1 and chunks[0].bundle is bundle
+
+
+def test_pace_holds_chunks_until_their_lead():
+    async def _pace(max_lead_ms):
+        pacer = MotionDataPacer(chunk_ms=100, max_lead_ms=max_lead_ms)
+        start = time.monotonic()
+        for chunk in pacer.split(motion_bundle(9)):
+            await pacer.pace(chunk)
+        return time.monotonic() - start
+
+    assert asyncio.run(_pace(1000)) < 0.1
+    assert asyncio.run(_pace(0)) >= 0.19
@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from chat_engine.data_models.chat_data.chat_data_model import ChatData
+from chat_engine.data_models.chat_data_type import ChatDataType
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry, \
+    VariableSize
+from handlers.client.h5_rendering_client.motion_data_send_queue import MotionDataSendQueue, MotionDataQueuePolicy, \
+    get_speech_id
+
+DEFINITION = DataBundleDefinition()
+DEFINITION.add_entry(DataBundleEntry.create_framed_entry("arkit_face", [VariableSize(), 52], 0, 30))
+
+
+def motion_data(speech_id: str, seconds: float = 1.0) -> ChatData:
+    bundle = DataBundle.create_with_main_data(DEFINITION, np.zeros((round(seconds * 30), 52), dtype=np.float32))
+    bundle.add_meta("speech_id", speech_id)
+    return ChatData(type=ChatDataType.AVATAR_MOTION_DATA, data=bundle)
+
+
+def queued_speech_ids(send_queue: MotionDataSendQueue):
+    async def _drain():
+        send_queue.bind(asyncio.get_running_loop())
+        result = []
+        while (queued := await send_queue.get(timeout=0.01)) is not None:
+            result.append(get_speech_id(queued[0]))
+        return result
+    return asyncio.run(_drain())
+
+
+@pytest.mark.parametrize("policy", list(MotionDataQueuePolicy))
+def test_reply_longer_than_the_bound_is_kept_whole(policy):
+    send_queue = MotionDataSendQueue(max_seconds=5.0, policy=policy)
+    for _ in range(20):
+        send_queue.put(motion_data("speech_1"))
+    assert send_queue.metrics.dropped == 0
+    assert queued_speech_ids(send_queue) == ["speech_1"] * 20
+
+
+@pytest.mark.parametrize("policy, expected", [
+    (MotionDataQueuePolicy.DROP_STALE, ["speech_1", "speech_1", "speech_3"]),
+    (MotionDataQueuePolicy.DROP_OLDEST, ["speech_1", "speech_1", "speech_2", "speech_3"]),
+])
+def test_full_queue_drops_earlier_speeches_only(policy, expected):
+    send_queue = MotionDataSendQueue(max_seconds=4.0, policy=policy)
+    for _ in range(3):
+        send_queue.put(motion_data("speech_1"))
+
+    async def _get_one():
+        send_queue.bind(asyncio.get_running_loop())
+        return await send_queue.get(timeout=0.01)
+    # speech_1 is being sent from now on
+    assert get_speech_id(asyncio.run(_get_one())[0]) == "speech_1"
+
+    send_queue.put(motion_data("speech_2"))
+    send_queue.put(motion_data("speech_2"))
+    send_queue.put(motion_data("speech_3"))
+    assert queued_speech_ids(send_queue) == expected
+    assert send_queue.metrics.dropped == 5 - len(expected)
+
+
+def test_discard_drops_only_the_cancelled_speech():
+    send_queue = MotionDataSendQueue()
+    for speech_id in ["speech_1", "speech_2", "speech_1"]:
+        send_queue.put(motion_data(speech_id))
+    assert send_queue.discard(lambda chat_data: get_speech_id(chat_data) == "speech_1") == 2
+    assert queued_speech_ids(send_queue) == ["speech_2"]
+    send_queue.put(motion_data("speech_3"))
+    assert send_queue.discard() == 1
+    assert send_queue.depth == 0
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from handlers.tts.edgetts import tts_async_pipeline
+from handlers.tts.edgetts.tts_async_pipeline import EdgeTTSPipeline
+
+
+class FakeDecoder:
+    """Decodes every byte of the stream into 100 samples of its value."""
+
+    def __init__(self, *_args):
+        pass
+
+    def decode(self, data: bytes):
+        return np.repeat(np.frombuffer(data, dtype=np.uint8).astype(np.float32), 100)
+
+    def flush(self):
+        return None
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.setattr(tts_async_pipeline, "StreamingAudioDecoder", FakeDecoder)
+    pipeline = EdgeTTSPipeline("stub", 24000, audio_chunk_size=200, decode_worker_num=2)
+
+    async def _stream_audio(text):
+        for char in text:
+            await asyncio.sleep(0.01)
+            yield bytes([ord(char) - ord("0")])
+
+    pipeline.stream_audio = _stream_audio
+    yield pipeline
+    pipeline.shutdown()
+
+
+def _collect(pipeline, max_in_flight=3):
+    delivered = []
+    threads = set()
+    finished = threading.Event()
+
+    def _on_audio(audio, speech_id):
+        threads.add(threading.current_thread())
+        delivered.append((speech_id, audio))
+
+    def _on_speech_end(speech_id):
+        threads.add(threading.current_thread())
+        delivered.append((speech_id, None))
+        finished.set()
+
+    session = pipeline.create_session(max_in_flight, _on_audio, _on_speech_end)
+    return session, delivered, threads, finished
+
+
+def test_audio_is_decoded_off_the_loop_in_sentence_order(pipeline):
+    session, delivered, threads, finished = _collect(pipeline)
+    for text in ["111", "22", "3333"]:
+        session.submit_sentence("speech", text)
+    session.submit_speech_end("speech")
+    assert finished.wait(2.0)
+    session.close()
+    samples = np.concatenate([audio for _, audio in delivered if audio is not None])
+    assert samples.tolist() == [1.0] * 300 + [2.0] * 200 + [3.0] * 400
+    assert delivered[-1][0] == "speech" and delivered[-1][1] is None
+    assert pipeline.thread not in threads
+
+
+def test_cancelled_speech_stops_and_later_speech_is_delivered(pipeline):
+    session, delivered, _, finished = _collect(pipeline)
+    for _ in range(3):
+        session.submit_sentence("old", "1" * 20)
+    session.submit_speech_end("old")
+    time.sleep(0.05)
+    session.cancel_speech("old")
+    session.submit_sentence("old", "1")
+    session.submit_sentence("new", "22")
+    session.submit_speech_end("new")
+    assert finished.wait(2.0)
+    session.close()
+    assert sum(audio.shape[0] for speech_id, audio in delivered if speech_id == "old" and audio is not None) < 2000
+    assert [speech_id for speech_id, audio in delivered if audio is None] == ["new"]
+    assert sum(audio.shape[0] for speech_id, audio in delivered if speech_id == "new" and audio is not None) == 200
+
+
+class StubPhraseCache:
+    """Holds audio of sentence 22, records the threads lookups run on."""
+
+    def __init__(self):
+        self.lookup_threads = set()
+
+    def get(self, voice, sample_rate, text):
+        self.lookup_threads.add(threading.current_thread())
+        time.sleep(0.02)
+        return np.full(200, 9.0, dtype=np.float32) if text == "22" else None
+
+    def accept(self, text):
+        return False
+
+
+def test_phrase_cache_is_looked_up_off_the_loop_in_sentence_order(pipeline):
+    pipeline.phrase_cache = StubPhraseCache()
+    session, delivered, _, finished = _collect(pipeline)
+    for text in ["111", "22", "3"]:
+        session.submit_sentence("speech", text)
+    session.submit_speech_end("speech")
+    assert finished.wait(2.0)
+    session.close()
+    samples = np.concatenate([audio for _, audio in delivered if audio is not None])
+    assert samples.tolist() == [1.0] * 300 + [9.0] * 200 + [3.0] * 100
+    assert pipeline.phrase_cache.lookup_threads and pipeline.thread not in pipeline.phrase_cache.lookup_threads
+
+
+def test_shutdown_stops_the_loop_thread_and_decode_workers(monkeypatch):
+    monkeypatch.setattr(tts_async_pipeline, "StreamingAudioDecoder", FakeDecoder)
+    pipeline = EdgeTTSPipeline("stub", 24000, audio_chunk_size=200, decode_worker_num=1)
+    pipeline.shutdown()
+    assert not pipeline.thread.is_alive()
+    with pytest.raises(RuntimeError):
+        pipeline.decode_executor.submit(lambda: None)
@@ -0,0 +1,50 @@
+import numpy as np
+
+from handlers.tts.tts_phrase_cache import TTSPhraseCache, PHRASE_CACHE_LOOKUPS
+
+
+def _lookup_count(result: str) -> float:
+    return PHRASE_CACHE_LOOKUPS.labels(result).value
+
+
+def test_key_keeps_casing_and_normalizes_whitespace():
+    assert TTSPhraseCache.make_key("v", 24000, "US") != TTSPhraseCache.make_key("v", 24000, "us")
+    assert TTSPhraseCache.make_key("v", 24000, " hello\n  world ") == \
+        TTSPhraseCache.make_key("v", 24000, "hello world")
+
+
+def test_memory_and_disk_hits(tmp_path):
+    cache = TTSPhraseCache(str(tmp_path), memory_capacity=1 << 20, disk_capacity=1 << 20)
+    audio = np.arange(100, dtype=np.float32)
+    misses = _lookup_count("miss")
+    assert cache.get("v", 24000, "hello") is None
+    assert _lookup_count("miss") == misses + 1
+
+    cache.put("v", 24000, "hello", audio)
+    memory_hits = _lookup_count("memory_hit")
+    assert np.array_equal(cache.get("v", 24000, "hello"), audio)
+    assert _lookup_count("memory_hit") == memory_hits + 1
+
+    # a new cache over the same directory reads the phrase back from disk
+    reloaded = TTSPhraseCache(str(tmp_path), memory_capacity=1 << 20, disk_capacity=1 << 20)
+    disk_hits = _lookup_count("disk_hit")
+    assert np.array_equal(reloaded.get("v", 24000, "hello"), audio)
+    assert _lookup_count("disk_hit") == disk_hits + 1
+
+
+def test_lru_eviction_over_disk_budget(tmp_path):
+    audio = np.zeros(256, dtype=np.float32)
+    cache = TTSPhraseCache(str(tmp_path), memory_capacity=audio.nbytes, disk_capacity=audio.nbytes * 2)
+    cache.put("v", 24000, "one", audio)
+    cache.put("v", 24000, "two", audio)
+    cache.get("v", 24000, "one")
+    cache.put("v", 24000, "three", audio)
+    assert cache.get("v", 24000, "two") is None
+    assert cache.get("v", 24000, "one") is not None
+    assert cache.get_stats().disk_bytes == audio.nbytes * 2
+
+
+def test_long_texts_are_not_cached(tmp_path):
+    cache = TTSPhraseCache(str(tmp_path), max_text_length=8)
+    cache.put("v", 24000, "a sentence too long to cache", np.zeros(16, dtype=np.float32))
+    assert len(cache.disk_entries) == 0
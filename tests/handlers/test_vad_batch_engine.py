@@ -0,0 +1,51 @@
+import threading
+
+import numpy as np
+
+from handlers.vad.silerovad.vad_batch_engine import SileroVADBatchEngine
+
+
+class StubSileroModel:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def run(self, _output_names, inputs):
+        clips = inputs["input"]
+        self.batch_sizes.append(clips.shape[0])
+        # probability is the clip mean, state counts the calls of each session
+        probs = clips.mean(axis=1, keepdims=True)
+        return probs, inputs["state"] + 1
+
+
+def test_results_go_back_to_their_sessions():
+    model = StubSileroModel()
+    engine = SileroVADBatchEngine(model, max_batch_size=8)
+    results = {}
+
+    def _session(index):
+        state = np.zeros((2, 1, 128), dtype=np.float32)
+        for _ in range(5):
+            prob, state = engine.infer(np.full(512, index, dtype=np.float32), state)
+        results[index] = (prob, state)
+
+    threads = [threading.Thread(target=_session, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2.0)
+    for index, (prob, state) in results.items():
+        assert prob == index
+        assert state.shape == (2, 1, 128)
+        assert np.all(state == 5)
+
+
+def test_failed_batch_is_treated_as_silence():
+    class FailingModel:
+        def run(self, _output_names, _inputs):
+            raise RuntimeError("onnx failed")
+
+    engine = SileroVADBatchEngine(FailingModel())
+    state = np.ones((2, 1, 128), dtype=np.float32)
+    prob, out_state = engine.infer(np.zeros(512, dtype=np.float32), state)
+    assert prob == 0.0
+    assert out_state is state
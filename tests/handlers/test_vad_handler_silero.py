@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from chat_engine.common.handler_base import HandlerDataInfo
+from chat_engine.contexts.session_context import SharedStates
+from chat_engine.data_models.chat_data.chat_data_model import ChatData
+from chat_engine.data_models.chat_data_type import ChatDataType
+from chat_engine.data_models.runtime_data.data_bundle import DataBundle, DataBundleDefinition, DataBundleEntry
+from handlers.vad.silerovad.vad_handler_silero import HandlerAudioVAD, SileroVADConfigModel
+
+
+class LoudnessModel:
+    """Reports speech for clips with positive mean and counts the clips it was run on."""
+
+    def __init__(self):
+        self.clip_num = 0
+
+    def run(self, _output_names, inputs):
+        self.clip_num += inputs["input"].shape[0]
+        prob = 1.0 if inputs["input"].mean() > 0 else 0.0
+        return np.array([[prob]], dtype=np.float32), inputs["state"]
+
+
+def _audio_definition(name: str):
+    definition = DataBundleDefinition()
+    definition.add_entry(DataBundleEntry.create_audio_entry(name, 1, 16000))
+    definition.lockdown()
+    return definition
+
+
+def _run_chunk(handler, context, chunk, timestamp, mic_definition, output_definitions):
+    bundle = DataBundle.create_with_main_data(mic_definition, chunk[np.newaxis, ...])
+    inputs = ChatData(type=ChatDataType.MIC_AUDIO, data=bundle, timestamp=(timestamp, 16000))
+    return list(handler.handle(context, inputs, output_definitions))
+
+
+def _create_handler(config: SileroVADConfigModel):
+    handler = HandlerAudioVAD()
+    handler.model = LoudnessModel()
+    shared_states = SharedStates(active=True)
+    session_context = SimpleNamespace(session_info=SimpleNamespace(session_id="vad"), shared_states=shared_states)
+    context = handler.create_context(session_context, config)
+    output_definitions = {ChatDataType.HUMAN_AUDIO: HandlerDataInfo(type=ChatDataType.HUMAN_AUDIO,
+                                                                     definition=_audio_definition("human_audio"))}
+    return handler, context, shared_states, output_definitions
+
+
+def test_clips_after_speech_end_are_still_processed():
+    handler, context, shared_states, output_definitions = _create_handler(SileroVADConfigModel())
+    mic_definition = _audio_definition("mic_audio")
+
+    speech = np.full(512 * 10, 0.5, dtype=np.float32)
+    outputs = _run_chunk(handler, context, speech, 0, mic_definition, output_definitions)
+    assert outputs[0].data.get_meta("human_speech_start")
+
+    # speech ends after 10 silent clips, the 6 clips left in the chunk must not be dropped by the reset
+    handler.model.clip_num = 0
+    silence = np.full(512 * 16, -0.5, dtype=np.float32)
+    outputs = _run_chunk(handler, context, silence, 512 * 10, mic_definition, output_definitions)
+    assert outputs[-1].data.get_meta("human_speech_end")
+    assert handler.model.clip_num == 16
+    assert not shared_states.enable_vad
+
+
+def test_pause_within_speech_is_marked_once():
+    handler, context, _, output_definitions = _create_handler(SileroVADConfigModel(pause_delay=2560))
+    mic_definition = _audio_definition("mic_audio")
+    # 8 silent clips are a pause, 10 would end the speech
+    audio = np.concatenate([np.full(512 * 10, 0.5), np.full(512 * 8, -0.5), np.full(512 * 4, 0.5)])
+    outputs = _run_chunk(handler, context, audio.astype(np.float32), 0, mic_definition, output_definitions)
+    pauses = [x for x in outputs if x.data.get_meta("human_speech_pause", False)]
+    assert len(pauses) == 1
+    assert not any(x.data.get_meta("human_speech_end", False) for x in outputs)